@@ -0,0 +1,464 @@
+#!/usr/bin/env python3.6
+"""
+BDF+ recordings, written while the session runs.
+
+BDF stores every value as a 24 bit integer, which is exactly what the ADS1299 on the Cyton delivers, so the
+counts go into the file as they are: no conversion, no loss of precision. The header gives each signal its
+digital and physical range, from which any EDF/BDF reader computes microvolts (and g for the accelerometer).
+
+The file is a header followed by data records of record_seconds each. A record holds record_seconds of every
+channel, one signal after the other, and a 'BDF Annotations' signal with the time of the record and the trigger
+events that fall in it (BDF+, continuous recording). The records are written by a worker thread. The number of
+records in the header is -1 while recording, and is set every checkpoint_seconds of recording and when the file
+is closed, so a recording cut short by a crash can still be opened up to the last checkpoint.
+
+Lost samples (recording.GAP_COUNT, NaN in the plugins) have no value in BDF. They are written as the last sample
+before them, held, and every gap gets a 'gap' annotation with its duration, so a reader can leave it out.
+
+The last record is completed by repeating the last sample, and an annotation marks where the recording ended.
+
+    Header (256 bytes + 256 bytes per signal, the number of records at offset 236)
+    Record 0: EEG 1 | EEG 2 | ... | aux | annotations
+    Record 1: ...
+
+EXAMPLE USE:
+
+    writer = BdfWriter('session.bdf', recording.board_header(250, 8, 3), record_seconds=1)
+    writer.write(counts)                # (n, 11) int32 = 8 channels | 3 aux
+    writer.add_event(12, 'image 12')
+    writer.close()
+
+    python bdf_writer.py session.bdf                        # describe a file
+    python bdf_writer.py session.bdf --from session.obcr    # convert a native recording (see recording.py)
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import argparse
+import datetime
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+import recording as rec
+
+# ========================
+# Constant values
+#
+VERSION = b'\xffBIOSEMI'
+RECORDS_OFFSET = 236
+ANNOTATIONS = 'BDF Annotations'
+
+DIGITAL_MIN = -(1 << 23)
+DIGITAL_MAX = (1 << 23) - 1
+AUX_DIGITAL_MIN = -(1 << 15)
+AUX_DIGITAL_MAX = (1 << 15) - 1
+
+MONTHS = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+
+
+def field(value, width):
+    """ A header field: ASCII, left aligned, padded with spaces. """
+    return str(value).encode('ascii', 'replace')[:width].ljust(width)
+
+
+def number(value, width=8):
+    """ A number in at most width characters, with as many decimals as fit. """
+    if value == int(value) and len('%d' % value) <= width:
+        return '%d' % value
+    for decimals in range(width, -1, -1):
+        text = ('%.*f' % (decimals, value)).rstrip('0').rstrip('.')
+        if len(text) <= width:
+            return text
+    raise ValueError('%r does not fit in %d characters' % (value, width))
+
+
+def onset(seconds):
+    """ The time of an annotation, '+' or '-' and seconds. """
+    return ('%+.6f' % seconds).rstrip('0').rstrip('.')
+
+
+def tal(seconds, text='', duration=None):
+    """ One time-stamped annotation list of BDF+, with a duration in seconds if given. """
+    text = text.replace('\x14', ' ').replace('\x15', ' ').replace('\x00', ' ')
+    if duration is not None:
+        return (onset(seconds) + '\x15' + onset(duration)[1:] + '\x14' + text + '\x14\x00').encode('utf-8')
+    return (onset(seconds) + '\x14' + text + '\x14\x00').encode('utf-8')
+
+
+def signals(header):
+    """ The data signals of a board description from recording.board_header: label, dimension, ranges. """
+    result = []
+    scale = header.get('channel_scale')
+    for channel in header['channel_map']:
+        result.append({'label': channel['label'],
+                       'transducer': '' if channel['active'] else 'inactive',
+                       'dimension': 'uV' if scale else 'counts',
+                       'digital': (DIGITAL_MIN, DIGITAL_MAX),
+                       'physical': (DIGITAL_MIN * (scale or 1), DIGITAL_MAX * (scale or 1))})
+    scale = header.get('aux_scale')
+    aux_channels = header['aux_channels']
+    for i in range(aux_channels):
+        label = 'Accel %s' % 'XYZ'[i] if aux_channels == 3 else 'Aux %d' % (i + 1)
+        result.append({'label': label,
+                       'transducer': 'accelerometer' if aux_channels == 3 else '',
+                       'dimension': 'g' if scale else 'counts',
+                       'digital': (AUX_DIGITAL_MIN, AUX_DIGITAL_MAX),
+                       'physical': (AUX_DIGITAL_MIN * (scale or 1), AUX_DIGITAL_MAX * (scale or 1))})
+    return result
+
+
+def encode_record(rows):
+    """ The bytes of (samples, signals) counts in a data record: each signal in turn, 24 bit little endian. """
+    columns = np.ascontiguousarray(np.asarray(rows, dtype='<i4').T)
+    return columns.view(np.uint8).reshape(columns.shape[0], columns.shape[1], 4)[:, :, :3].tobytes()
+
+
+def decode_samples(data, records, samples):
+    """ The int32 values of (records, samples * 3) bytes of one signal. """
+    data = data.reshape(records, samples, 3)
+    values = data[:, :, 0].astype(np.int32) | (data[:, :, 1].astype(np.int32) << 8) | \
+        (data[:, :, 2].astype(np.int8).astype(np.int32) << 16)
+    return values.reshape(-1)
+
+
+class BdfWriter(object):
+    """
+    Args:
+      file_name: the BDF file, overwritten if it exists
+      header: the board description from recording.board_header
+      record_seconds: duration of a data record, it must hold a whole number of samples
+      checkpoint_seconds: how often (in seconds of recording) the number of records is set in the header
+      annotation_bytes: room for annotations in a record, events that do not fit go into the next one
+      start: the date and time of the start of the recording, now by default
+      depth: number of full records that may wait for the worker, write waits when it is reached
+    """
+
+    def __init__(self, file_name, header, record_seconds=1.0, checkpoint_seconds=30.0, annotation_bytes=360,
+                 start=None, depth=16):
+        record_samples = header['sample_rate'] * record_seconds
+        if record_samples < 1 or abs(record_samples - round(record_samples)) > 1e-9:
+            raise ValueError('A record of %s s does not hold a whole number of samples at %s Hz'
+                             % (record_seconds, header['sample_rate']))
+        self.file_name = file_name
+        self.header = header
+        self.record_seconds = record_seconds
+        self.record_samples = int(round(record_samples))
+        self.checkpoint_seconds = checkpoint_seconds
+        self.annotation_bytes = 3 * ((annotation_bytes + 2) // 3)
+        self.start = start or datetime.datetime.now()
+
+        self.signals = signals(header)
+        self.minimum = np.array([s['digital'][0] for s in self.signals], dtype=np.int32)
+        self.maximum = np.array([s['digital'][1] for s in self.signals], dtype=np.int32)
+
+        self.file = open(file_name, 'wb')
+        self.file.write(self._header(-1))
+
+        # The record being filled, and the events waiting for their record: (sample, text, duration)
+        #
+        self.buffer = np.empty((self.record_samples, len(self.signals)), dtype=np.int32)
+        self.fill = 0
+        self.last = np.zeros(len(self.signals), dtype=np.int32)
+        self.events = []
+
+        # The last sample that was not lost, held through a gap, and the first sample of the gap going on
+        #
+        self.held = np.zeros(len(self.signals), dtype=np.int32)
+        self.gap_start = None
+
+        # Samples and records so far
+        #
+        self.samples = 0
+        self.records = 0
+        self.written = 0
+        self.checkpoints = 0
+        self.clipped = 0
+        self.gaps = 0
+        self.gap_samples = 0
+        self.errors = 0
+
+        self.queue = queue.Queue(depth)
+        self.thread = threading.Thread(target=self._run, name="bdf " + os.path.basename(file_name))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _header(self, records):
+        board = str(self.header.get('board', 'OpenBCI')).replace(' ', '_')
+        start = self.start
+        text = [VERSION,
+                field('X X X X', 80),
+                field('Startdate %02d-%s-%04d X X OpenBCI_%s' % (start.day, MONTHS[start.month - 1], start.year,
+                                                                 board), 80),
+                field(start.strftime('%d.%m.%y'), 8),
+                field(start.strftime('%H.%M.%S'), 8),
+                field(256 * (len(self.signals) + 2), 8),
+                field('BDF+C', 44),
+                field(records, 8),
+                field(number(self.record_seconds), 8),
+                field(len(self.signals) + 1, 4)]
+
+        annotations = {'label': ANNOTATIONS, 'transducer': '', 'dimension': '',
+                       'digital': (DIGITAL_MIN, DIGITAL_MAX), 'physical': (-1, 1)}
+        all_signals = self.signals + [annotations]
+        samples = [self.record_samples] * len(self.signals) + [self.annotation_bytes // 3]
+        text += [field(s['label'], 16) for s in all_signals]
+        text += [field(s['transducer'], 80) for s in all_signals]
+        text += [field(s['dimension'], 8) for s in all_signals]
+        text += [field(number(s['physical'][0]), 8) for s in all_signals]
+        text += [field(number(s['physical'][1]), 8) for s in all_signals]
+        text += [field(s['digital'][0], 8) for s in all_signals]
+        text += [field(s['digital'][1], 8) for s in all_signals]
+        text += [field('', 80) for s in all_signals]
+        text += [field(n, 8) for n in samples]
+        text += [field('', 32) for s in all_signals]
+        return b''.join(text)
+
+    def write(self, rows):
+        """
+        Add (n, signals) rows of counts, channels then aux. Values outside a signal's range are clipped, lost samples
+        (GAP_COUNT) hold the sample before them.
+        """
+        rows = self._fill_gaps(np.asarray(rows))
+        done = 0
+        while done < len(rows):
+            n = min(len(rows) - done, self.record_samples - self.fill)
+            self.buffer[self.fill:self.fill + n] = rows[done:done + n]
+            self.fill += n
+            self.samples += n
+            done += n
+            if self.fill == self.record_samples:
+                self._send_record()
+
+    def add_event(self, value, text='', sample=None, duration=None):
+        """ A trigger event at the given sample (the next sample to be written by default), lasting duration s. """
+        sample = self.samples if sample is None else sample
+        self.events.append((sample, text or str(value), duration))
+
+    def _fill_gaps(self, rows):
+        """
+        Rows with lost samples replaced by the last sample before them. A gap is annotated when it ends, the
+        annotation may therefore go into a later record than the one it starts in.
+        """
+        gaps = (rows == rec.GAP_COUNT).any(axis=1) if len(rows) else np.zeros(0, dtype=bool)
+        if not gaps.any():
+            self._end_gap(self.samples)
+            if len(rows):
+                self.held = rows[-1]
+            return rows
+
+        # Each row takes the last row before it that is not lost, the first rows the one held from before
+        #
+        source = np.where(gaps, 0, np.arange(1, len(rows) + 1))
+        np.maximum.accumulate(source, out=source)
+        rows = np.vstack([self.held[None, :], rows])[source].astype(np.int32)
+        self.held = rows[-1]
+
+        edges = np.diff(np.concatenate([[self.gap_start is not None], gaps, [False]]).astype(np.int8))
+        for position in np.flatnonzero(edges):
+            if edges[position] == 1:
+                self.gap_start = self.samples + int(position)
+            elif position < len(rows):
+                self._end_gap(self.samples + int(position))
+        self.gap_samples += int(gaps.sum())
+        return rows
+
+    def _end_gap(self, sample):
+        if self.gap_start is None:
+            return
+        self.events.append((self.gap_start, 'gap', (sample - self.gap_start) / self.header['sample_rate']))
+        self.gaps += 1
+        self.gap_start = None
+
+    def _annotations(self, final=False):
+        """
+        The annotation bytes of the record being sent: its time, then the events up to its end (all events for the
+        last record) that fit.
+        """
+        first = self.records * self.record_samples
+        data = tal(first / self.header['sample_rate'])
+        if self.events:
+            self.events.sort(key=lambda event: event[0])
+            end = first + self.record_samples
+            waiting = []
+            for sample, text, duration in self.events:
+                annotation = tal(sample / self.header['sample_rate'], text, duration)
+                if (sample < end or final) and len(data) + len(annotation) <= self.annotation_bytes:
+                    data += annotation
+                else:
+                    waiting.append((sample, text, duration))
+            self.events = waiting
+        return data.ljust(self.annotation_bytes, b'\x00')
+
+    def _send_record(self, final=False):
+        rows = self.buffer
+        outside = (rows < self.minimum) | (rows > self.maximum)
+        if outside.any():
+            self.clipped += int(outside.sum())
+            rows = np.clip(rows, self.minimum, self.maximum)
+        self.queue.put((rows, self._annotations(final)))
+        self.last = rows[-1]
+        self.buffer = np.empty_like(self.buffer)
+        self.fill = 0
+        self.records += 1
+
+    def _run(self):
+        next_checkpoint = self.checkpoint_seconds
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                self.file.write(encode_record(item[0]) + item[1])
+                self.written += 1
+                if self.written * self.record_seconds >= next_checkpoint:
+                    self._checkpoint()
+                    next_checkpoint += self.checkpoint_seconds
+            except (OSError, ValueError) as e:
+                self.errors += 1
+                print("BDF %s: %s" % (self.file_name, e))
+
+    def _checkpoint(self):
+        """ Put the records on the disk, then their number in the header. """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.seek(RECORDS_OFFSET)
+        self.file.write(field(self.written, 8))
+        self.file.seek(0, os.SEEK_END)
+        self.file.flush()
+        self.checkpoints += 1
+
+    def close(self):
+        """ Complete and write the last record, and set the number of records in the header. """
+        if self.thread is None:
+            return
+        self._end_gap(self.samples)
+        if self.fill or self.events:
+            if self.fill < self.record_samples:
+                self.add_event(0, 'recording end')
+            self.buffer[self.fill:] = self.buffer[self.fill - 1] if self.fill else self.last
+            self._send_record(final=True)
+        while self.events:
+            self.buffer[:] = self.last
+            self._send_record(final=True)
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        try:
+            self._checkpoint()
+        except OSError as e:
+            self.errors += 1
+            print("BDF %s: %s" % (self.file_name, e))
+        self.file.close()
+
+    def get_stats(self):
+        return {'samples': self.samples,
+                'records': self.written,
+                'checkpoints': self.checkpoints,
+                'clipped': self.clipped,
+                'gaps': self.gaps,
+                'gap_samples': self.gap_samples,
+                'errors': self.errors}
+
+
+def read_bdf(file_name):
+    """
+    Returns (header, data, annotations): the header fields and signals, the (samples, signals) int32 counts of
+    the data signals, and (onset, text) of the annotations. The number of records comes from the file size if the
+    header does not have it.
+    """
+    with open(file_name, 'rb') as f:
+        fixed = f.read(256)
+        if fixed[:8] != VERSION:
+            raise ValueError('%s is not a BDF file' % file_name)
+        count = int(fixed[252:256])
+        text = f.read(256 * count)
+
+    def column(offset, width):
+        return [text[offset + i * width:offset + (i + 1) * width].decode('ascii', 'replace').strip()
+                for i in range(count)]
+
+    offsets = [0]
+    for width in (16, 80, 8, 8, 8, 8, 8, 80, 8):
+        offsets.append(offsets[-1] + width * count)
+    header = {'recording': fixed[88:168].decode('ascii', 'replace').strip(),
+              'start': (fixed[168:176] + b' ' + fixed[176:184]).decode('ascii'),
+              'header_bytes': int(fixed[184:192]),
+              'reserved': fixed[192:236].decode('ascii', 'replace').strip(),
+              'records': int(fixed[236:244]),
+              'record_seconds': float(fixed[244:252]),
+              'labels': column(offsets[0], 16),
+              'dimensions': column(offsets[2], 8),
+              'physical_min': [float(v) for v in column(offsets[3], 8)],
+              'physical_max': [float(v) for v in column(offsets[4], 8)],
+              'digital_min': [int(v) for v in column(offsets[5], 8)],
+              'digital_max': [int(v) for v in column(offsets[6], 8)],
+              'samples': [int(v) for v in column(offsets[8], 8)]}
+
+    record_bytes = 3 * sum(header['samples'])
+    available = (os.path.getsize(file_name) - header['header_bytes']) // record_bytes
+    records = header['records'] if 0 <= header['records'] <= available else available
+    raw = np.fromfile(file_name, dtype=np.uint8, count=records * record_bytes,
+                      offset=header['header_bytes']).reshape(records, record_bytes)
+
+    data = []
+    annotations = []
+    start = 0
+    for label, samples in zip(header['labels'], header['samples']):
+        block = raw[:, start:start + 3 * samples]
+        start += 3 * samples
+        if label == ANNOTATIONS:
+            for record in block:
+                tals = bytes(record).rstrip(b'\x00').split(b'\x14\x00')
+                for item in tals[1:]:
+                    parts = item.lstrip(b'\x00').split(b'\x14')
+                    if len(parts) > 1:
+                        annotations.append((float(parts[0].split(b'\x15')[0]), parts[1].decode('utf-8')))
+        else:
+            data.append(decode_samples(block, records, samples))
+    header['records_read'] = records
+    data = np.column_stack(data) if data else np.zeros((0, 0), dtype=np.int32)
+    return header, data, annotations
+
+
+def convert_recording(recording_name, file_name, record_seconds=1.0):
+    """ Write a native recording (see recording.py) as BDF+, with its events as annotations. """
+    reader = rec.RecordingReader(recording_name)
+    created = reader.header.get('created')
+    start = datetime.datetime.strptime(created, '%Y-%m-%d %H:%M:%S') if created else None
+    writer = BdfWriter(file_name, reader.header, record_seconds, start=start)
+    for event in reader.events:
+        writer.add_event(int(event['value']), event['text'].decode('utf-8', 'replace'), int(event['sample']))
+    for i in range(len(reader.chunks)):
+        writer.write(reader.read_chunk(i)[:, 1:])
+    writer.close()
+    reader.close()
+    return writer.get_stats()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Describe a BDF+ file, or write one from a native recording")
+    parser.add_argument('bdf', help="the BDF file")
+    parser.add_argument('--from', dest='recording', help="convert this native recording (.obcr) into the BDF file")
+    parser.add_argument('--record-seconds', type=float, default=1.0, help="duration of a data record")
+    args = parser.parse_args()
+
+    if args.recording:
+        started = time.monotonic()
+        print(convert_recording(args.recording, args.bdf, args.record_seconds),
+              "%.1f s" % (time.monotonic() - started))
+
+    header, data, annotations = read_bdf(args.bdf)
+    print("%s, started %s, %s" % (header['reserved'], header['start'], header['recording']))
+    print("%d records of %g s (%d in the header), %d samples" % (header['records_read'], header['record_seconds'],
+                                                                 header['records'], len(data)))
+    for label, dimension, samples in zip(header['labels'], header['dimensions'], header['samples']):
+        print("  %-16s %-6s %d per record" % (label, dimension, samples))
+    for time_, text in annotations:
+        if text:
+            print("%10.3f  %s" % (time_, text))
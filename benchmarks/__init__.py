@@ -0,0 +1,15 @@
+"""
+Benchmarks for the parsers and the streaming pipeline.
+
+Run from the top directory of the project:
+
+    python -m benchmarks run --output results.json
+    python -m benchmarks compare benchmarks/baseline.json results.json
+
+The first command measures the Cyton and Ganglion parsers, the Daisy merge, the plugins and the end to end
+latency through a virtual board (see virtual_board.py), and writes the results to a JSON file. The second
+command compares two such files and flags every result that got worse by more than the tolerance.
+
+benchmarks/baseline.json holds the stored baseline. Update it with the run command when a performance change
+has been accepted.
+"""
@@ -0,0 +1,80 @@
+"""
+Command line for the benchmarks, see benchmarks/__init__.py.
+"""
+import argparse
+import sys
+import warnings
+
+from benchmarks import results as res
+
+SUITES = ('cyton', 'ganglion', 'plugins', 'pipeline')
+
+
+def run(args):
+    # Some of the modules compare with literals using "is", which gives a warning on import.
+    #
+    warnings.simplefilter('ignore', SyntaxWarning)
+
+    for suite in args.suites:
+        if suite not in SUITES:
+            print("Unknown benchmark %s, use one of %s" % (suite, ', '.join(SUITES)), file=sys.stderr)
+            return 2
+
+    found = {}
+    for suite in args.suites or SUITES:
+        module = __import__('benchmarks.bench_' + suite, fromlist=['run'])
+        print("Running %s benchmarks..." % suite, file=sys.stderr)
+        found.update(module.run(quick=args.quick))
+
+    for name in sorted(found):
+        entry = found[name]
+        if 'value' in entry:
+            print("%-45s %14.2f %s" % (name, entry['value'], entry['unit']))
+        else:
+            print("%-45s %14s (%s)" % (name, 'skipped', entry['skipped']))
+
+    if args.output:
+        res.save(found, args.output)
+    return 0
+
+
+def compare(args):
+    rows = res.compare(res.load(args.baseline), res.load(args.current), args.tolerance)
+    regressions = 0
+    for name, before, after, change, regression in rows:
+        flag = 'REGRESSION' if regression else ''
+        print("%-45s %14.2f %14.2f %+8.1f%% %s" % (name, before, after, change * 100, flag))
+        regressions += regression
+
+    if regressions:
+        print("%d of %d benchmarks got worse by more than %.0f%%" % (regressions, len(rows), args.tolerance * 100))
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Benchmarks for the parsers, plugins and streaming pipeline.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('suites', nargs='*', metavar='suite',
+                            help='benchmarks to run: %s (default: all)' % ', '.join(SUITES))
+    run_parser.add_argument('--output', help='store the results in this JSON file')
+    run_parser.add_argument('--quick', action='store_true', help='fewer iterations, less precise')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help='compare results with a baseline')
+    compare_parser.add_argument('baseline', help='JSON file with the baseline results')
+    compare_parser.add_argument('current', help='JSON file with the new results')
+    compare_parser.add_argument('--tolerance', type=float, default=0.1,
+                                help='relative change counted as a regression (default: 0.1)')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    main()
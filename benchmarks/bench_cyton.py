@@ -0,0 +1,69 @@
+"""
+Cyton parser benchmarks: the single packet parser and the bulk decoder in v3 and v4, and the Daisy pairing.
+"""
+import numpy as np
+
+import config as cfg
+import open_bci_v3
+import open_bci_v4
+import packet_decoder as pdec
+
+from benchmarks import streams, timing
+from benchmarks.results import measurement
+
+
+def read_single(board, stream, n):
+    def run():
+        stream.rewind()
+        board.read_state = 0
+        for _ in range(n):
+            board._read_serial_binary()
+    return run
+
+
+def read_bulk(board, stream):
+    def run():
+        stream.rewind()
+        board.decoder.reset()
+        while stream.inWaiting():
+            board._read_serial_frames()
+    return run
+
+
+def run(quick=False):
+    n = 2000 if quick else 20000
+    data = streams.cyton_packets(n)
+    results = {}
+
+    cfg.scaling = 1
+    cfg.logging = False
+    cfg.daisyBoard = False
+
+    for name, module in (('v3', open_bci_v3), ('v4', open_bci_v4)):
+        stream = streams.ByteStream(data)
+        board = streams.cyton_board(module, stream)
+        results['cyton.%s.read_serial_binary' % name] = measurement(
+            timing.rate(read_single(board, stream, n), n), 'packets/s')
+        results['cyton.%s.read_serial_frames' % name] = measurement(
+            timing.rate(read_bulk(board, stream), n), 'packets/s')
+
+    # Daisy pairing on decoded arrays, all at once and in blocks of 32 frames as read while streaming
+    #
+    cfg.daisyBoard = True
+    stream = streams.ByteStream(data)
+    board = streams.cyton_board(open_bci_v4, stream, daisy=True)
+    frames = board.decoder.decode(np.frombuffer(data, dtype=pdec.FRAME_DTYPE))
+    n_frames = len(frames[0])
+
+    def merge_frames():
+        board._merge_daisy_frames(*frames)
+
+    def merge_blocks():
+        for start in range(0, n_frames, 32):
+            board._merge_daisy_frames(*(column[start:start + 32] for column in frames))
+
+    results['cyton.v4.daisy_merge.frames'] = measurement(timing.rate(merge_frames, n_frames), 'packets/s')
+    results['cyton.v4.daisy_merge.blocks'] = measurement(timing.rate(merge_blocks, n_frames), 'packets/s')
+    cfg.daisyBoard = False
+
+    return results
@@ -0,0 +1,42 @@
+"""
+Ganglion parser benchmarks: GanglionDelegate.parse and the delta decompression functions.
+
+open_bci_ganglion needs bluepy, the benchmarks are reported as skipped when it cannot be imported.
+"""
+from benchmarks import streams, timing
+from benchmarks.results import measurement, skipped
+
+NAMES = ('ganglion.parse.18bit', 'ganglion.parse.19bit',
+         'ganglion.decompressDeltas18Bit', 'ganglion.decompressDeltas19Bit')
+
+
+def run(quick=False):
+    try:
+        import open_bci_ganglion as bci
+    except ImportError as e:
+        return {name: skipped(e) for name in NAMES}
+
+    n = 1000 if quick else 10000
+    results = {}
+
+    for bits, decompress in ((18, bci.decompressDeltas18Bit), (19, bci.decompressDeltas19Bit)):
+        packets = streams.ganglion_packets(n, bits=bits)
+        payloads = [packet[1:bits + 1] for packet in packets]
+        delegate = bci.GanglionDelegate(scaling_output=True)
+
+        # Every compressed packet holds two samples
+        #
+        def parse():
+            for packet in packets:
+                delegate.parse(packet)
+            delegate.getSamples()
+
+        def decompress_all():
+            for payload in payloads:
+                decompress(payload)
+
+        results['ganglion.parse.%dbit' % bits] = measurement(timing.rate(parse, 2 * n), 'samples/s')
+        results['ganglion.decompressDeltas%dBit' % bits] = measurement(
+            timing.rate(decompress_all, 2 * n), 'samples/s')
+
+    return results
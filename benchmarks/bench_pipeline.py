@@ -0,0 +1,77 @@
+"""
+End-to-end latency from the moment a sample is due at the (virtual) board until a callback receives it.
+
+A VirtualBoard (see virtual_board.py) streams over a pseudo terminal to a real OpenBCIBoard, so the serial
+port, the parser, the acquisition thread and the streaming loop are all measured together. The virtual board
+records the host time of the 'b' command, so packet k was due at stream_start + (k + 1) / sample_rate.
+The latency includes up to 5 ms of batching in the virtual board itself.
+"""
+import contextlib
+import io
+import threading
+import time
+
+import numpy as np
+
+import config as cfg
+
+from benchmarks.results import measurement, skipped
+
+NAMES = ('pipeline.latency.median', 'pipeline.latency.p95', 'pipeline.latency.max')
+
+
+class Gui(object):
+    """ The parts of the GUI the board talks to. """
+
+    def log_mess(self, message):
+        pass
+
+
+class Controller(object):
+    """ The parts of the controller the board talks to. """
+
+    def clean_up(self):
+        pass
+
+
+def run(quick=False, sample_rate=250):
+    try:
+        import open_bci_v4
+        import virtual_board
+        board = virtual_board.VirtualBoard(sample_rate, seed=0)
+        port = board.start()
+    except Exception as e:
+        return {name: skipped(e) for name in NAMES}
+
+    duration = 2.0 if quick else 10.0
+    received = []
+
+    def sink(sample):
+        received.append(time.time())
+
+    cfg.portUsed = port
+    cfg.daisyBoard = False
+    cfg.scaling = 1
+    cfg.logging = False
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            bci = open_bci_v4.OpenBCIBoard(Controller(), Gui())
+            threading.Timer(duration, lambda: setattr(bci, 'streaming', False)).start()
+            bci.start_streaming([sink])
+            bci.ser.write(b's')
+            bci.ser.close()
+    finally:
+        board.stop()
+
+    if not received:
+        return {name: skipped('no samples received') for name in NAMES}
+
+    # Leave out the first half second, while the port and the threads get going.
+    #
+    due = board.stream_start + (np.arange(len(received)) + 1) / board.sample_rate
+    latency = (np.array(received) - due)[int(board.sample_rate / 2):] * 1000.0
+
+    return {'pipeline.latency.median': measurement(np.median(latency), 'ms', higher_is_better=False),
+            'pipeline.latency.p95': measurement(np.percentile(latency, 95), 'ms', higher_is_better=False),
+            'pipeline.latency.max': measurement(latency.max(), 'ms', higher_is_better=False)}
@@ -0,0 +1,105 @@
+"""
+Cost of one __call__ for every bundled plugin.
+
+The plugins are loaded straight from the plugins folder, activated in a temporary directory (some write files
+into the working directory) with their output hidden, and called with generated samples. A plugin that cannot
+be imported here (missing library) is reported as skipped, any other error fails the benchmark.
+"""
+import configparser
+import contextlib
+import glob
+import importlib.util
+import io
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+import open_bci_v4
+import plugin_interface as plugintypes
+
+from benchmarks import timing
+from benchmarks.results import measurement, skipped
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN_DIR = os.path.join(ROOT_DIR, 'plugins')
+
+# Arguments used to activate plugins that need some. Port 0 lets the system pick a free port for the servers,
+# the plugins sending datagrams need a real one (nothing has to listen).
+#
+PLUGIN_ARGS = {'streamer_tcp_server': ['localhost', '0'],
+               'streamer_osc': ['localhost', '12345'],
+               'udp_server': ['localhost', '12345']}
+
+
+def plugin_modules():
+    """ Returns the (plugin name, module name) of every .yapsy-plugin file. """
+    found = []
+    for info_file in sorted(glob.glob(os.path.join(PLUGIN_DIR, '*.yapsy-plugin'))):
+        info = configparser.ConfigParser()
+        info.read(info_file)
+        found.append((info.get('Core', 'Name'), info.get('Core', 'Module')))
+    return found
+
+
+def load_plugin(module_name):
+    spec = importlib.util.spec_from_file_location('bench_plugin_' + module_name,
+                                                  os.path.join(PLUGIN_DIR, module_name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for value in vars(module).values():
+        if isinstance(value, type) and issubclass(value, plugintypes.IPluginExtended) \
+                and value is not plugintypes.IPluginExtended:
+            return value()
+    raise ImportError('no plugin class in ' + module_name)
+
+
+def make_samples(n, seed=0):
+    random = np.random.RandomState(seed)
+    channels = random.normal(0, 50, (n, 8)).tolist()
+    return [open_bci_v4.OpenBCISample(i % 256, channels[i], [0.0, 0.0, 1.0]) for i in range(n)]
+
+
+def run(quick=False):
+    n = 500 if quick else 5000
+    samples = make_samples(n)
+    results = {}
+
+    # The plugins import modules from the top folder, which must stay importable after the chdir.
+    #
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for name, module_name in plugin_modules():
+                results['plugin.%s.call' % module_name] = bench_plugin(module_name, samples)
+        finally:
+            os.chdir(cwd)
+
+    return results
+
+
+def bench_plugin(module_name, samples):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            plugin = load_plugin(module_name)
+        except ImportError as e:
+            return skipped('%s: %s' % (e.__class__.__name__, e))
+        if not plugin.pre_activate(PLUGIN_ARGS.get(module_name, [])):
+            return skipped('activation failed')
+
+        def call_all():
+            for sample in samples:
+                plugin(sample)
+
+        try:
+            seconds = timing.best_time(call_all)
+        finally:
+            plugin.deactivate()
+
+    return measurement(seconds / len(samples) * 1e6, 'us/call', higher_is_better=False)
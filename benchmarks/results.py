@@ -0,0 +1,60 @@
+"""
+Storing and comparing benchmark results.
+
+A result file is a JSON object with some information about the machine under "meta" and the measurements
+under "results". Each measurement has a value, a unit and whether higher values are better. Benchmarks that
+could not run (e.g. a missing library) are stored with the reason under "skipped".
+"""
+import datetime
+import json
+import platform
+import sys
+
+import numpy as np
+
+
+def measurement(value, unit, higher_is_better=True):
+    return {'value': float(value), 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+def skipped(reason):
+    return {'skipped': str(reason)}
+
+
+def save(results, file_name):
+    data = {'meta': {'date': datetime.datetime.now().isoformat(),
+                     'python': sys.version.split()[0],
+                     'numpy': np.__version__,
+                     'platform': platform.platform(),
+                     'machine': platform.machine()},
+            'results': results}
+    with open(file_name, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def load(file_name):
+    with open(file_name) as f:
+        return json.load(f)
+
+
+def compare(baseline, current, tolerance=0.1):
+    """
+    Compare two result files. Returns a list of (name, baseline value, current value, change, regression) for
+    every measurement found in both. The change is relative, positive when the result got better. A change
+    worse than -tolerance is flagged as a regression.
+    """
+    rows = []
+    old = baseline['results']
+    new = current['results']
+    for name in sorted(set(old) & set(new)):
+        if 'value' not in old[name] or 'value' not in new[name]:
+            continue
+        before = old[name]['value']
+        after = new[name]['value']
+        if before == 0:
+            continue
+        change = (after - before) / before
+        if not old[name].get('higher_is_better', True):
+            change = -change
+        rows.append((name, before, after, change, change < -tolerance))
+    return rows
@@ -0,0 +1,101 @@
+"""
+In-memory data sources for the benchmarks: a byte stream standing in for the serial port, generated Cyton
+packets and Ganglion BLE packets, and boards set up to read from memory instead of a real port.
+"""
+import struct
+
+import numpy as np
+
+import daisy_pairing as dp
+import packet_decoder as pdec
+import packet_log as pl
+
+
+class ByteStream(object):
+    """ Serial port look-alike reading from a bytes object. Only what the parsers use is implemented. """
+
+    def __init__(self, data, chunk=4096):
+        self.data = data
+        self.pos = 0
+        self.chunk = chunk
+
+    def read(self, n=1):
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += len(chunk)
+        return chunk
+
+    def inWaiting(self):
+        return min(len(self.data) - self.pos, self.chunk)
+
+    in_waiting = property(inWaiting)
+
+    def write(self, b):
+        pass
+
+    def rewind(self):
+        self.pos = 0
+
+
+def cyton_packets(n, seed=0):
+    """ Returns the bytes of n well formed Cyton packets with random channel values. """
+    random = np.random.RandomState(seed)
+    frames = np.zeros(n, dtype=pdec.FRAME_DTYPE)
+    frames['start'] = pdec.START_BYTE
+    frames['end'] = pdec.END_BYTE
+    frames['id'] = np.arange(n) % 256
+    frames['channels'] = random.randint(0, 256, (n, 8, 3))
+    frames['aux'] = random.randint(-2000, 2000, (n, 3))
+    return frames.tobytes()
+
+
+def ganglion_packets(n, first_id=1, bits=19, seed=0):
+    """ Returns n compressed Ganglion packets (20 bytes each) with random deltas, ids counting up. """
+    random = np.random.RandomState(seed)
+    offset = 0 if bits == 18 else 100
+    packets = []
+    for i in range(n):
+        packet_id = (first_id - 1 + i) % 100 + 1 + offset
+        packets.append(bytes([packet_id]) + bytes(random.randint(0, 256, 19).tolist()))
+    return packets
+
+
+def cyton_board(module, stream, daisy=False, scaling=True):
+    """
+    Create an OpenBCIBoard from the given module (open_bci_v3 or open_bci_v4) that reads from stream, without
+    opening a serial port.
+    """
+    board = module.OpenBCIBoard.__new__(module.OpenBCIBoard)
+    board.ser = stream
+    board.streaming = False
+    board.read_state = 0
+    board.eeg_channels_per_sample = 8
+    board.aux_channels_per_sample = 3
+    board.imp_channels_per_sample = 0
+    board.packets_dropped = 0
+    board.log_packet_count = 0
+    board.daisy_pairer = dp.DaisyPairer(256)
+
+    # counters of the v4 connection watchdog
+    #
+    board.bytes_received = 0
+    board.frames_decoded = 0
+    board.last_frame_time = 0.0
+
+    # the packet log is always filled, the raw capture is off
+    #
+    board.packet_log = pl.PacketLog()
+    board.capture = None
+
+    # v3 keeps its settings in the object, v4 in the config module
+    #
+    board.log = False
+    board.daisy = daisy
+    board.scaling_output = scaling
+
+    if scaling:
+        board.decoder = pdec.CytonDecoder(module.scale_fac_uVolts_per_count, module.scale_fac_accel_G_per_count)
+        board.layout = pdec.FrameLayout(daisy, module.scale_fac_uVolts_per_count, module.scale_fac_accel_G_per_count)
+    else:
+        board.decoder = pdec.CytonDecoder()
+        board.layout = pdec.FrameLayout(daisy)
+    return board
@@ -0,0 +1,21 @@
+"""
+Timing helpers for the benchmarks.
+"""
+import timeit
+
+
+def best_time(func, repeat=3):
+    """ Run func repeat times and return the shortest time in seconds. """
+    best = None
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        func()
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def rate(func, count, repeat=3):
+    """ Items per second, when one call of func handles count items. """
+    return count / best_time(func, repeat)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3.6
+"""
+Queue of commands for the Cyton board, written by the thread reading the serial port.
+
+Commands (channel on/off, test signals, filters, or any firmware command) can be queued from any thread at any
+time, also while streaming. The reading thread writes everything that is waiting in a single serial write
+between two reads of frames. Commands for the same setting replace each other: toggling a channel off and on
+again before the next write only sends the last state.
+
+Every queued command gets a ticket, telling when it was written and which frames were recorded before it: all
+frames with an index below ticket.frame (counted from the start of the connection) were already sampled when
+the command was written, the following ones can carry its effect. In host time, samples with a timestamp
+before ticket.written_at were recorded before the command.
+
+EXAMPLE USE:
+
+    commands = CommandQueue()
+    ticket = commands.put(b'1', ('channel', 1))
+    ...
+    commands.flush(ser, frames_read)         # in the reading thread, between reads
+    ticket.wait(1.0)
+    print(ticket.frame, ticket.written_at)
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import collections
+import itertools
+import threading
+import time
+
+import packet_decoder as pdec
+
+
+class Ticket(object):
+    """ One queued command and what happened to it. """
+
+    def __init__(self, command, key):
+        self.command = command
+        self.key = key
+        self.queued_at = time.monotonic()
+        self.written_at = None
+        self.frame = None
+        self.superseded = False
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """ Wait until the command was written or replaced by a later one. Returns True if it is done. """
+        return self.done.wait(timeout)
+
+    def __repr__(self):
+        return 'Ticket(%r, frame=%s, superseded=%s)' % (self.command, self.frame, self.superseded)
+
+
+class CommandQueue(object):
+    """
+    Args:
+      history: number of written commands kept in self.history
+    """
+
+    def __init__(self, history=100):
+        self.lock = threading.Lock()
+        self.pending = collections.OrderedDict()
+        self.history = collections.deque(maxlen=history)
+        self.unique = itertools.count()
+
+        # Counters
+        #
+        self.queued = 0
+        self.written = 0
+        self.superseded = 0
+        self.writes = 0
+
+    def put(self, command, key=None):
+        """
+        Queue a command (bytes). A command with the same key as one still waiting replaces it, and is sent
+        in its place after everything queued in between. Without a key a command is never replaced.
+        Returns the Ticket of the command.
+        """
+        if isinstance(command, str):
+            command = command.encode('utf-8')
+        if key is None:
+            key = ('unique', next(self.unique))
+
+        ticket = Ticket(command, key)
+        with self.lock:
+            old = self.pending.pop(key, None)
+            if old is not None:
+                old.superseded = True
+                old.done.set()
+                self.superseded += 1
+            self.pending[key] = ticket
+            self.queued += 1
+        return ticket
+
+    def __len__(self):
+        return len(self.pending)
+
+    def flush(self, ser, frames_read):
+        """
+        Write all waiting commands in one go. frames_read is the number of frames read so far, the frames still
+        waiting in the serial buffer are added to it for the tickets.
+        """
+        if not self.pending:
+            return []
+        with self.lock:
+            tickets = list(self.pending.values())
+            self.pending.clear()
+
+        frame = frames_read + ser.inWaiting() // pdec.FRAME_SIZE
+        ser.write(b''.join(t.command for t in tickets))
+        written_at = time.monotonic()
+
+        for ticket in tickets:
+            ticket.frame = frame
+            ticket.written_at = written_at
+            ticket.done.set()
+            self.history.append(ticket)
+        self.written += len(tickets)
+        self.writes += 1
+        return tickets
+
+    def get_stats(self):
+        return {'queued': self.queued,
+                'written': self.written,
+                'superseded': self.superseded,
+                'writes': self.writes,
+                'pending': len(self.pending)}
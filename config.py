@@ -32,10 +32,108 @@ timeout = 100
 
 scaling = 0
 
+# All packets waiting in the serial buffer are decoded in one pass (see packet_decoder.py). Set to False
+# to fall back on reading the packets one at a time.
+#
+bulk_decoding = True
+
+# In block mode the plugins are called with blocks of samples (see sample_block.py) instead of single samples.
+# A block is sent when block_size samples have been collected or block_latency seconds have passed.
+#
+block_mode = False
+block_size = 32
+block_latency = 0.1
+
+# The serial port is read by a separate acquisition thread, which stores the samples in a ring buffer holding
+# the last ring_seconds seconds. The plugins are called from the streaming thread.
+#
+acquisition_thread = True
+ring_seconds = 60
+
+# Every sample is timestamped from the host clock, smoothed with a linear model of the packet counter against
+# the host time (see sample_clock.py). Reads older than about clock_window seconds no longer count.
+#
+clock_window = 30
+
+# Lost packets are detected from the packet counter and replaced by placeholder samples (see continuity.py):
+# 'nan', 'interpolate' or 'none' (only count them). The recent loss rate is taken over loss_window seconds.
+#
+gap_policy = 'nan'
+loss_window = 10
+
+# The connection watchdog (see connection_watchdog.py) checks the stream every watchdog_interval seconds and
+# reconnects when no valid frame arrived for stall_timeout seconds. Failed reconnects are retried after
+# reconnect_backoff seconds, doubling up to max_reconnect_backoff.
+#
+watchdog_interval = 0.5
+stall_timeout = 2.0
+reconnect_backoff = 1.0
+max_reconnect_backoff = 30
+
+# Commands answered by the board (soft reset, daisy, defaults) are followed by reading the reply, waiting at
+# most handshake_timeout seconds, instead of sleeping (see handshake.py).
+#
+handshake_timeout = 2.0
+
+# When no port is given, the candidate ports are probed in parallel, each for at most probe_timeout seconds.
+# The port found is remembered and tried first next time (see port_discovery.py).
+#
+probe_timeout = 1.0
+
+# The bytes read from the Cyton are written as they came to the file raw_capture (e.g. 'raw_%Y%m%d_%H%M%S.obr',
+# the name goes through time.strftime), None for no capture. The file grows raw_capture_preallocate bytes at a
+# time. Decode it with: python raw_capture.py <file> --output <file>.npz (see raw_capture.py).
+#
+raw_capture = None
+raw_capture_preallocate = 64 * 1024 * 1024
+
+# Every packet read from the Cyton is kept as a binary record in a ring of packet_log_size records. While logging
+# is on, the records are written to the file packet_log (through time.strftime). Read it with:
+# python packet_log.py <file> --list bad (see packet_log.py).
+#
+packet_log = 'packets_%Y%m%d_%H%M%S.obl'
+packet_log_size = 4096
+
 # The default plugin is the one printing on the console.
 #
+# A plugin can be run on its own worker thread by adding the arguments worker=<policy> and worker_depth=<n>,
+# e.g. ['streamer_tcp', 'worker=drop-oldest']. See plugin_worker.py for the policies.
+#
 plugins = [['print']]
 
+# Default queue depth for plugins running on a worker.
+#
+plugin_queue_depth = 256
+
+# The csv_collect plugin writes from a background thread (see file_writer.py). The rows are written after
+# csv_flush_size characters have gathered or after csv_flush_latency seconds. csv_fsync forces them onto the disk:
+# 'never', 'flush' (every write), 'close' or a number of seconds. At most csv_queue_depth samples (or blocks)
+# wait for the writer, the streaming thread waits when the queue is full.
+#
+csv_flush_size = 256 * 1024
+csv_flush_latency = 2.0
+csv_fsync = 'close'
+csv_queue_depth = 4096
+
+# The record plugin writes the counts in chunks of record_chunk_seconds, compressed with zlib at level
+# record_compression (1 fast - 9 small), see recording.py.
+#
+record_chunk_seconds = 10
+record_compression = 6
+
+# The bdf_record plugin writes BDF+ in data records of bdf_record_seconds (a whole number of samples), and sets
+# the number of records in the header every bdf_checkpoint_seconds of recording, see bdf_writer.py.
+#
+bdf_record_seconds = 1
+bdf_checkpoint_seconds = 30
+
+# The recorder plugins (csv_collect, record, bdf_record and the triggered packet collector) roll over to a new file
+# when a file holds segment_seconds of samples or has grown past segment_bytes, and list the files in a session
+# manifest (see segments.py). None for both writes the session into one file.
+#
+segment_seconds = None
+segment_bytes = None
+
 # Temporary settings are set to null, initially.
 
 eeg = None
@@ -69,6 +167,13 @@ image_number = 0
 
 sensornumber = 16  # This also equals the number of rows in a packet.
 
+# The triggered packet collector writes its packets as training data shards into a directory under dataset_dir,
+# dataset_shard_size packets per shard, with one-hot labels from triggerval and a manifest (see
+# dataset_writer.py). None keeps them in memory and saves them as one .npy file at the end.
+#
+dataset_dir = None
+dataset_shard_size = 256
+
 # ========================================================================
 # The array is used to access the trigger values quickly.
 # Example values are:
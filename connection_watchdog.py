@@ -0,0 +1,138 @@
+#!/usr/bin/env python3.6
+"""
+Connection watchdog for the Cyton board.
+
+One thread, started with the first streaming session and kept for the life of the board, looks at the
+counters of the board every interval seconds: bytes received, frames decoded, resynchronisations of the
+decoder and the time since the last valid frame. When the stream has stalled, or too many packets in a row
+were bad, it asks the board to reconnect. Failed attempts are retried with exponential backoff and some
+random jitter, so a board that is gone for a while is not hammered with commands.
+
+The board has to provide:
+
+    streaming, packets_dropped, bytes_received, frames_decoded, last_frame_time (time.monotonic()),
+    decoder.resyncs, reconnect() -> True if the commands were sent, warn(text)
+
+EXAMPLE USE:
+
+    watchdog = Watchdog(board)
+    watchdog.start()
+    ...
+    watchdog.stop()
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import random
+import threading
+import time
+
+
+class Watchdog(object):
+    """
+    Args:
+      board: the OpenBCIBoard to watch
+      interval: seconds between two checks
+      stall_timeout: seconds without a valid frame before reconnecting
+      max_packets_to_skip: bad packets in a row before reconnecting
+      backoff: seconds to wait after the first reconnect before the next one may be tried
+      max_backoff: longest wait between two reconnects
+    """
+
+    def __init__(self, board, interval=0.5, stall_timeout=2.0, max_packets_to_skip=10, backoff=1.0,
+                 max_backoff=30.0):
+        self.board = board
+        self.interval = interval
+        self.stall_timeout = stall_timeout
+        self.max_packets_to_skip = max_packets_to_skip
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.thread = None
+        self.stopped = threading.Event()
+
+        # Reconnects since the stream was last healthy, and when the next one may be tried
+        #
+        self.attempts = 0
+        self.next_attempt = 0.0
+
+        # Counters for the report
+        #
+        self.checks = 0
+        self.reconnects = 0
+        self.failed_reconnects = 0
+        self.last_reason = None
+        self.rates = {'bytes_per_s': 0.0, 'frames_per_s': 0.0, 'resyncs_per_s': 0.0}
+        self.last_counts = None
+
+    def start(self):
+        """ Start the thread, unless it is already running. """
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name="watchdog")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self, timeout=2.0):
+        self.stopped.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            if self.board.streaming:
+                self.check()
+            else:
+                self.last_counts = None
+
+    def check(self):
+        """ Look at the board counters once, and reconnect if needed. """
+        board = self.board
+        now = time.monotonic()
+        self.checks += 1
+
+        counts = (now, board.bytes_received, board.frames_decoded, board.decoder.resyncs)
+        if self.last_counts is not None:
+            elapsed = max(now - self.last_counts[0], 1e-9)
+            self.rates = {'bytes_per_s': (counts[1] - self.last_counts[1]) / elapsed,
+                          'frames_per_s': (counts[2] - self.last_counts[2]) / elapsed,
+                          'resyncs_per_s': (counts[3] - self.last_counts[3]) / elapsed}
+        self.last_counts = counts
+
+        reason = None
+        if now - board.last_frame_time > self.stall_timeout:
+            reason = 'no valid frame for %.1f s' % (now - board.last_frame_time)
+        elif board.packets_dropped > self.max_packets_to_skip:
+            reason = '%d bad packets in a row' % board.packets_dropped
+
+        if reason is None:
+            self.attempts = 0
+            return
+
+        if now < self.next_attempt:
+            return
+
+        self.last_reason = reason
+        board.warn('Connection problem: ' + reason)
+        self.attempts += 1
+        self.reconnects += 1
+        if not board.reconnect():
+            self.failed_reconnects += 1
+
+        # The wait doubles with every attempt that did not bring the stream back, with jitter.
+        #
+        delay = min(self.max_backoff, self.backoff * 2 ** (self.attempts - 1))
+        self.next_attempt = time.monotonic() + delay * random.uniform(0.5, 1.0)
+
+    def get_stats(self):
+        """ Returns the current data rates and the reconnect counters. """
+        stats = {'checks': self.checks,
+                 'reconnects': self.reconnects,
+                 'failed_reconnects': self.failed_reconnects,
+                 'attempts': self.attempts,
+                 'last_reason': self.last_reason}
+        stats.update(self.rates)
+        return stats
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3.6
+"""
+Detection of lost packets from the packet counter of the board, and filling of the gaps.
+
+The boards number their packets with a counter that wraps around (0-255 on Cyton, 0-100 on Ganglion). A jump
+in the counter means packets were lost on the way. Instead of passing on the remaining samples as if nothing
+happened, the tracker can insert placeholder samples where the lost ones should have been, so that everything
+downstream stays evenly sampled:
+
+    nan          placeholders with NaN values
+    interpolate  placeholders linearly interpolated between the samples around the gap
+    none         only count the lost packets
+
+The tracker keeps the number of lost samples since the start and over the last window seconds.
+
+EXAMPLE USE:
+
+    tracker = ContinuityTracker(256, policy='nan')
+    ids, channel_data, aux_data, counts = tracker.fill(ids, channel_data, aux_data)
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import collections
+import time
+
+import numpy as np
+
+POLICIES = ('nan', 'interpolate', 'none')
+
+
+class ContinuityTracker(object):
+    """
+    Follows the packet counter of one stream.
+
+    Args:
+      id_modulo: the counter wraps around to 0 after id_modulo - 1
+      step: expected counter increase between two samples (2 for merged daisy samples)
+      policy: what to insert for lost samples, one of POLICIES
+      window: length in seconds of the window for the recent loss rate
+    """
+
+    def __init__(self, id_modulo, step=1, policy='nan', window=10.0):
+        if policy not in POLICIES:
+            raise ValueError("Unknown gap policy %s, use one of %s" % (policy, ', '.join(POLICIES)))
+        self.id_modulo = id_modulo
+        self.step = step
+        self.policy = policy
+        self.window = window
+
+        # Counters: samples received and lost since the start, and (time, received, lost) of the recent calls
+        #
+        self.received = 0
+        self.lost = 0
+        self.gaps = 0
+        self.recent = collections.deque()
+
+        self.reset()
+
+    def reset(self):
+        """ Forget the last packet, e.g. when streaming is restarted. Counters are kept. """
+        self.last_id = None
+        self.last_channels = None
+        self.last_aux = None
+        self.pending = 0
+
+    def resume(self, missing):
+        """
+        The packet counter starts over (e.g. after a reconnect), with missing samples lost in between. They are
+        counted and filled in before the next sample, whatever its id.
+        """
+        self.last_id = None
+        self.pending = missing
+
+    def missing(self, ids):
+        """ Number of lost samples before each of the packet ids, updating the last id. """
+        ids = np.asarray(ids, dtype=np.int64)
+        previous = np.empty(len(ids), dtype=np.int64)
+        previous[1:] = ids[:-1]
+        previous[0] = ids[0] if self.last_id is None else self.last_id
+
+        # A repeated id is not a gap
+        #
+        steps = (ids - previous) % self.id_modulo
+        missing = np.where(steps > 0, (steps - 1) // self.step, 0)
+        missing[0] += self.pending
+        self.pending = 0
+
+        self.last_id = int(ids[-1])
+        self._count(len(ids), missing)
+        return missing
+
+    def count(self, packet_id):
+        """ Single packet version of missing: returns the number of packets lost before packet_id. """
+        return int(self.missing([packet_id])[0])
+
+    def _count(self, received, missing):
+        lost = int(missing.sum())
+        self.received += received
+        self.lost += lost
+        self.gaps += int(np.count_nonzero(missing))
+
+        now = time.monotonic()
+        self.recent.append((now, received, lost))
+        while self.recent and now - self.recent[0][0] > self.window:
+            self.recent.popleft()
+
+    def fill(self, ids, channel_data, aux_data):
+        """
+        Check a block of samples and insert placeholders for the lost ones, according to the policy.
+
+        Returns (ids, channel_data, aux_data, counts). counts is None if nothing was inserted, otherwise
+        np.repeat(column, counts, axis=0) lines up any other per-sample column with the returned arrays
+        (placeholders get the values of the sample following them).
+        """
+        if len(ids) == 0:
+            return ids, channel_data, aux_data, None
+
+        prev_channels = self.last_channels
+        prev_aux = self.last_aux
+        missing = self.missing(ids)
+
+        self.last_channels = np.array(channel_data[-1], dtype=np.float64)
+        self.last_aux = np.array(aux_data[-1], dtype=np.float64)
+
+        n_missing = int(missing.sum())
+        if self.policy == 'none' or n_missing == 0:
+            return ids, channel_data, aux_data, None
+
+        counts = missing + 1
+        n = len(ids) + n_missing
+
+        # Position of every real sample in the output, and for every placeholder the real sample it comes
+        # before and its rank (1 to m) in its gap.
+        #
+        positions = np.cumsum(counts) - 1
+        before = np.repeat(np.arange(len(ids)), missing)
+        rank = np.arange(n_missing) - np.repeat(np.cumsum(missing) - missing, missing) + 1
+        gap = positions[before] - missing[before] - 1 + rank
+
+        ids = np.asarray(ids)
+        channel_data = np.asarray(channel_data, dtype=np.float64)
+        aux_data = np.asarray(aux_data, dtype=np.float64)
+
+        out_ids = np.empty(n, dtype=ids.dtype)
+        out_ids[positions] = ids
+        out_ids[gap] = (ids[before] - self.step * (missing[before] + 1 - rank)) % self.id_modulo
+
+        out_channels = np.full((n, channel_data.shape[1]), np.nan)
+        out_aux = np.full((n, aux_data.shape[1]), np.nan)
+        out_channels[positions] = channel_data
+        out_aux[positions] = aux_data
+
+        if self.policy == 'interpolate':
+            # The sample before each gap: the previous real sample, from the last block for the first one
+            #
+            prev_channels = prev_channels if prev_channels is not None else channel_data[0]
+            prev_aux = prev_aux if prev_aux is not None else aux_data[0]
+            start_channels = np.vstack([prev_channels, channel_data[:-1]])[before]
+            start_aux = np.vstack([prev_aux, aux_data[:-1]])[before]
+
+            fraction = (rank / (missing[before] + 1.0))[:, np.newaxis]
+            out_channels[gap] = start_channels + (channel_data[before] - start_channels) * fraction
+            out_aux[gap] = start_aux + (aux_data[before] - start_aux) * fraction
+
+        return out_ids, out_channels, out_aux, counts
+
+    def get_stats(self):
+        """ Returns the received and lost samples, and the loss rate since the start and over the window. """
+        recent_received = sum(r for _, r, _ in self.recent)
+        recent_lost = sum(l for _, _, l in self.recent)
+        return {'received': self.received,
+                'lost': self.lost,
+                'gaps': self.gaps,
+                'loss_rate': self.lost / max(1, self.received + self.lost),
+                'window_loss_rate': recent_lost / max(1, recent_received + recent_lost)}
@@ -4,6 +4,7 @@
 #
 import logging
 import config as cfg
+import plugin_worker as pw
 from yapsy.PluginManager import PluginManager
 
 # Importing two static objects.
@@ -47,6 +48,10 @@ class Controller(object):
         self.callback_list = []
         self.plug_list = []
 
+        # Plugins that run on their own thread (see plugin_worker.py).
+        #
+        self.workers = []
+
     # ============================================================
     # Internal functions for the controller. Most of these will be activated from the GUI. These are marked by the
     # type of initialisation, e.g. <MENU>
@@ -87,6 +92,7 @@ class Controller(object):
 
         self.plug_list = []
         self.callback_list = []
+        self.stop_workers()
 
         # Fetch selected plugins from settings, try to activate them, add to the list if OK
         #
@@ -95,7 +101,14 @@ class Controller(object):
             # first value: plugin name, then optional arguments
             #
             plug_name = plug_candidate[0]
-            plug_args = plug_candidate[1:]
+
+            # The worker options (worker=<policy>, worker_depth=<n>) are for us, not for the plugin.
+            #
+            try:
+                policy, depth, plug_args = pw.split_worker_args(plug_candidate[1:], cfg.plugin_queue_depth)
+            except ValueError as e:
+                print("Error while activating [ " + plug_name + " ]: " + str(e))
+                continue
 
             # Try to find name
             #
@@ -118,7 +131,18 @@ class Controller(object):
                 else:
                     print("Plugin [ " + plug_name + "] added to the list")
                     self.plug_list.append(plug.plugin_object)
-                    self.callback_list.append(plug.plugin_object)
+
+                    # A plugin with a worker is called through the queue of the worker instead.
+                    #
+                    if policy is None:
+                        self.callback_list.append(plug.plugin_object)
+                    else:
+                        print("Plugin [ " + plug_name + "] runs on its own worker, policy: " + policy +
+                              ", queue depth: " + str(depth))
+                        worker = pw.PluginWorker(plug.plugin_object, plug_name, policy, depth)
+                        worker.start()
+                        self.workers.append(worker)
+                        self.callback_list.append(worker)
 
         print(self.callback_list)
 
@@ -126,10 +150,24 @@ class Controller(object):
     #
     def clean_up(self):
         self.model.disconnect()
+        self.stop_workers()
         print(dict.get_string('deactivate_plug'))
         for plug in self.plug_list:
             plug.deactivate()
         print(dict.get_string('exiting'))
 
+    # Stop the plugin workers, after letting them finish what is queued, and report their counters.
+    #
+    def stop_workers(self):
+        for worker in self.workers:
+            worker.stop()
+            print("Plugin [ " + worker.name + " ] worker: " + str(worker.get_stats()))
+        self.workers = []
+
+    # Queue depth and drop counters per plugin worker.
+    #
+    def get_worker_stats(self):
+        return {worker.name: worker.get_stats() for worker in self.workers}
+
 # =================================================
 # =================================================
\ No newline at end of file
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3.6
+"""
+Pairing of the main board and daisy frames into 16 channel samples, a whole block of frames at a time.
+
+With a daisy module the board sends its frames alternately: an even packet id for one half of the channels,
+then the next (odd) id for the other half. Two such frames make one sample, with the channels of the odd frame
+first and the average of the aux values (the board averages the channels in the same way). A frame that has no
+partner, because the other half was lost, is dropped and counted.
+
+The pairs are found with array masks over the ids. An even frame at the end of a block is carried over to the
+next block, to be paired with the first frame there.
+
+EXAMPLE USE:
+
+    pairer = DaisyPairer()
+    ids, channel_data, aux_data, second = pairer.pair(ids, channel_data, aux_data)
+    print(pairer.get_stats())
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import numpy as np
+
+
+class DaisyPairer(object):
+    """
+    Args:
+      id_modulo: the packet counter wraps around to 0 after id_modulo - 1
+    """
+
+    def __init__(self, id_modulo=256):
+        self.id_modulo = id_modulo
+
+        # Counters
+        #
+        self.pairs = 0
+        self.unpaired = 0
+
+        self.reset()
+
+    def reset(self):
+        """ Forget the frame carried over, e.g. when streaming is restarted. Counters are kept. """
+        self.carry = None
+
+    def pair(self, ids, channel_data, aux_data):
+        """
+        Pair the frames of a block.
+
+        Returns (ids, channel_data, aux_data, second): the merged samples, and for each of them the index in the
+        given arrays of its odd frame, so that other per-frame columns can be taken with column[second].
+        """
+        ids = np.asarray(ids)
+        channel_data = np.asarray(channel_data)
+        aux_data = np.asarray(aux_data)
+        n_given = len(ids)
+
+        # The frame carried over from the last block goes in front.
+        #
+        offset = 0
+        if self.carry is not None:
+            carry_id, carry_channels, carry_aux = self.carry
+            ids = np.concatenate(([carry_id], ids))
+            channel_data = np.concatenate((carry_channels[np.newaxis], channel_data))
+            aux_data = np.concatenate((carry_aux[np.newaxis], aux_data))
+            offset = 1
+        self.carry = None
+
+        n = len(ids)
+        if n == 0:
+            return (ids.astype(np.int32), channel_data.reshape(0, 2 * channel_data.shape[-1]),
+                    aux_data, np.zeros(0, dtype=np.intp))
+
+        # An even frame followed by the next id starts a pair.
+        #
+        even = ids % 2 == 0
+        first = np.flatnonzero(even[:-1] & ((ids[1:] - ids[:-1]) % self.id_modulo == 1))
+        second = first + 1
+
+        merged_ids = ids[second].astype(np.int32)
+        merged_channels = np.concatenate((channel_data[second], channel_data[first]), axis=1)
+        merged_aux = (aux_data[second] + aux_data[first]) / 2
+
+        # A last even frame may find its partner in the next block.
+        #
+        carried = 0
+        if even[-1]:
+            self.carry = (ids[-1], channel_data[-1].copy(), aux_data[-1].copy())
+            carried = 1
+
+        self.pairs += len(first)
+        self.unpaired += n - 2 * len(first) - carried
+        return merged_ids, merged_channels, merged_aux, second - offset
+
+    def get_stats(self):
+        return {'pairs': self.pairs,
+                'unpaired': self.unpaired}
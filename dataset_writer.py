@@ -0,0 +1,193 @@
+#!/usr/bin/env python3.6
+"""
+Training data for Keras, written as it is collected: fixed-size shards of labelled packets in a directory.
+
+The packets (rows x channels samples) and their labels are gathered into a shard of shard_size packets. A full
+shard is handed to a background thread, which saves it as a pair of .npy files (the packets, and the one-hot
+labels from the label table, cfg.triggerval) and then updates manifest.json. The files are written under a
+temporary name and renamed when complete, so a training job can read the shards listed in the manifest while
+the session is still running, and a crash loses at most the shard being filled.
+
+    <directory>/shard-00000-data.npy      (packets, rows, channels) float32
+    <directory>/shard-00000-labels.npy    (packets, classes) one-hot
+    <directory>/manifest.json             shapes, label table, packets and class totals per shard
+
+The writer collects rows in the same way as PacketStore (see packet_store.py), so the collecting plugins can use
+either.
+
+EXAMPLE USE:
+
+    dataset = DatasetWriter('session', rows=16, channels=16, label_table=cfg.triggerval)
+    for sample in samples:
+        if dataset.add_row(sample.channel_data):
+            dataset.close_packet(label)
+    dataset.close()
+
+    manifest = read_manifest('session')
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+MANIFEST = 'manifest.json'
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        return json.load(f)
+
+
+def load_shards(directory):
+    """ Returns (data, labels) for all complete shards listed in the manifest. """
+    manifest = read_manifest(directory)
+    data = [np.load(os.path.join(directory, shard['data'])) for shard in manifest['shards']]
+    labels = [np.load(os.path.join(directory, shard['labels'])) for shard in manifest['shards']]
+    if not data:
+        return (np.zeros((0, manifest['rows'], manifest['channels']), dtype=np.float32),
+                np.zeros((0, manifest['classes'])))
+    return np.concatenate(data), np.concatenate(labels)
+
+
+def save_atomic(file_name, array):
+    """ np.save under a temporary name, renamed when complete. """
+    with open(file_name + '.tmp', 'wb') as f:
+        np.save(f, array)
+    os.replace(file_name + '.tmp', file_name)
+
+
+class DatasetWriter(object):
+    """
+    Args:
+      directory: where the shards go, created if needed
+      rows: number of samples in a packet
+      channels: number of values in a sample
+      label_table: the one-hot row of every label (trigger value), e.g. cfg.triggerval
+      shard_size: number of packets in a shard
+      depth: number of full shards that may wait for the writer thread, adding rows waits when it is reached
+    """
+
+    def __init__(self, directory, rows, channels, label_table, shard_size=256, depth=4, dtype=np.float32):
+        self.directory = directory
+        self.rows = rows
+        self.channels = channels
+        self.label_table = np.asarray(label_table)
+        self.shard_size = shard_size
+        self.dtype = dtype
+        os.makedirs(directory, exist_ok=True)
+
+        self.manifest = {'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                         'rows': rows,
+                         'channels': channels,
+                         'dtype': np.dtype(dtype).name,
+                         'classes': self.label_table.shape[1],
+                         'label_table': self.label_table.tolist(),
+                         'shard_size': shard_size,
+                         'packets': 0,
+                         'class_totals': [0] * self.label_table.shape[1],
+                         'shards': [],
+                         'complete': False}
+
+        # The shard being filled
+        #
+        self.shard = 0
+        self.data = self._new_shard()
+        self.labels = np.empty(shard_size, dtype=np.int64)
+        self.count = 0
+        self.row = 0
+        self.collected = 0
+
+        self.errors = 0
+        self.queue = queue.Queue(depth)
+        self.thread = threading.Thread(target=self._run, name="dataset " + os.path.basename(directory))
+        self.thread.daemon = True
+        self.thread.start()
+        self._write_manifest()
+
+    def _new_shard(self):
+        return np.empty((self.shard_size, self.rows, self.channels), dtype=self.dtype)
+
+    def __len__(self):
+        """ Packets collected, written or not. """
+        return self.collected
+
+    def add_row(self, values):
+        """ Add one sample to the packet being collected. Returns True when the packet is full. """
+        self.data[self.count, self.row] = values
+        self.row += 1
+        return self.row == self.rows
+
+    def close_packet(self, label):
+        """ Store the label of the full packet and start the next one. A full shard goes to the writer. """
+        self.labels[self.count] = label
+        self.count += 1
+        self.collected += 1
+        self.row = 0
+        if self.count == self.shard_size:
+            self._send_shard()
+
+    def _send_shard(self):
+        self.queue.put((self.shard, self.data[:self.count], self.labels[:self.count]))
+        self.shard += 1
+        self.data = self._new_shard()
+        self.labels = np.empty(self.shard_size, dtype=np.int64)
+        self.count = 0
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                self._write_shard(*item)
+            except (OSError, ValueError) as e:
+                self.errors += 1
+                print("Dataset %s: %s" % (self.directory, e))
+
+    def _write_shard(self, number, data, labels):
+        one_hot = self.label_table[labels]
+        name = 'shard-%05d' % number
+        save_atomic(os.path.join(self.directory, name + '-data.npy'), data)
+        save_atomic(os.path.join(self.directory, name + '-labels.npy'), one_hot)
+
+        class_counts = one_hot.sum(axis=0).tolist()
+        self.manifest['shards'].append({'data': name + '-data.npy',
+                                        'labels': name + '-labels.npy',
+                                        'packets': len(data),
+                                        'class_counts': class_counts,
+                                        'written': time.strftime('%Y-%m-%d %H:%M:%S')})
+        self.manifest['packets'] += len(data)
+        self.manifest['class_totals'] = [a + b for a, b in zip(self.manifest['class_totals'], class_counts)]
+        self._write_manifest()
+
+    def _write_manifest(self):
+        file_name = os.path.join(self.directory, MANIFEST)
+        with open(file_name + '.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(file_name + '.tmp', file_name)
+
+    def close(self):
+        """ Write the last, partly filled shard and mark the manifest complete. The packet being collected is lost. """
+        if self.thread is None:
+            return
+        if self.count:
+            self._send_shard()
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.manifest['complete'] = True
+        self._write_manifest()
+
+    def get_stats(self):
+        return {'packets': len(self),
+                'written': self.manifest['packets'],
+                'shards': len(self.manifest['shards']),
+                'errors': self.errors}
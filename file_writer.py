@@ -0,0 +1,220 @@
+#!/usr/bin/env python3.6
+"""
+Writing to a file from a background thread, for the recorder plugins.
+
+The streaming thread only puts items (samples, blocks, anything) in a bounded queue. The writer thread wakes up
+when half the queue is filled or the oldest item has waited flush_latency seconds, takes everything that is
+waiting, turns the whole batch into text or bytes with the format function given by the
+plugin, and keeps the result in memory until flush_size bytes have gathered or the oldest item has waited
+flush_latency seconds. Then it is written in one go to the file, which stays open for the whole recording.
+
+The fsync policy decides how often the data is forced onto the disk (an SD card may take long to do it):
+
+    never   leave it to the operating system
+    flush   after every write
+    close   only when the file is closed
+    <n>     at most every n seconds, e.g. '5'
+
+When the queue is full, put waits for the writer to catch up (policy 'block', nothing is lost) or drops the
+item and counts it (policy 'drop-newest'). Items put after close are rejected and counted as well.
+
+EXAMPLE USE:
+
+    writer = FileWriter('collect.csv', lambda rows: ''.join(rows), mode='a')
+    writer.start()
+    writer.put('1,2,3\\n')
+    ...
+    writer.close()
+    print(writer.get_stats())
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import collections
+import os
+import threading
+import time
+
+FSYNC_POLICIES = ('never', 'flush', 'close')
+QUEUE_POLICIES = ('block', 'drop-newest')
+
+
+def check_fsync_policy(fsync):
+    """ Returns the policy, a number of seconds for a periodic fsync. Raises ValueError if it is not valid. """
+    if fsync in FSYNC_POLICIES:
+        return fsync
+    try:
+        return float(fsync)
+    except (TypeError, ValueError):
+        raise ValueError("Unknown fsync policy %s, use one of %s or a number of seconds"
+                         % (fsync, ', '.join(FSYNC_POLICIES)))
+
+
+class FileWriter(object):
+    """
+    Args:
+      file_name: the file to write
+      format: function turning a list of queued items into one str (text mode) or bytes (binary mode)
+      mode: the mode the file is opened with, e.g. 'a', 'w' or 'wb'
+      flush_size: bytes (or characters) gathered before they are written
+      flush_latency: seconds an item may wait before it is written
+      fsync: the fsync policy, see above
+      depth: maximum number of queued items
+      policy: what put does when the queue is full, one of QUEUE_POLICIES
+    """
+
+    def __init__(self, file_name, format, mode='a', flush_size=64 * 1024, flush_latency=1.0, fsync='close',
+                 depth=1024, policy='block'):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError("Unknown queue policy %s, use one of %s" % (policy, ', '.join(QUEUE_POLICIES)))
+        self.file_name = file_name
+        self.format = format
+        self.mode = mode
+        self.flush_size = flush_size
+        self.flush_latency = flush_latency
+        self.fsync = check_fsync_policy(fsync)
+        self.depth = depth
+        self.batch = max(1, depth // 2)
+        self.policy = policy
+
+        self.queue = collections.deque()
+        self.changed = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.file = None
+
+        # Formatted data waiting to be written, and when its oldest item was queued
+        #
+        self.pending = []
+        self.pending_size = 0
+        self.oldest = None
+        self.last_sync = time.monotonic()
+
+        # Counters
+        #
+        self.items = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.written = 0
+        self.writes = 0
+        self.syncs = 0
+        self.max_queued = 0
+        self.errors = 0
+
+    def start(self):
+        """ Open the file and start the writer thread. """
+        self.file = open(self.file_name, self.mode)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="writer " + os.path.basename(self.file_name))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, item):
+        """ Queue an item for the format function. Returns False if it was dropped, or the writer is closed. """
+        with self.changed:
+            if len(self.queue) >= self.depth and self.running:
+                if self.policy == 'drop-newest':
+                    self.dropped += 1
+                    return False
+                self.changed.wait_for(lambda: len(self.queue) < self.depth or not self.running)
+            if not self.running:
+                self.rejected += 1
+                return False
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            self.queue.append(item)
+            self.items += 1
+            self.max_queued = max(self.max_queued, len(self.queue))
+
+            # The writer is only woken up for the first item and for a full batch, it is woken up by the timeout
+            # otherwise.
+            #
+            if len(self.queue) == 1 or len(self.queue) >= self.batch:
+                self.changed.notify_all()
+        return True
+
+    def _run(self):
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: self.oldest is not None or not self.running)
+                timeout = max(0.0, self.oldest + self.flush_latency - time.monotonic()) \
+                    if self.oldest is not None else 0.0
+                self.changed.wait_for(lambda: len(self.queue) >= self.batch or not self.running, timeout)
+                items = list(self.queue)
+                self.queue.clear()
+                oldest = self.oldest
+                running = self.running
+                self.changed.notify_all()
+
+            if items:
+                try:
+                    data = self.format(items)
+                except Exception as e:
+                    self.errors += 1
+                    print("Writer for %s: %s" % (self.file_name, e))
+                else:
+                    self.pending.append(data)
+                    self.pending_size += len(data)
+
+            if not running:
+                self._write()
+                return
+            if self.pending_size >= self.flush_size or \
+                    (oldest is not None and time.monotonic() - oldest >= self.flush_latency):
+                self._write()
+
+    def _write(self):
+        """ Write what is pending, then fsync if the policy says so. """
+        with self.changed:
+            self.oldest = time.monotonic() if self.queue else None
+        if not self.pending:
+            return
+        data = self.pending[0][:0].join(self.pending)
+        self.pending = []
+        self.pending_size = 0
+
+        try:
+            self.file.write(data)
+            self.file.flush()
+            self.written += len(data)
+            self.writes += 1
+
+            now = time.monotonic()
+            if self.fsync == 'flush' or (not isinstance(self.fsync, str) and now - self.last_sync >= self.fsync):
+                os.fsync(self.file.fileno())
+                self.last_sync = now
+                self.syncs += 1
+        except OSError as e:
+            self.errors += 1
+            print("Writer for %s: %s" % (self.file_name, e))
+
+    def close(self):
+        """
+        Write everything that is queued, close the file and stop the thread. Waits for the thread to write the
+        last items, the file is not closed under it.
+        """
+        if self.thread is None:
+            return
+        with self.changed:
+            self.running = False
+            self.changed.notify_all()
+        self.thread.join()
+        self.thread = None
+
+        if self.fsync != 'never':
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.syncs += 1
+        self.file.close()
+
+    def get_stats(self):
+        return {'items': self.items,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+                'written': self.written,
+                'writes': self.writes,
+                'syncs': self.syncs,
+                'max_queued': self.max_queued,
+                'errors': self.errors}
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3.6
+"""
+Vectorized decoder for the compressed Ganglion packets.
+
+Each compressed packet holds the deltas of two samples of four channels, packed as eight 18-bit (packet ids
+1-100) or 19-bit (ids 101-200) values, most significant bit first. The least significant bit of each value
+is used as the sign. The deltas are subtracted from the last uncompressed values, sample after sample.
+
+Instead of unpacking one value at a time, all values of a batch of packets are extracted with shifts and
+masks on NumPy arrays, and the absolute values are rebuilt with a cumulative sum.
+
+    Packet ID(1)|8 deltas of 18 or 19 bits(18 or 19)|(18-bit only) Accelerometer(1)
+
+EXAMPLE USE:
+
+    deltas = unpack_deltas(payloads, 19)
+    channel_data = reconstruct(deltas, last_channel_data)
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import numpy as np
+
+# ========================
+# Constant values
+#
+PACKET_SIZE = 20  # bytes in one BLE notification, packet id included
+PAYLOAD_SIZE = 19  # bytes after the packet id
+
+# For every packed value: the first byte it touches and how far a 32-bit big endian word starting at that
+# byte has to be shifted to the right to bring the value to the lowest bits.
+#
+_LAYOUTS = {}
+for _bits in (18, 19):
+    _offsets = np.arange(8) * _bits
+    _LAYOUTS[_bits] = (_offsets // 8, 32 - _bits - _offsets % 8)
+
+
+def unpack_deltas(payloads, bits):
+    """
+    Unpack the deltas of a batch of compressed packets.
+
+    Args:
+      payloads: uint8 array of shape (n_packets, 18 or more), the packets without their id byte
+      bits: 18 or 19, the compression of the packets
+
+    Returns an int64 array of shape (n_packets, 2, 4): two samples of four channels per packet.
+    """
+    payloads = np.asarray(payloads, dtype=np.uint8)
+    first_byte, shift = _LAYOUTS[bits]
+    n_bytes = bits  # eight values of `bits` bits take `bits` bytes
+
+    # Zero padding, so that every value can be read from a 4-byte window.
+    #
+    padded = np.zeros((len(payloads), n_bytes + 3), dtype=np.uint32)
+    padded[:, :n_bytes] = payloads[:, :n_bytes]
+
+    words = ((padded[:, first_byte] << 24) | (padded[:, first_byte + 1] << 16) |
+             (padded[:, first_byte + 2] << 8) | padded[:, first_byte + 3])
+    values = ((words >> shift.astype(np.uint32)) & ((1 << bits) - 1)).astype(np.int64)
+
+    # The LSB is the sign: negative values have all the bits above the value set.
+    #
+    values -= (values & 1) << bits
+
+    return values.reshape(-1, 2, 4)
+
+
+def reconstruct(deltas, last_values):
+    """
+    Turn the deltas of consecutive samples into absolute values.
+
+    Args:
+      deltas: array of shape (n_packets, 2, 4) or (n_samples, 4)
+      last_values: the four channel values preceding the first delta
+
+    Returns an int64 array of shape (n_samples, 4), each sample being the previous one minus its delta.
+    """
+    deltas = np.asarray(deltas, dtype=np.int64).reshape(-1, 4)
+    return np.asarray(last_values, dtype=np.int64) - np.cumsum(deltas, axis=0)
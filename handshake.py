@@ -0,0 +1,216 @@
+#!/usr/bin/env python3.6
+"""
+Command handshake with the Cyton board over the serial port.
+
+The firmware answers some commands with a text ending in '$$$': the banner after a soft reset ('v'), the
+daisy replies ('C' and 'c'), the default channel settings ('d'), the register dump ('?'). From firmware 2
+on, the channel settings ('x...X'), the lead-off settings ('z...Z') and the test signals are answered too.
+Instead of sleeping a fixed time after every command, the replies are read as soon as they come in, up to a
+timeout. Several commands can be written in one go, the replies are then matched to the commands in order.
+Whatever the other commands print is collected for a short while afterwards, so that it does not show up
+after the next command.
+
+The banner tells the firmware version and whether a daisy module is present.
+
+EXAMPLE USE:
+
+    handshake = Handshake(ser, timeout=2.0)
+    banner = handshake.reset()
+    print(banner.firmware, banner.daisy)
+    replies = handshake.send('cd')
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import re
+import time
+
+# ========================
+# Constant values
+#
+TERMINATOR = b'$$$'
+
+# Commands answered with a text ending in TERMINATOR, by all firmwares
+#
+ACKNOWLEDGED = 'vCcdD?'
+
+# Commands answered with a text ending in TERMINATOR from firmware 2 on: the test signals, and the channel
+# (x...X) and lead-off (z...Z) settings, which are sent as one command each
+#
+ACKNOWLEDGED_V2 = '0-=p[]xz'
+SETTINGS_END = {'x': 'X', 'z': 'Z'}
+
+# Time, in seconds, without new bytes after which the output of the other commands is taken as complete
+#
+DRAIN = 0.1
+
+# Time to wait for more bytes in one serial read while waiting for a reply
+#
+POLL = 0.01
+
+
+class Banner(object):
+    """
+    The text sent by the board after a soft reset, e.g.
+
+        OpenBCI V3 8-16 channel
+        On Board ADS1299 Device ID: 0x3E
+        On Daisy ADS1299 Device ID: 0x3E
+        LIS3DH Device ID: 0x33
+        Firmware: v3.1.1
+        $$$
+    """
+
+    def __init__(self, text):
+        # Whatever was still on its way from a stopped stream comes before the banner
+        #
+        start = text.find('OpenBCI')
+        if start > 0:
+            text = text[start:]
+        self.text = text
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        self.board = lines[0] if lines else ''
+        self.valid = 'OpenBCI' in text
+        self.daisy = 'On Daisy' in text
+
+        # The 8-bit boards do not tell their firmware version
+        #
+        match = re.search(r'Firmware:\s*v?([\d.]+)', text)
+        self.firmware = match.group(1) if match else None
+
+    def __str__(self):
+        return self.text
+
+
+def split_commands(commands):
+    """ Split a string of commands in single commands, a channel or lead-off setting being one command. """
+    result = []
+    i = 0
+    while i < len(commands):
+        end = i
+        if commands[i] in SETTINGS_END:
+            end = commands.find(SETTINGS_END[commands[i]], i + 1)
+            end = len(commands) - 1 if end < 0 else end
+        result.append(commands[i:end + 1])
+        i = end + 1
+    return result
+
+
+class Handshake(object):
+    """
+    Sends commands and reads their replies.
+
+    Args:
+      ser: the open serial port
+      timeout: longest wait, in seconds, for one reply
+    """
+
+    def __init__(self, ser, timeout=2.0):
+        self.ser = ser
+        self.timeout = timeout
+
+        # Bytes read after the end of the last reply
+        #
+        self.pending = bytearray()
+
+        # Firmware version from the last banner, None while unknown (8-bit boards do not tell it)
+        #
+        self.firmware = None
+
+    def acknowledges(self, command):
+        """ True if the board answers the command with a text ending in TERMINATOR. """
+        if command[0] in ACKNOWLEDGED:
+            return True
+        if command[0] not in ACKNOWLEDGED_V2 or self.firmware is None:
+            return False
+        return int(self.firmware.split('.')[0]) >= 2
+
+    def drain(self, quiet=DRAIN):
+        """ Read until no byte came in for quiet seconds. Returns the text read since the last reply. """
+        saved_timeout = self.ser.timeout
+        self.ser.timeout = POLL
+        try:
+            last = time.monotonic()
+            while time.monotonic() - last < quiet:
+                data = self.ser.read(max(1, self.ser.inWaiting()))
+                if data:
+                    self.pending += data
+                    last = time.monotonic()
+        finally:
+            self.ser.timeout = saved_timeout
+
+        text = bytes(self.pending).decode('utf-8', errors='replace')
+        self.pending = bytearray()
+        return text
+
+    def read_reply(self, timeout=None):
+        """ Read up to and including the next TERMINATOR. Returns the text, or None on timeout. """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        # The serial timeout of the board is long, only short reads are used here.
+        #
+        saved_timeout = self.ser.timeout
+        self.ser.timeout = POLL
+        try:
+            while TERMINATOR not in self.pending and time.monotonic() < deadline:
+                self.pending += self.ser.read(max(1, self.ser.inWaiting()))
+        finally:
+            self.ser.timeout = saved_timeout
+
+        end = self.pending.find(TERMINATOR)
+        if end < 0:
+            return None
+        end += len(TERMINATOR)
+        reply = bytes(self.pending[:end]).decode('utf-8', errors='replace')
+        del self.pending[:end]
+        return reply
+
+    def send(self, commands, timeout=None):
+        """
+        Write all commands at once and wait for the replies of the acknowledged ones (see acknowledges).
+
+        Returns a list of (command, reply) for the acknowledged commands, reply being None if it did not come.
+        After a missing reply the remaining ones are not waited for. If some commands are not acknowledged,
+        what the board prints until it stays quiet for DRAIN seconds is added last as (None, text).
+        """
+        if isinstance(commands, str):
+            commands = commands.encode('utf-8')
+        self.ser.write(commands)
+
+        replies = []
+        missing = False
+        unacknowledged = False
+        for command in split_commands(commands.decode('utf-8', errors='replace')):
+            if not self.acknowledges(command):
+                unacknowledged = True
+                continue
+            reply = None if missing else self.read_reply(timeout)
+            missing = reply is None
+            replies.append((command, reply))
+
+        if unacknowledged and not missing:
+            text = self.drain()
+            if text:
+                replies.append((None, text))
+        return replies
+
+    def reset(self, stop=True, attempts=3):
+        """
+        Soft reset the board ('v', preceded by 's' to stop a running stream) and return its Banner, or None
+        if it did not answer. Boards that reboot when the port is opened may miss the first 'v', hence the
+        attempts.
+        """
+        for attempt in range(attempts):
+            if stop and attempt == 0:
+                self.ser.write(b's')
+            self.ser.reset_input_buffer()
+            self.pending = bytearray()
+            _, reply = self.send(b'v')[0]
+            if reply is not None:
+                banner = Banner(reply)
+                self.firmware = banner.firmware
+                return banner
+        return None
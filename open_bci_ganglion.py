@@ -15,14 +15,22 @@ TODO: support impedance
 TODO: reset board with 'v'?
 """
 import atexit
+import collections
 import logging
 import struct
 # local bluepy should take precedence
 import sys
+import time
 import timeit
 
 import numpy as np
 
+import continuity as ct
+import ganglion_decoder as gdec
+import port_discovery as pd
+import sample_block as sb
+import sample_clock as sc
+
 sys.path.insert(0, "bluepy/bluepy")
 
 from btle import Scanner, DefaultDelegate, Peripheral
@@ -56,12 +64,13 @@ class OpenBCIBoard(object):
       impedance: measures impedance when start streaming
       timeout: in seconds, if set will try to disconnect / reconnect after a period without new data -- should be high if impedance check
       max_packets_to_skip: will try to disconnect / reconnect after too many packets are skipped
+      gap_policy: samples inserted for lost packets, 'nan', 'interpolate' or 'none' (see continuity.py)
       baud, filter_data, daisy: Not used, for compatibility with v3
     """
 
     def __init__(self, port=None, baud=0, filter_data=False,
                  scaled_output=True, daisy=False, log=True, aux=False, impedance=False, timeout=2,
-                 max_packets_to_skip=20):
+                 max_packets_to_skip=20, gap_policy='nan'):
         # unused, for compatibility with Cyton v3 API
         self.daisy = False
         # these one are used
@@ -93,6 +102,11 @@ class OpenBCIBoard(object):
         self.packets_dropped = 0
         self.time_last_packet = 0
 
+        # Timestamps for the samples, see sample_clock.py. Sample ids go from 0 (raw packet) to 200.
+        self.clock = sc.SampleClock(SAMPLE_RATE, 201)
+        # Lost samples are replaced according to gap_policy, see continuity.py
+        self.continuity = ct.ContinuityTracker(201, 1, gap_policy)
+
         # Disconnects from board when terminated
         atexit.register(self.disconnect)
 
@@ -101,7 +115,10 @@ class OpenBCIBoard(object):
         return self.board_type
 
     def setImpedance(self, flag):
-        """ Enable/disable impedance measure """
+        """ Enable/disable impedance measure. The packet counter starts over, and so do the clock and gap filling. """
+        if self.impedance != bool(flag):
+            self.clock.reset()
+            self.continuity.reset()
         self.impedance = bool(flag)
 
     def connect(self):
@@ -162,15 +179,24 @@ class OpenBCIBoard(object):
         self.streaming = True
         self.packets_dropped = 0
         self.time_last_packet = timeit.default_timer()
+        self.clock.reset()
+        self.continuity.reset()
 
     def find_port(self):
-        """Detects Ganglion board MAC address -- if more than 1 around, will select first. Needs root privilege."""
+        """
+        Detects Ganglion board MAC address -- if more than 1 around, will select the one used last time, or the first.
+        Needs root privilege. The scan stops as soon as the Ganglion used last time is seen (see port_discovery.py).
+        """
 
         print(
             "Try to detect Ganglion MAC address. NB: Turn on bluetooth and run as root for this to work! Might not work with every BLE dongles.")
         scan_time = 5
         print("Scanning for 5 seconds nearby devices...")
 
+        cache = pd.PortCache()
+        _, cached_mac = cache.get('ganglion')
+        ganglions = collections.OrderedDict()
+
         #   From bluepy example
         class ScanDelegate(DefaultDelegate):
             def __init__(self):
@@ -182,37 +208,42 @@ class OpenBCIBoard(object):
                 elif isNewData:
                     print("Received new data from: " + dev.addr)
 
-        scanner = Scanner().withDelegate(ScanDelegate())
-        devices = scanner.scan(scan_time)
-
-        nb_devices = len(devices)
-        if nb_devices < 1:
-            print("No BLE devices found. Check connectivity.")
-            return ""
-        else:
-            print("Found " + str(nb_devices) + ", detecting Ganglion")
-            list_mac = []
-            list_id = []
-
-            for dev in devices:
                 # "Ganglion" should appear inside the "value" associated to "Complete Local Name", e.g. "Ganglion-b2a6"
                 for (adtype, desc, value) in dev.getScanData():
-                    if desc == "Complete Local Name" and value.startswith("Ganglion"):
-                        list_mac.append(dev.addr)
-                        list_id.append(value)
+                    if desc == "Complete Local Name" and value.startswith("Ganglion") and dev.addr not in ganglions:
+                        ganglions[dev.addr] = value
                         print("Got Ganglion: " + value + ", with MAC: " + dev.addr)
                         break
-        nb_ganglions = len(list_mac)
 
+        scanner = Scanner().withDelegate(ScanDelegate())
+        scanner.clear()
+        scanner.start()
+        deadline = time.monotonic() + scan_time
+        try:
+            while time.monotonic() < deadline and cached_mac not in ganglions:
+                scanner.process(0.2)
+        finally:
+            scanner.stop()
+
+        if len(scanner.getDevices()) < 1:
+            print("No BLE devices found. Check connectivity.")
+            return ""
+
+        nb_ganglions = len(ganglions)
         if nb_ganglions < 1:
             print("No Ganglion found ;(")
             raise OSError('Cannot find OpenBCI Ganglion MAC address')
 
-        if nb_ganglions > 1:
-            print("Found " + str(nb_ganglions) + ", selecting first")
+        if cached_mac in ganglions:
+            mac = cached_mac
+        else:
+            if nb_ganglions > 1:
+                print("Found " + str(nb_ganglions) + ", selecting first")
+            mac = next(iter(ganglions))
 
-        print("Selecting MAC address " + list_mac[0] + " for " + list_id[0])
-        return list_mac[0]
+        print("Selecting MAC address " + mac + " for " + ganglions[mac])
+        cache.remember('ganglion', mac, mac)
+        return mac
 
     def ser_write(self, b):
         """Access serial port object for write"""
@@ -252,8 +283,8 @@ class OpenBCIBoard(object):
         for every single sample that is processed
 
         Args:
-          callback: A callback function -- or a list of functions -- that will receive a single argument of the
-              OpenBCISample object captured.
+          callback: A callback function -- or a list of functions -- that will receive a single argument, the
+              sample captured (a sample_block.SampleView, compatible with OpenBCISample).
         """
         if not self.streaming:
             self.init_streaming()
@@ -269,15 +300,27 @@ class OpenBCIBoard(object):
             try:
                 # at most we will get one sample per packet
                 self.waitForNotifications(1. / self.getSampleRate())
+                # take in the rest of a burst of notifications too, so it is decoded as one batch
+                for _ in range(100):
+                    if not self.gang.waitForNotifications(0):
+                        break
             except Exception as e:
                 print("Something went wrong while waiting for a new sample: " + str(e))
             # retrieve current samples on the stack
             samples = self.delegate.getSamples()
+            if self.impedance:
+                # The impedance packets carry the channel (1..5) as their id, not a packet counter: they get the
+                # host time, and neither the clock nor the gap filling sees them.
+                samples.timestamps = np.full(len(samples), time.monotonic())
+            else:
+                samples = self.fillGaps(samples)
+                samples.timestamps = self.clock.update(samples.ids, time.monotonic_ns())
             self.packets_dropped = self.delegate.getMaxPacketsDropped()
             if samples:
                 self.time_last_packet = timeit.default_timer()
+                block = samples.to_block()
                 for call in callback:
-                    for sample in samples:
+                    for sample in block:
                         call(sample)
 
             if (lapse > 0 and timeit.default_timer() - start_time > lapse):
@@ -288,6 +331,18 @@ class OpenBCIBoard(object):
             # Checking connection -- timeout and packets dropped
             self.check_connection()
 
+    def fillGaps(self, samples):
+        """ Insert placeholder samples for the lost ones, see continuity.py. Returns a SampleBatch. """
+        ids, channel_data, aux_data, counts = self.continuity.fill(samples.ids, samples.channel_data,
+                                                                   samples.aux_data)
+        if counts is None:
+            return samples
+        return SampleBatch(ids, channel_data, aux_data, np.repeat(samples.imp_data, counts, axis=0))
+
+    def getLossStats(self):
+        """ Returns the counters of lost samples, see continuity.py. """
+        return self.continuity.get_stats()
+
     def waitForNotifications(self, delay):
         """ Allow some time for the board to receive new data. """
         self.gang.waitForNotifications(delay)
@@ -412,11 +467,127 @@ class OpenBCIBoard(object):
 class OpenBCISample(object):
     """Object encapulsating a single sample from the OpenBCI board."""
 
-    def __init__(self, packet_id, channel_data, aux_data, imp_data):
+    __slots__ = ('id', 'channel_data', 'aux_data', 'imp_data', 'timestamp')
+
+    def __init__(self, packet_id, channel_data, aux_data, imp_data, timestamp=None):
         self.id = packet_id
         self.channel_data = channel_data
         self.aux_data = aux_data
         self.imp_data = imp_data
+        # host time in seconds (time.monotonic() clock), see sample_clock.py
+        self.timestamp = timestamp
+
+
+class SampleBatch(object):
+    """
+    The samples taken from a SampleStore at once, as arrays (n_samples rows each).
+
+    Iterating over a batch gives single samples, so callers written for a list of samples keep working. The
+    arrays are views on the SampleStore: to_block() copies them into a compact SampleBlock that can be kept.
+    The timestamps are set by the board when it claims the batch.
+    """
+
+    def __init__(self, ids, channel_data, aux_data, imp_data):
+        self.ids = ids
+        self.channel_data = channel_data
+        self.aux_data = aux_data
+        self.imp_data = imp_data
+        self.timestamps = np.full(len(ids), np.nan)
+        self.count = len(ids)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.to_block())
+
+    def to_block(self):
+        """ Returns the samples as a SampleBlock of their own (float32 values, int32 ids and impedances). """
+        return sb.SampleBlock(np.array(self.ids), np.array(self.channel_data, dtype=np.float32),
+                              np.array(self.aux_data, dtype=np.float32), np.array(self.timestamps),
+                              np.array(self.imp_data, dtype=np.int32))
+
+
+class SampleStore(object):
+    """
+    Preallocated storage for the decoded samples, until OpenBCIBoard claims them.
+
+    There are two sets of arrays. The delegate writes into one of them while the samples taken by the last
+    call to take() are read from the other, so take() can return views instead of copies. The views are
+    valid until the next call to take(). The arrays grow (doubling) if more samples arrive between two calls.
+
+    Args:
+      n_channels, n_aux, n_imp: number of values per sample
+      channel_scale, aux_scale: factors applied to the values when they are taken, None to keep counts
+      capacity: initial number of samples per set of arrays
+    """
+
+    def __init__(self, n_channels=4, n_aux=3, n_imp=5, channel_scale=None, aux_scale=None, capacity=256):
+        self.shape = (n_channels, n_aux, n_imp)
+        self.channel_scale = channel_scale
+        self.aux_scale = aux_scale
+        self.buffers = [self._allocate(capacity), self._allocate(capacity)]
+        self.active = 0
+        self.count = 0
+
+    def _allocate(self, capacity):
+        n_channels, n_aux, n_imp = self.shape
+        return (np.zeros(capacity, dtype=np.int32),
+                np.zeros((capacity, n_channels), dtype=np.float64),
+                np.zeros((capacity, n_aux), dtype=np.float64),
+                np.zeros((capacity, n_imp), dtype=np.int64))
+
+    def _reserve(self, n):
+        """ Make room for n more samples in the active arrays. """
+        buffer = self.buffers[self.active]
+        capacity = len(buffer[0])
+        if self.count + n <= capacity:
+            return buffer
+
+        while capacity < self.count + n:
+            capacity *= 2
+        grown = self._allocate(capacity)
+        for old, new in zip(buffer, grown):
+            new[:self.count] = old[:self.count]
+        self.buffers[self.active] = grown
+        return grown
+
+    def append(self, sample_id, chan_data, aux_data, imp_data):
+        """ Add one sample. """
+        ids, channel_data, aux, imp = self._reserve(1)
+        i = self.count
+        ids[i] = sample_id
+        channel_data[i] = chan_data
+        aux[i] = aux_data
+        imp[i] = imp_data
+        self.count += 1
+
+    def extend(self, sample_ids, chan_data, aux_data, imp_data):
+        """ Add a number of samples, given as arrays with one row per sample (imp_data: one row for all). """
+        n = len(sample_ids)
+        ids, channel_data, aux, imp = self._reserve(n)
+        start = self.count
+        ids[start:start + n] = sample_ids
+        channel_data[start:start + n] = chan_data
+        aux[start:start + n] = aux_data
+        imp[start:start + n] = imp_data
+        self.count += n
+
+    def take(self):
+        """ Return the stored samples as a SampleBatch of views, scaled, and start filling the other arrays. """
+        n = self.count
+        ids, channel_data, aux, imp = self.buffers[self.active]
+        batch = SampleBatch(ids[:n], channel_data[:n], aux[:n], imp[:n])
+
+        # Scaling is done once for the whole batch
+        if self.channel_scale is not None:
+            batch.channel_data *= self.channel_scale
+        if self.aux_scale is not None:
+            batch.aux_data *= self.aux_scale
+
+        self.active = 1 - self.active
+        self.count = 0
+        return batch
 
 
 class GanglionDelegate(DefaultDelegate):
@@ -425,16 +596,24 @@ class GanglionDelegate(DefaultDelegate):
     def __init__(self, scaling_output=True):
         DefaultDelegate.__init__(self)
         # holds samples until OpenBCIBoard claims them
-        self.samples = []
+        if scaling_output:
+            self.samples = SampleStore(4, 3, 5, scale_fac_uVolts_per_count, scale_fac_accel_G_per_count)
+        else:
+            self.samples = SampleStore(4, 3, 5)
         # detect gaps between packets
         self.last_id = -1
         self.packets_dropped = 0
         # save uncompressed data to compute deltas
         self.lastChannelData = [0, 0, 0, 0]
+        # compressed packets waiting to be decoded together, and their compression (18 or 19 bits)
+        self.pending = []
+        self.pending_bits = None
         # 18bit data got here and then accelerometer with it
         self.lastAcceleromoter = [0, 0, 0]
         # when the board is manually set in the right mode (z to start, Z to stop), impedance will be measured. 4 channels + ref
         self.lastImpedance = [0, 0, 0, 0, 0]
+        # packet ids loop every 101 packets
+        self.packet_counter = ct.ContinuityTracker(101, 1, 'none')
         self.scaling_output = scaling_output
         # handling incoming ASCII messages
         self.receiving_ASCII = False
@@ -462,18 +641,25 @@ class GanglionDelegate(DefaultDelegate):
         start_byte = unpac[0]
 
         # Give the informative part of the packet to proper handler -- split between ID and data bytes
-        # Raw uncompressed
-        if start_byte == 0:
-            self.receiving_ASCII = False
-            self.parseRaw(start_byte, unpac[1:])
+        # Compressed packets are queued and decoded in batches, see parseCompressed
         # 18-bit compression with Accelerometer
-        elif start_byte >= 1 and start_byte <= 100:
+        if start_byte >= 1 and start_byte <= 100:
             self.receiving_ASCII = False
-            self.parse18bit(start_byte, unpac[1:])
+            self.queueCompressed(18, unpac)
+            return
         # 19-bit compression without Accelerometer
         elif start_byte >= 101 and start_byte <= 200:
             self.receiving_ASCII = False
-            self.parse19bit(start_byte - 100, unpac[1:])
+            self.queueCompressed(19, unpac)
+            return
+
+        # Other packets must be handled after the compressed packets that came before them
+        self.flushCompressed()
+
+        # Raw uncompressed
+        if start_byte == 0:
+            self.receiving_ASCII = False
+            self.parseRaw(start_byte, unpac[1:])
         # Impedance Channel
         elif start_byte >= 201 and start_byte <= 205:
             self.receiving_ASCII = False
@@ -492,6 +678,23 @@ class GanglionDelegate(DefaultDelegate):
         else:
             print("Warning: unknown type of packet: " + str(start_byte))
 
+    def queueCompressed(self, bits, packet):
+        """ Keep a compressed packet until the batch is decoded. A change of compression ends the batch. """
+        if len(packet) != gdec.PACKET_SIZE:
+            print('Wrong size, for %d-bit compression data %d instead of 19 bytes' % (bits, len(packet) - 1))
+            return
+        if self.pending_bits != bits:
+            self.flushCompressed()
+            self.pending_bits = bits
+        self.pending.append(bytes(packet))
+
+    def flushCompressed(self):
+        """ Decode the queued compressed packets. """
+        if self.pending:
+            packets = self.pending
+            self.pending = []
+            self.parseCompressed(self.pending_bits, packets)
+
     def parseRaw(self, packet_id, packet):
         """ Dealing with "Raw uncompressed" """
         if len(packet) != 19:
@@ -509,56 +712,56 @@ class GanglionDelegate(DefaultDelegate):
 
     def parse19bit(self, packet_id, packet):
         """ Dealing with "19-bit compression without Accelerometer" """
-        if len(packet) != 19:
-            print('Wrong size, for 19-bit compression data' + str(len(data)) + ' instead of 19 bytes')
-            return
-
-        # should get 2 by 4 arrays of uncompressed data
-        deltas = decompressDeltas19Bit(packet)
-        # the sample_id will be shifted
-        delta_id = 1
-        for delta in deltas:
-            # convert from packet to sample id
-            sample_id = (packet_id - 1) * 2 + delta_id
-            # 19bit packets hold deltas between two samples
-            # TODO: use more broadly numpy
-            full_data = list(np.array(self.lastChannelData) - np.array(delta))
-            # NB: aux data updated only in 18bit mode, send values here only to be consistent
-            self.pushSample(sample_id, full_data, self.lastAcceleromoter, self.lastImpedance)
-            self.lastChannelData = full_data
-            delta_id += 1
-        self.updatePacketsCount(packet_id)
+        self.flushCompressed()
+        self.queueCompressed(19, bytes([packet_id + 100]) + bytes(packet))
+        self.flushCompressed()
 
     def parse18bit(self, packet_id, packet):
-        """ Dealing with "18-bit compression without Accelerometer" """
-        if len(packet) != 19:
-            print('Wrong size, for 18-bit compression data' + str(len(data)) + ' instead of 19 bytes')
-            return
+        """ Dealing with "18-bit compression with Accelerometer" """
+        self.flushCompressed()
+        self.queueCompressed(18, bytes([packet_id]) + bytes(packet))
+        self.flushCompressed()
 
-        # accelerometer X
-        if packet_id % 10 == 1:
-            self.lastAcceleromoter[0] = conv8bitToInt8(packet[18])
-        # accelerometer Y
-        elif packet_id % 10 == 2:
-            self.lastAcceleromoter[1] = conv8bitToInt8(packet[18])
-        # accelerometer Z
-        elif packet_id % 10 == 3:
-            self.lastAcceleromoter[2] = conv8bitToInt8(packet[18])
-
-        # deltas: should get 2 by 4 arrays of uncompressed data
-        deltas = decompressDeltas18Bit(packet[:-1])
-        # the sample_id will be shifted
-        delta_id = 1
-        for delta in deltas:
-            # convert from packet to sample id
-            sample_id = (packet_id - 1) * 2 + delta_id
-            # 19bit packets hold deltas between two samples
-            # TODO: use more broadly numpy
-            full_data = list(np.array(self.lastChannelData) - np.array(delta))
-            self.pushSample(sample_id, full_data, self.lastAcceleromoter, self.lastImpedance)
-            self.lastChannelData = full_data
-            delta_id += 1
-        self.updatePacketsCount(packet_id)
+    def parseCompressed(self, bits, packets):
+        """
+        Dealing with a batch of compressed packets (whole packets, id included), all with the same compression.
+        The deltas of all packets are unpacked at once and turned into channel values with a cumulative sum
+        starting from the last uncompressed values, see ganglion_decoder.py.
+        """
+        data = np.frombuffer(b''.join(packets), dtype=np.uint8).reshape(-1, gdec.PACKET_SIZE)
+        # 19bit packets are numbered from 101
+        packet_ids = data[:, 0].tolist() if bits == 18 else (data[:, 0] - 100).tolist()
+
+        # should get 2 by 4 arrays of uncompressed data per packet
+        deltas = gdec.unpack_deltas(data[:, 1:], bits)
+        full_data = gdec.reconstruct(deltas, self.lastChannelData)
+
+        # sample ids: two per packet, shifted
+        sample_ids = np.repeat((np.array(packet_ids) - 1) * 2, 2) + np.tile([1, 2], len(packet_ids))
+
+        # accelerometer X, Y and Z come in packets 1, 2 and 3 of every ten (18bit mode only). Each packet carries
+        # the last value received for every axis.
+        # NB: aux data updated only in 18bit mode, send values here only to be consistent
+        aux_data = np.tile(np.array(self.lastAcceleromoter, dtype=np.float64), (len(packet_ids), 1))
+        if bits == 18:
+            axes = np.array(packet_ids) % 10 - 1
+            for axis in range(3):
+                received = np.flatnonzero(axes == axis)
+                if len(received):
+                    values = data[received, 19].astype(np.int8)
+                    # index of the last packet with a value for this axis, -1 before the first one
+                    last = np.full(len(packet_ids), -1)
+                    last[received] = np.arange(len(received))
+                    last = np.maximum.accumulate(last)
+                    aux_data[last >= 0, axis] = values[last[last >= 0]]
+                    self.lastAcceleromoter[axis] = int(values[-1])
+
+        self.samples.extend(sample_ids, full_data, np.repeat(aux_data, 2, axis=0), self.lastImpedance)
+
+        for packet_id in packet_ids:
+            self.updatePacketsCount(packet_id)
+
+        self.lastChannelData = full_data[-1].tolist()
 
     def parseImpedance(self, packet_id, packet):
         """ Dealing with impedance data. packet: ASCII data. NB: will take few packet (seconds) to fill"""
@@ -572,33 +775,24 @@ class GanglionDelegate(DefaultDelegate):
         self.pushSample(packet_id - 200, self.lastChannelData, self.lastAcceleromoter, self.lastImpedance)
 
     def pushSample(self, sample_id, chan_data, aux_data, imp_data):
-        """ Add a sample to inner stack, setting ID and dealing with scaling if necessary. """
-        if self.scaling_output:
-            chan_data = list(np.array(chan_data) * scale_fac_uVolts_per_count)
-            aux_data = list(np.array(aux_data) * scale_fac_accel_G_per_count)
-        sample = OpenBCISample(sample_id, chan_data, aux_data, imp_data)
-        self.samples.append(sample)
+        """ Add a sample to inner stack, setting ID. Scaling is done when the samples are claimed. """
+        self.samples.append(sample_id, chan_data, aux_data, imp_data)
 
     def updatePacketsCount(self, packet_id):
         """Update last packet ID and dropped packets"""
-        if self.last_id == -1:
-            self.last_id = packet_id
-            self.packets_dropped = 0
-            return
-        # ID loops every 101 packets
-        if packet_id > self.last_id:
-            self.packets_dropped = packet_id - self.last_id - 1
-        else:
-            self.packets_dropped = packet_id + 101 - self.last_id - 1
+        self.packets_dropped = self.packet_counter.count(packet_id)
         self.last_id = packet_id
         if self.packets_dropped > 0:
             print("Warning: dropped " + str(self.packets_dropped) + " packets.")
 
     def getSamples(self):
-        """ Retrieve and remove from buffer last samples. """
-        unstack_samples = self.samples
-        self.samples = []
-        return unstack_samples
+        """
+        Retrieve and remove from buffer last samples. Returns a SampleBatch: arrays (views, valid until the next
+        call) and the number of samples in count. Iterating over it gives sample_block.SampleView objects, which
+        are compatible with OpenBCISample.
+        """
+        self.flushCompressed()
+        return self.samples.take()
 
     def getMaxPacketsDropped(self):
         """ While processing last samples, how many packets were dropped?"""
@@ -684,145 +878,16 @@ def decompressDeltas19Bit(buffer):
     if len(buffer) != 19:
         raise ValueError("Input should be 19 bytes long.")
 
-    receivedDeltas = [[0, 0, 0, 0], [0, 0, 0, 0]]
-
-    # Sample 1 - Channel 1
-    miniBuf = [
-        (buffer[0] >> 5),
-        ((buffer[0] & 0x1F) << 3 & 0xFF) | (buffer[1] >> 5),
-        ((buffer[1] & 0x1F) << 3 & 0xFF) | (buffer[2] >> 5)
-    ]
-
-    receivedDeltas[0][0] = conv19bitToInt32(miniBuf)
-
-    # Sample 1 - Channel 2
-    miniBuf = [
-        (buffer[2] & 0x1F) >> 2,
-        (buffer[2] << 6 & 0xFF) | (buffer[3] >> 2),
-        (buffer[3] << 6 & 0xFF) | (buffer[4] >> 2)
-    ]
-    receivedDeltas[0][1] = conv19bitToInt32(miniBuf)
-
-    # Sample 1 - Channel 3
-    miniBuf = [
-        ((buffer[4] & 0x03) << 1 & 0xFF) | (buffer[5] >> 7),
-        ((buffer[5] & 0x7F) << 1 & 0xFF) | (buffer[6] >> 7),
-        ((buffer[6] & 0x7F) << 1 & 0xFF) | (buffer[7] >> 7)
-    ]
-    receivedDeltas[0][2] = conv19bitToInt32(miniBuf)
-
-    # Sample 1 - Channel 4
-    miniBuf = [
-        ((buffer[7] & 0x7F) >> 4),
-        ((buffer[7] & 0x0F) << 4 & 0xFF) | (buffer[8] >> 4),
-        ((buffer[8] & 0x0F) << 4 & 0xFF) | (buffer[9] >> 4)
-    ]
-    receivedDeltas[0][3] = conv19bitToInt32(miniBuf)
-
-    # Sample 2 - Channel 1
-    miniBuf = [
-        ((buffer[9] & 0x0F) >> 1),
-        (buffer[9] << 7 & 0xFF) | (buffer[10] >> 1),
-        (buffer[10] << 7 & 0xFF) | (buffer[11] >> 1)
-    ]
-    receivedDeltas[1][0] = conv19bitToInt32(miniBuf)
-
-    # Sample 2 - Channel 2
-    miniBuf = [
-        ((buffer[11] & 0x01) << 2 & 0xFF) | (buffer[12] >> 6),
-        (buffer[12] << 2 & 0xFF) | (buffer[13] >> 6),
-        (buffer[13] << 2 & 0xFF) | (buffer[14] >> 6)
-    ]
-    receivedDeltas[1][1] = conv19bitToInt32(miniBuf)
-
-    # Sample 2 - Channel 3
-    miniBuf = [
-        ((buffer[14] & 0x38) >> 3),
-        ((buffer[14] & 0x07) << 5 & 0xFF) | ((buffer[15] & 0xF8) >> 3),
-        ((buffer[15] & 0x07) << 5 & 0xFF) | ((buffer[16] & 0xF8) >> 3)
-    ]
-    receivedDeltas[1][2] = conv19bitToInt32(miniBuf)
-
-    # Sample 2 - Channel 4
-    miniBuf = [(buffer[16] & 0x07), buffer[17], buffer[18]]
-    receivedDeltas[1][3] = conv19bitToInt32(miniBuf)
-
-    return receivedDeltas;
+    return gdec.unpack_deltas(np.frombuffer(bytes(buffer), dtype=np.uint8).reshape(1, 19), 19)[0].tolist()
 
 
 def decompressDeltas18Bit(buffer):
     """
     Called to when a compressed packet is received.
-    buffer: Just the data portion of the sample. So 19 bytes.
+    buffer: Just the data portion of the sample. So 18 bytes.
     return {Array} - An array of deltas of shape 2x4 (2 samples per packet and 4 channels per sample.)
     """
     if len(buffer) != 18:
         raise ValueError("Input should be 18 bytes long.")
 
-    receivedDeltas = [[0, 0, 0, 0], [0, 0, 0, 0]]
-
-    # Sample 1 - Channel 1
-    miniBuf = [
-        (buffer[0] >> 6),
-        ((buffer[0] & 0x3F) << 2 & 0xFF) | (buffer[1] >> 6),
-        ((buffer[1] & 0x3F) << 2 & 0xFF) | (buffer[2] >> 6)
-    ]
-    receivedDeltas[0][0] = conv18bitToInt32(miniBuf);
-
-    # Sample 1 - Channel 2
-    miniBuf = [
-        (buffer[2] & 0x3F) >> 4,
-        (buffer[2] << 4 & 0xFF) | (buffer[3] >> 4),
-        (buffer[3] << 4 & 0xFF) | (buffer[4] >> 4)
-    ]
-    receivedDeltas[0][1] = conv18bitToInt32(miniBuf);
-
-    # Sample 1 - Channel 3
-    miniBuf = [
-        (buffer[4] & 0x0F) >> 2,
-        (buffer[4] << 6 & 0xFF) | (buffer[5] >> 2),
-        (buffer[5] << 6 & 0xFF) | (buffer[6] >> 2)
-    ]
-    receivedDeltas[0][2] = conv18bitToInt32(miniBuf);
-
-    # Sample 1 - Channel 4
-    miniBuf = [
-        (buffer[6] & 0x03),
-        buffer[7],
-        buffer[8]
-    ]
-    receivedDeltas[0][3] = conv18bitToInt32(miniBuf);
-
-    # Sample 2 - Channel 1
-    miniBuf = [
-        (buffer[9] >> 6),
-        ((buffer[9] & 0x3F) << 2 & 0xFF) | (buffer[10] >> 6),
-        ((buffer[10] & 0x3F) << 2 & 0xFF) | (buffer[11] >> 6)
-    ]
-    receivedDeltas[1][0] = conv18bitToInt32(miniBuf);
-
-    # Sample 2 - Channel 2
-    miniBuf = [
-        (buffer[11] & 0x3F) >> 4,
-        (buffer[11] << 4 & 0xFF) | (buffer[12] >> 4),
-        (buffer[12] << 4 & 0xFF) | (buffer[13] >> 4)
-    ]
-    receivedDeltas[1][1] = conv18bitToInt32(miniBuf);
-
-    # Sample 2 - Channel 3
-    miniBuf = [
-        (buffer[13] & 0x0F) >> 2,
-        (buffer[13] << 6 & 0xFF) | (buffer[14] >> 2),
-        (buffer[14] << 6 & 0xFF) | (buffer[15] >> 2)
-    ]
-    receivedDeltas[1][2] = conv18bitToInt32(miniBuf);
-
-    # Sample 2 - Channel 4
-    miniBuf = [
-        (buffer[15] & 0x03),
-        buffer[16],
-        buffer[17]
-    ]
-    receivedDeltas[1][3] = conv18bitToInt32(miniBuf);
-
-    return receivedDeltas;
+    return gdec.unpack_deltas(np.frombuffer(bytes(buffer), dtype=np.uint8).reshape(1, 18), 18)[0].tolist()
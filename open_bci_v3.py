@@ -22,11 +22,8 @@ TODO: enable impedance
 # ===================
 #
 import atexit
-import glob
 import logging
 import struct
-import sys
-import threading
 import time
 import timeit
 
@@ -34,7 +31,17 @@ import numpy as np
 import serial
 
 
+import command_queue as cq
+import config as cfg
+import connection_watchdog as wd
+import daisy_pairing as dp
 import dictionary as d
+import handshake as hs
+import packet_decoder as pdec
+import packet_log as pl
+import port_discovery as pd
+import sample_block as sb
+import sample_clock as sc
 
 # ========================
 # Constant values
@@ -122,14 +129,13 @@ class OpenBCIBoard(object):
 
         # study_window.log_mess(self.dic.get_string('estserial', 1))
 
-        time.sleep(2)
-        # Initialize 32-bit board, doesn't affect 8bit board
-        self.ser.write(b'v')
-
-        # wait for device to be ready
-        time.sleep(1)
-
-        self.print_incoming_text()
+        # Initialize 32-bit board, doesn't affect 8bit board. The banner is read as soon as it arrives.
+        self.handshake = hs.Handshake(self.ser)
+        self.banner = self.handshake.reset()
+        if self.banner is None:
+            print("No Message")
+        else:
+            print(self.banner)
 
         self.streaming = False
         self.filtering_data = filter_data
@@ -139,13 +145,45 @@ class OpenBCIBoard(object):
         self.imp_channels_per_sample = 0  # impedance check not supported at the moment
         self.read_state = 0
         self.daisy = daisy
-        self.last_odd_sample = OpenBCISample(-1, [], [])  # used for daisy
         self.log_packet_count = 0
         self.attempt_reconnect = False
         self.last_reconnect = 0
         self.reconnect_freq = 5
         self.packets_dropped = 0
 
+        # Counters watched by the connection watchdog, see connection_watchdog.py
+        self.bytes_received = 0
+        self.frames_decoded = 0
+        self.last_frame_time = time.monotonic()
+
+        # Set by reconnect, which runs on the watchdog thread: the decoder and the daisy pairer are reset by the
+        # thread reading the port, before its next feed, as they are only used there
+        self.decoder_reset_pending = False
+        self.watchdog = wd.Watchdog(self, cfg.watchdog_interval, cfg.stall_timeout, 10,
+                                    cfg.reconnect_backoff, cfg.max_reconnect_backoff)
+
+        # Bulk decoder for all packets waiting in the serial buffer, and the precompiled frame layout for the
+        # single packet parser, scaling decided once here
+        if self.scaling_output:
+            self.decoder = pdec.CytonDecoder(scale_fac_uVolts_per_count, scale_fac_accel_G_per_count)
+            self.layout = pdec.FrameLayout(self.daisy, scale_fac_uVolts_per_count, scale_fac_accel_G_per_count)
+        else:
+            self.decoder = pdec.CytonDecoder()
+            self.layout = pdec.FrameLayout(self.daisy)
+
+        # Timestamps for the samples, see sample_clock.py. The packet counter steps at SAMPLE_RATE.
+        self.clock = sc.SampleClock(SAMPLE_RATE, 256)
+
+        # Main board and daisy frames are paired a block at a time, see daisy_pairing.py
+        self.daisy_pairer = dp.DaisyPairer(256)
+
+        # Commands for the board, written by the streaming loop between reads, see command_queue.py
+        self.commands = cq.CommandQueue()
+        self.frames_received = 0
+
+        # Every packet read goes into the packet log, written to a file when log is set, see packet_log.py
+        self.packet_log = pl.PacketLog()
+
         # Disconnects from board when terminated
         atexit.register(self.disconnect)
 
@@ -203,6 +241,9 @@ class OpenBCIBoard(object):
         if not self.streaming:
             self.ser.write(b'b')
             self.streaming = True
+            self.clock.reset()
+            self.daisy_pairer.reset()
+            self.packet_log.start(time.strftime(pl.FILE_NAME), lambda: self.log)
 
         start_time = timeit.default_timer()
         #
@@ -216,40 +257,26 @@ class OpenBCIBoard(object):
 
         while self.streaming:
 
-            # read current sample
-            sample = self._read_serial_binary()
-            #
-            # If a daisy module is attached, wait to concatenate two samples (main board + daisy)
-            # before passing it to callback
-            #
+            # write the queued commands, then read all samples that have arrived since the last read
+            self.commands.flush(self.ser, self.frames_received)
+            samples = self._read_serial_samples()
+            self.frames_received += len(samples)
+
+            # With a daisy module, main board and daisy frames are merged into 16 channel samples
             if self.daisy:
-                #
-                # Odd sample: daisy sample, save for later
-                #
-                if ~sample.id % 2:
-                    self.last_odd_sample = sample
-                #
-                # Even sample: concatenate and send if last sample was the fist part, otherwise drop
-                # the packet
-                #
-                elif sample.id - 1 == self.last_odd_sample.id:
-                    #
-                    # The aux data will be the average between the two samples, as the channel
-                    # samples themselves have been averaged by the board
-                    #
-                    avg_aux_data = list((np.array(sample.aux_data) + np.array(self.last_odd_sample.aux_data)) / 2)
-                    whole_sample = OpenBCISample(sample.id, sample.channel_data + self.last_odd_sample.channel_data,
-                                                 avg_aux_data)
-                    for call in callback:
-                        call(whole_sample)
-            else:
+                ids, channel_data, aux_data, _ = self.daisy_pairer.pair(samples.ids, samples.channel_data,
+                                                                        samples.aux_data)
+                samples = sb.SampleBlock(ids, channel_data, aux_data, np.full(len(ids), np.nan))
+            samples.timestamps = self.clock.update(samples.ids, time.monotonic_ns())
+
+            for sample in samples:
                 for call in callback:
                     call(sample)
 
             if (0 < lapse < timeit.default_timer() - start_time):
                 self.stop()
             if self.log:
-                self.log_packet_count = self.log_packet_count + 1
+                self.log_packet_count = self.log_packet_count + len(samples)
 
     """
       PARSER:
@@ -261,97 +288,88 @@ class OpenBCIBoard(object):
     """
 
     def _read_serial_binary(self, max_bytes_to_skip=3000):
+        # A stalled stream returns None, the connection watchdog deals with it
         def read(n):
             bb = self.ser.read(n)
-            if not bb:
-                self.warn('Device appears to be stalled. Quitting...')
-                sys.exit()
-                raise Exception('Device Stalled')
-                sys.exit()
-                return '\xFF'
-            else:
-                return bb
+            if len(bb) < n:
+                self.warn('Device appears to be stalled')
+                self.packet_log.add(pl.STALL, bb)
+                return None
+            self.bytes_received += n
+            return bb
+
+        layout = self.layout
 
         for rep in range(max_bytes_to_skip):
 
             #
-            #  ---------Start Byte & ID---------
+            #  ---------Start Byte---------
             #
-            if self.read_state == 0:
-
-                b = read(1)
-
-                if struct.unpack('B', b)[0] == START_BYTE:
-                    if (rep != 0):
-                        self.warn('Skipped %d bytes before start found' % (rep))
-                        rep = 0
-                    packet_id = struct.unpack('B', read(1))[0]  # packet id goes from 0-255
-                    log_bytes_in = str(packet_id)
-
-                    self.read_state = 1
-
-            # ---------Channel Data---------
-            elif self.read_state == 1:
-                channel_data = []
-                for c in range(self.eeg_channels_per_sample):
-
-                    # 3 byte ints
-                    literal_read = read(3)
-
-                    unpacked = struct.unpack('3B', literal_read)
-                    log_bytes_in = log_bytes_in + '|' + str(literal_read)
-
-                    #
-                    # 3-byte int in 2s compliment
-                    #
-                    if (unpacked[0] > 127):
-                        pre_fix = bytes(bytearray.fromhex('FF'))
-                    else:
-                        pre_fix = bytes(bytearray.fromhex('00'))
-
-                    literal_read = pre_fix + literal_read
-
-                    # unpack little endian(>) signed integer(i) (makes unpacking platform independent)
-                    myInt = struct.unpack('>i', literal_read)[0]
-
-                    if self.scaling_output:
-                        channel_data.append(myInt * scale_fac_uVolts_per_count)
-                    else:
-                        channel_data.append(myInt)
-
-                self.read_state = 2
+            b = read(1)
+            if b is None:
+                return None
+            if b[0] != START_BYTE:
+                continue
+
+            if (rep != 0):
+                self.warn('Skipped %d bytes before start found' % (rep))
+
+            # ---------Packet id, Channel Data, Accelerometer Data, End Byte---------
+            # The rest of the packet is read at once and decoded with the precompiled layout
+            rest = read(pdec.FRAME_SIZE - 1)
+            if rest is None:
+                return None
+            frame = b + rest
+            val = frame[-1]
+
+            if (val == END_BYTE):
+                packet_id, channel_data, aux_data = layout.decode(frame)
+                self.packet_log.add(pl.VALID, frame, frame[1], rep)
+                self.packets_dropped = 0
+                self.frames_decoded += 1
+                self.last_frame_time = time.monotonic()
+                return OpenBCISample(packet_id, channel_data, aux_data)
+            else:
+                self.warn("ID:<%d> <Unexpected END_BYTE found <%s> instead of <%s>"
+                          % (frame[1], val, END_BYTE))
+                self.packet_log.add(pl.BAD_END, frame, frame[1], rep)
+                self.packets_dropped = self.packets_dropped + 1
 
-            #
-            # ---------Accelerometer Data---------
-            #
-            elif self.read_state == 2:
-                aux_data = []
-                for a in range(self.aux_channels_per_sample):
-
-                    # short = h
-                    acc = struct.unpack('>h', read(2))[0]
-                    log_bytes_in = log_bytes_in + '|' + str(acc)
-
-                    if self.scaling_output:
-                        aux_data.append(acc * scale_fac_accel_G_per_count)
-                    else:
-                        aux_data.append(acc)
-
-                self.read_state = 3
-            # ---------End Byte---------
-            elif self.read_state == 3:
-                val = struct.unpack('B', read(1))[0]
-                log_bytes_in = log_bytes_in + '|' + str(val)
-                self.read_state = 0  # read next packet
-                if (val == END_BYTE):
-                    sample = OpenBCISample(packet_id, channel_data, aux_data)
-                    self.packets_dropped = 0
-                    return sample
-                else:
-                    self.warn("ID:<%d> <Unexpected END_BYTE found <%s> instead of <%s>"
-                              % (packet_id, val, END_BYTE))
-                    logging.debug(log_bytes_in)
-                    self.packets_dropped = self.packets_dropped + 1
+    def _read_serial_frames(self):
+        """
+        Read all waiting bytes (at least one packet) and return the decoded (ids, channel_data, aux_data) arrays.
+        All complete packets are decoded in one pass, see packet_decoder.py.
+        """
+        bb = self.ser.read(max(self.ser.inWaiting(), pdec.FRAME_SIZE))
+        if not bb:
+            # Stalled stream, the connection watchdog deals with it
+            self.warn('Device appears to be stalled')
+            self.packet_log.add(pl.STALL)
+        self.bytes_received += len(bb)
+
+        if self.decoder_reset_pending:
+            self.decoder_reset_pending = False
+            self.decoder.reset()
+            self.daisy_pairer.reset()
+        skipped = self.decoder.skipped_bytes
+        frames = self.decoder.feed(bb)
+        self.packet_log.add_frames(self.decoder.frames, self.decoder.skipped_bytes - skipped)
+        if self.decoder.skipped_bytes != skipped:
+            self.warn('Skipped %d bytes before start found' % (self.decoder.skipped_bytes - skipped))
+            self.packets_dropped = self.packets_dropped + 1
+        elif len(frames[0]):
+            self.packets_dropped = 0
+
+        if len(frames[0]):
+            self.frames_decoded += len(frames[0])
+            self.last_frame_time = time.monotonic()
+
+        return frames
+
+    def _read_serial_samples(self):
+        """ Read all waiting packets and return them as a SampleBlock, iterated over as single samples. """
+        ids, channel_data, aux_data = self._read_serial_frames()
+        return sb.SampleBlock(ids, channel_data, aux_data, np.full(len(ids), np.nan))
 
     """
   
@@ -369,6 +387,8 @@ class OpenBCIBoard(object):
     def disconnect(self):
         if (self.streaming == True):
             self.stop()
+        self.watchdog.stop()
+        self.packet_log.stop()
         if (self.ser.isOpen()):
             print("Closing Serial...")
             self.ser.close()
@@ -396,22 +416,8 @@ class OpenBCIBoard(object):
         we get to a line with the end sequence '$$$'.
 
         """
-        line = ''
-        # Wait for device to send data
-        time.sleep(1)
-
-        if self.ser.inWaiting():
-            line = ''
-            c = ''
-            #
-            # Look for end sequence $$$
-            #
-            while '$$$' not in line:
-                #
-                # We are supposed to get UTF8 text, but the board might behave otherwise. Better safe than sorry.
-                #
-                c = self.ser.read().decode('utf-8', errors='replace')
-                line += c
+        line = self.handshake.read_reply()
+        if line is not None:
             print(line)
         else:
             self.warn("No Message")
@@ -441,9 +447,8 @@ class OpenBCIBoard(object):
         return False
 
     def print_register_settings(self):
-        self.ser.write(b'?')
-        time.sleep(0.5)
-        self.print_incoming_text()
+        for _, line in self.handshake.send(b'?'):
+            print(line if line is not None else "No Message")
 
     # DEBBUGING: Prints individual incoming bytes
     def print_bytes_in(self):
@@ -458,114 +463,93 @@ class OpenBCIBoard(object):
           0xA0|0-255|8, 3-byte signed ints|3 2-byte signed ints|0xC0'''
 
     def print_packets_in(self):
+        """ DEBUGGING: Prints every incoming packet, with its status and raw bytes, from the packet log. """
+        if not self.streaming:
+            self.ser.write(b'b')
+            self.streaming = True
+        seen = self.packet_log.count
         while self.streaming:
-            b = struct.unpack('B', self.ser.read())[0]
-
-            if b == START_BYTE:
-                self.attempt_reconnect = False
-                if skipped_str:
-                    logging.debug('SKIPPED\n' + skipped_str + '\nSKIPPED')
-                    skipped_str = ''
-
-                packet_str = "%03d" % b + '|'
-                b = struct.unpack('B', self.ser.read())[0]
-                packet_str = packet_str + "%03d" % b + '|'
-
-                # data channels
-                for i in range(24 - 1):
-                    b = struct.unpack('B', self.ser.read())[0]
-                    packet_str = packet_str + '.' + "%03d" % (b)
-
-                b = struct.unpack('B', self.ser.read())[0]
-                packet_str = packet_str + '.' + "%03d" % (b) + '|'
-
-                # aux channels
-                for i in range(6 - 1):
-                    b = struct.unpack('B', self.ser.read())[0]
-                    packet_str = packet_str + '.' + "%03d" % (b)
-
-                b = struct.unpack('B', self.ser.read())[0]
-                packet_str = packet_str + '.' + "%03d" % (b) + '|'
+            self._read_serial_binary()
+            for record in self.packet_log.records(seen):
+                print(pl.format_record(record))
+            seen = self.packet_log.count
 
-                # end byte
-                b = struct.unpack('B', self.ser.read())[0]
-
-                # Valid Packet
-                if b == END_BYTE:
-                    packet_str = packet_str + '.' + "%03d" % (b) + '|VAL'
-                    print(packet_str)
-                    # logging.debug(packet_str)
-
-                # Invalid Packet
-                else:
-                    packet_str = packet_str + '.' + "%03d" % (b) + '|INV'
-                    # Reset
-                    self.attempt_reconnect = True
-
-
-            else:
-                print(b)
-                if b == END_BYTE:
-                    skipped_str = skipped_str + '|END|'
-                else:
-                    skipped_str = skipped_str + "%03d" % (b) + '.'
-
-            if self.attempt_reconnect and (timeit.default_timer() - self.last_reconnect) > self.reconnect_freq:
-                self.last_reconnect = timeit.default_timer()
-                self.warn('Reconnecting')
-                self.reconnect()
-
-    def check_connection(self, interval=2, max_packets_to_skip=10):
-        # stop checking when we're no longer streaming
-        if not self.streaming:
-            return
-        # check number of dropped packages and establish connection problem if too large
-        if self.packets_dropped > max_packets_to_skip:
-            # if error, attempt to reconect
-            self.reconnect()
-        # check again again in 2 seconds
-        threading.Timer(interval, self.check_connection).start()
+    def check_connection(self, interval=None, max_packets_to_skip=10):
+        """
+        Start watching the connection, see connection_watchdog.py. A single watchdog thread is used for the whole
+        life of the board, calling this again only changes its settings.
+        """
+        if interval is not None:
+            self.watchdog.interval = interval
+        self.watchdog.max_packets_to_skip = max_packets_to_skip
+        self.watchdog.start()
 
     def reconnect(self):
+        """
+        Restart the board without stopping the streaming, called by the watchdog. Failed attempts are retried with
+        backoff. Returns False if the port could not be reached.
+        """
         self.packets_dropped = 0
         self.warn('Reconnecting')
-        self.stop()
-        time.sleep(0.5)
-        self.ser.write(b'v')
-        time.sleep(0.5)
-        self.ser.write(b'b')
-        time.sleep(0.5)
-        self.streaming = True
-        # self.attempt_reconnect = False
+        self.packet_log.add(pl.RECONNECT)
+        try:
+            if not self.ser.isOpen():
+                self.ser.open()
+            self.ser.write(b's')
+            self.ser.reset_input_buffer()
+            self.decoder_reset_pending = True
+            self.ser.write(b'v')
+            time.sleep(0.5)
+            self.ser.reset_input_buffer()
+            self.ser.write(b'b')
+        except (OSError, serial.SerialException) as e:
+            self.warn('Reconnect failed: ' + str(e))
+            try:
+                self.ser.close()
+            except (OSError, serial.SerialException):
+                pass
+            return False
+        self.last_frame_time = time.monotonic()
+        return True
 
     # Adds a filter at 60hz to cancel out ambient electrical noise
     def enable_filters(self):
-        self.ser.write(b'f')
+        self.send_command(b'f', 'filters')
         self.filtering_data = True
 
     def disable_filters(self):
-        self.ser.write(b'g')
+        self.send_command(b'g', 'filters')
         self.filtering_data = False
 
+    def send_command(self, command, key=None):
+        """
+        Queue a command for the board (see command_queue.py). While streaming it is written between two reads by
+        the streaming loop, otherwise right away. Returns the ticket of the command.
+        """
+        ticket = self.commands.put(command, key)
+        if not self.streaming:
+            self.commands.flush(self.ser, self.frames_received)
+        return ticket
+
     def test_signal(self, signal):
         """ Enable / disable test signal """
         if signal == 0:
-            self.ser.write(b'0')
+            self.send_command(b'0', 'test_signal')
             self.warn("Connecting all pins to ground")
         elif signal == 1:
-            self.ser.write(b'p')
+            self.send_command(b'p', 'test_signal')
             self.warn("Connecting all pins to Vcc")
         elif signal == 2:
-            self.ser.write(b'-')
+            self.send_command(b'-', 'test_signal')
             self.warn("Connecting pins to low frequency 1x amp signal")
         elif signal == 3:
-            self.ser.write(b'=')
+            self.send_command(b'=', 'test_signal')
             self.warn("Connecting pins to high frequency 1x amp signal")
         elif signal == 4:
-            self.ser.write(b'[')
+            self.send_command(b'[', 'test_signal')
             self.warn("Connecting pins to low frequency 2x amp signal")
         elif signal == 5:
-            self.ser.write(b']')
+            self.send_command(b']', 'test_signal')
             self.warn("Connecting pins to high frequency 2x amp signal")
         else:
             self.warn("%s is not a known test signal. Valid signals go from 0-5" % (signal))
@@ -575,112 +559,97 @@ class OpenBCIBoard(object):
         # Commands to set toggle to on position
         if toggle_position == 1:
             if channel is 1:
-                self.ser.write(b'!')
+                self.send_command(b'!', ('channel', channel))
             if channel is 2:
-                self.ser.write(b'@')
+                self.send_command(b'@', ('channel', channel))
             if channel is 3:
-                self.ser.write(b'#')
+                self.send_command(b'#', ('channel', channel))
             if channel is 4:
-                self.ser.write(b'$')
+                self.send_command(b'$', ('channel', channel))
             if channel is 5:
-                self.ser.write(b'%')
+                self.send_command(b'%', ('channel', channel))
             if channel is 6:
-                self.ser.write(b'^')
+                self.send_command(b'^', ('channel', channel))
             if channel is 7:
-                self.ser.write(b'&')
+                self.send_command(b'&', ('channel', channel))
             if channel is 8:
-                self.ser.write(b'*')
+                self.send_command(b'*', ('channel', channel))
             if channel is 9 and self.daisy:
-                self.ser.write(b'Q')
+                self.send_command(b'Q', ('channel', channel))
             if channel is 10 and self.daisy:
-                self.ser.write(b'W')
+                self.send_command(b'W', ('channel', channel))
             if channel is 11 and self.daisy:
-                self.ser.write(b'E')
+                self.send_command(b'E', ('channel', channel))
             if channel is 12 and self.daisy:
-                self.ser.write(b'R')
+                self.send_command(b'R', ('channel', channel))
             if channel is 13 and self.daisy:
-                self.ser.write(b'T')
+                self.send_command(b'T', ('channel', channel))
             if channel is 14 and self.daisy:
-                self.ser.write(b'Y')
+                self.send_command(b'Y', ('channel', channel))
             if channel is 15 and self.daisy:
-                self.ser.write(b'U')
+                self.send_command(b'U', ('channel', channel))
             if channel is 16 and self.daisy:
-                self.ser.write(b'I')
+                self.send_command(b'I', ('channel', channel))
         # Commands to set toggle to off position
         elif toggle_position == 0:
             if channel is 1:
-                self.ser.write(b'1')
+                self.send_command(b'1', ('channel', channel))
             if channel is 2:
-                self.ser.write(b'2')
+                self.send_command(b'2', ('channel', channel))
             if channel is 3:
-                self.ser.write(b'3')
+                self.send_command(b'3', ('channel', channel))
             if channel is 4:
-                self.ser.write(b'4')
+                self.send_command(b'4', ('channel', channel))
             if channel is 5:
-                self.ser.write(b'5')
+                self.send_command(b'5', ('channel', channel))
             if channel is 6:
-                self.ser.write(b'6')
+                self.send_command(b'6', ('channel', channel))
             if channel is 7:
-                self.ser.write(b'7')
+                self.send_command(b'7', ('channel', channel))
             if channel is 8:
-                self.ser.write(b'8')
+                self.send_command(b'8', ('channel', channel))
             if channel is 9 and self.daisy:
-                self.ser.write(b'q')
+                self.send_command(b'q', ('channel', channel))
             if channel is 10 and self.daisy:
-                self.ser.write(b'w')
+                self.send_command(b'w', ('channel', channel))
             if channel is 11 and self.daisy:
-                self.ser.write(b'e')
+                self.send_command(b'e', ('channel', channel))
             if channel is 12 and self.daisy:
-                self.ser.write(b'r')
+                self.send_command(b'r', ('channel', channel))
             if channel is 13 and self.daisy:
-                self.ser.write(b't')
+                self.send_command(b't', ('channel', channel))
             if channel is 14 and self.daisy:
-                self.ser.write(b'y')
+                self.send_command(b'y', ('channel', channel))
             if channel is 15 and self.daisy:
-                self.ser.write(b'u')
+                self.send_command(b'u', ('channel', channel))
             if channel is 16 and self.daisy:
-                self.ser.write(b'i')
+                self.send_command(b'i', ('channel', channel))
 
     def find_port(self):
-        # Finds the serial port names
+        # Finds the serial port: the one found last time first, then all the candidates probed at the same time
         #
-        if sys.platform.startswith('study_window'):
-            ports = ['COM%s' % (i + 1) for i in range(256)]
-        elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
-            ports = glob.glob('/dev/ttyUSB*')
-        elif sys.platform.startswith('darwin'):
-            ports = glob.glob('/dev/tty.usbserial*')
-        else:
-            raise EnvironmentError('Error finding ports on your operating system')
-        openbci_port = ''
-        for port in ports:
-            try:
-                s = serial.Serial(port=port, baudrate=self.baudrate, timeout=self.timeout)
-                s.write(b'v')
-                openbci_serial = self.openbci_id(s)
-                s.close()
-                if openbci_serial:
-                    openbci_port = port
-            except (OSError, serial.SerialException):
-                pass
-        if openbci_port == '':
-            raise OSError('Cannot find OpenBCI port')
-        else:
-            return openbci_port
+        return pd.find_serial_port(self.baudrate)
 
 
 class OpenBCISample(object):
     """Object encapulsating a single sample from the OpenBCI board. NB: dummy imp for plugin compatiblity"""
 
-    def __init__(self, packet_id, channel_data, aux_data):
+    __slots__ = ('id', 'channel_data', 'aux_data', 'imp_data', 'timestamp')
+
+    def __init__(self, packet_id, channel_data, aux_data, timestamp=None):
         self.id = packet_id
         self.channel_data = channel_data
         self.aux_data = aux_data
         self.imp_data = []
+        # host time in seconds (time.monotonic() clock), see sample_clock.py
+        self.timestamp = timestamp
 
 
-def handle_sample(sample):
-  print(sample.channel_data)
+if __name__ == '__main__':
+
+    def handle_sample(sample):
+        print(sample.channel_data)
+
+    board = OpenBCIBoard()
+    board.start_streaming(handle_sample)
 
-board = OpenBCIBoard()
-board.start_streaming(handle_sample)
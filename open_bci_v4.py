@@ -20,7 +20,7 @@ The callback (in this case the handle_sample function) is normally one or more o
 NOTE: If daisy modules is enabled, the callback will occur every two samples, hence "packet_id" will only contain
 even numbers. As a side effect, the sampling rate will be divided by 2.
 
-FIXME: at the moment we can just force daisy mode, do not check that the module is detected.
+The daisy mode is only used when the banner of the board reports a daisy module (see handshake.py).
 
 TODO: enable impedance
 
@@ -30,19 +30,29 @@ TODO: enable impedance
 # ===================
 #
 import atexit
-import glob
 import logging
 import struct
 import sys
 import threading
 import time
-import timeit
 
 import config as cfg
 
 import numpy as np
 import serial
 
+import packet_decoder as pdec
+import packet_log as pl
+import connection_watchdog as wd
+import command_queue as cq
+import continuity as ct
+import daisy_pairing as dp
+import handshake as hs
+import port_discovery as pd
+import raw_capture as rc
+import ring_buffer as rb
+import sample_clock as sc
+import sample_block as sb
 import sample_reader as sr
 
 # Importing two static objects.
@@ -60,6 +70,20 @@ ADS1299_gain = 24.0  # assumed gain setting for ADS1299.  set by its Arduino cod
 scale_fac_uVolts_per_count = ADS1299_Vref / float((pow(2, 23) - 1)) / ADS1299_gain * 1000000.
 scale_fac_accel_G_per_count = 0.002 / (pow(2, 4))  # assume set to +/4G, so 2 mG
 
+# Channel on and off commands, channels 1-8 on the board and 9-16 on the daisy
+#
+CHANNEL_ON = b'!@#$%^&*QWERTYUI'
+CHANNEL_OFF = b'12345678qwertyui'
+
+# Test signal commands
+#
+TEST_SIGNALS = {0: (b'0', "Connecting all pins to ground"),
+                1: (b'p', "Connecting all pins to Vcc"),
+                2: (b'-', "Connecting pins to low frequency 1x amp signal"),
+                3: (b'=', "Connecting pins to high frequency 1x amp signal"),
+                4: (b'[', "Connecting pins to low frequency 2x amp signal"),
+                5: (b']', "Connecting pins to high frequency 2x amp signal")}
+
 '''
 # Commands for in SDK http://docs.openbci.com/software/01-Open BCI_SDK:
 
@@ -138,7 +162,7 @@ class OpenBCIBoard(object):
         # Starting by finding the port, if it is not given by the GUI
         #
         if not cfg.portUsed:
-            portUsed = self.find_port()
+            cfg.portUsed = self.find_port()
 
         # ========================
         # might be handy to know API
@@ -151,17 +175,16 @@ class OpenBCIBoard(object):
 
         win.log_mess(dict.get_string('estserial'))
 
-        time.sleep(2)
-
-        # Initialize 32-bit board, doesn't affect 8bit board
-        #
-        self.ser.write(b'v')
-
-        # wait for device to be ready
+        # Initialize 32-bit board, doesn't affect 8bit board. The banner is read as soon as it arrives, and
+        # tells the firmware version and whether a daisy module is present.
         #
-        time.sleep(1)
-
-        self.print_incoming_text()
+        self.handshake = hs.Handshake(self.ser, cfg.handshake_timeout)
+        self.banner = self.handshake.reset()
+        if self.banner is None:
+            print("No Message")
+        else:
+            print(self.banner)
+            self.check_daisy()
 
         # Initially the streaming of data is disabled.
         #
@@ -173,13 +196,68 @@ class OpenBCIBoard(object):
         self.aux_channels_per_sample = 3  # number of AUX channels per sample *from the board*
         self.imp_channels_per_sample = 0  # impedance check not supported at the moment
         self.read_state = 0
-        self.last_odd_sample = OpenBCISample(-1, [], [])  # used for daisy
         self.log_packet_count = 0
         self.attempt_reconnect = False
         self.last_reconnect = 0
         self.reconnect_freq = 5
         self.packets_dropped = 0
 
+        # Counters watched by the connection watchdog, see connection_watchdog.py
+        #
+        self.bytes_received = 0
+        self.frames_decoded = 0
+        self.last_frame_time = time.monotonic()
+        self.resume_pending = False
+
+        # Set by reconnect, which runs on the watchdog thread: the decoder is reset by the thread reading the port,
+        # before its next feed, as it is only used there
+        #
+        self.decoder_reset_pending = False
+        self.watchdog = wd.Watchdog(self, cfg.watchdog_interval, cfg.stall_timeout, 10,
+                                    cfg.reconnect_backoff, cfg.max_reconnect_backoff)
+
+        # Commands for the board are written by the thread reading the port, see command_queue.py
+        #
+        self.commands = cq.CommandQueue()
+
+        # The bulk decoder handles all frames that are waiting in the serial buffer at once. Scaling is decided
+        # here, once, instead of for every channel of every packet.
+        #
+        if cfg.scaling:
+            self.decoder = pdec.CytonDecoder(scale_fac_uVolts_per_count, scale_fac_accel_G_per_count)
+        else:
+            self.decoder = pdec.CytonDecoder()
+
+        # The single packet parser decodes each frame with a precompiled layout, chosen here from the daisy and
+        # scaling settings so they are not looked up for every packet.
+        #
+        self.layout = self.make_frame_layout()
+
+        # Timestamps for the samples. The packet counter steps at SAMPLE_RATE, with or without daisy.
+        #
+        self.clock = sc.SampleClock(SAMPLE_RATE, 256, cfg.clock_window)
+
+        # Lost packets are found from the packet counter (merged daisy samples step by 2), see continuity.py.
+        #
+        self.continuity = ct.ContinuityTracker(256, 2 if self.layout.daisy else 1, cfg.gap_policy, cfg.loss_window)
+
+        # Main board and daisy frames are paired a block at a time, see daisy_pairing.py
+        #
+        self.daisy_pairer = dp.DaisyPairer(256)
+
+        # The acquisition thread and its ring buffer are created when streaming starts.
+        #
+        self.acquisition = None
+        self.ring = None
+
+        # Every packet read goes into the packet log, written to a file while cfg.logging is on, see packet_log.py
+        #
+        self.packet_log = pl.PacketLog(cfg.packet_log_size)
+
+        # The raw byte stream is captured to a file when cfg.raw_capture is set, see raw_capture.py
+        #
+        self.capture = None
+
         # Disconnects from board when terminated
         #
         atexit.register(self.disconnect)
@@ -198,6 +276,43 @@ class OpenBCIBoard(object):
         """
         return cfg.boardType
 
+    def check_daisy(self):
+        """
+        Match the daisy setting with the board: without a daisy module there are only 8 channels, and an attached
+        module that is not wanted is removed.
+        """
+        if cfg.daisyBoard and not self.banner.daisy:
+            self.gui.log_mess("No daisy module detected, using 8 channels")
+            cfg.daisyBoard = False
+        elif self.banner.daisy and not cfg.daisyBoard:
+            self.handshake.send(b'c')
+
+    def make_frame_layout(self):
+        """
+        Returns the frame layout for the current daisy and scaling settings.
+        """
+        if cfg.scaling:
+            return pdec.FrameLayout(cfg.daisyBoard, scale_fac_uVolts_per_count, scale_fac_accel_G_per_count)
+        else:
+            return pdec.FrameLayout(cfg.daisyBoard)
+
+    def open_capture(self):
+        """
+        Start capturing the raw bytes from the port, if cfg.raw_capture names a file (the name goes through
+        time.strftime, so it can hold the date and time). The layout and scaling are stored with the bytes.
+        """
+        if not cfg.raw_capture or self.capture is not None:
+            return
+        file_name = time.strftime(cfg.raw_capture)
+        self.capture = rc.RawCapture(file_name, self.layout.daisy, SAMPLE_RATE, self.decoder.channel_scale,
+                                     self.decoder.aux_scale, cfg.raw_capture_preallocate)
+        self.gui.log_mess("Capturing raw stream to " + file_name)
+
+    def close_capture(self):
+        if self.capture is not None:
+            self.capture.close()
+            self.capture = None
+
     def set_impedance(self, flag):
         """ Enable/disable impedance measure. Not implemented at the moment on Cyton. """
         return
@@ -255,13 +370,23 @@ class OpenBCIBoard(object):
           The valid callback functions are the plugins listed in the plugin directory.
 
           lapse: TODO: needs to be described
+
+        If cfg.block_mode is set, the callbacks get SampleBlock objects instead, see _stream_blocks.
+
+        If cfg.acquisition_thread is set, the serial port is read in a separate thread, see start_acquisition.
         """
         if not self.streaming:
             self.ser.write(b'b')
             self.streaming = True
+            self.clock.reset()
+            self.continuity.reset()
+            self.daisy_pairer.reset()
+            self.last_frame_time = time.monotonic()
+            self.open_capture()
+            self.packet_log.start(time.strftime(cfg.packet_log), lambda: cfg.logging)
             print("Streaming started")
 
-        start_time = timeit.default_timer()
+        start_time = time.monotonic()
 
         # Enclose callback function in a list if it comes alone
         #
@@ -272,55 +397,203 @@ class OpenBCIBoard(object):
         #
         self.check_connection()
 
-        """ 
-        This while-loop in the class has not been touched between v3 and v4 apart 
-        from correcting pure errors.
-        """
-
-        # reader = sr.SampleReader()
+        if cfg.acquisition_thread:
+            #
+            # The serial port is read by a separate thread, which only decodes the packets and stores them in the
+            # ring buffer. This loop takes the samples from there, so a slow plugin cannot hold up the serial port.
+            #
+            cursor = self.start_acquisition()
 
-        while self.streaming:
+            def read_block():
+                return cursor.read(timeout=cfg.block_latency)
+        else:
+            cursor = None
+            read_block = self._read_block
 
-            # read current sample
+        # Without the acquisition thread the port is read here, one read (all waiting packets with the bulk decoder,
+        # a single packet otherwise) at a time. The samples go through the same daisy merge, gap filling and
+        # timestamping as in the acquisition thread, see _read_block.
+        #
+        try:
+            if cfg.block_mode:
+                self._stream_blocks(callback, lapse, start_time, read_block)
+            else:
+                self._stream_samples(callback, lapse, start_time, read_block)
+        finally:
+            # The ring buffer outlives this loop when streaming starts again while the thread is still running
             #
-            # TODO RESTORE THIS AFTER TESTING
+            if cursor is not None:
+                self.ring.release(cursor)
 
-            # sample = OpenBCISample(-1, reader.next(), [])
+    def _stream_samples(self, callback, lapse, start_time, read_block):
+        """
+        Call the callbacks for every sample of the blocks returned by read_block. The daisy samples have already
+        been merged.
+        """
+        while self.streaming:
 
-            sample = self._read_serial_binary()
+            block = read_block()
 
-            #
-            # If a daisy module is attached, wait to concatenate two samples (main board + daisy)
-            # before passing it to callback
-            #
-            if cfg.daisyBoard:
-                #
-                # Odd sample: daisy sample, save for later (tilde is the invert operator)
-                #
-                if ~ sample.id % 2:
-                    self.last_odd_sample = sample
-                #
-                # Even sample: concatenate and send if last sample was the first part, otherwise drop
-                # the packet
-                #
-                elif sample.id - 1 == self.last_odd_sample.id:
-                    #
-                    # The aux data will be the average between the two samples, as the channel
-                    # samples themselves have been averaged by the board
-                    #
-                    avg_aux_data = list((np.array(sample.aux_data) + np.array(self.last_odd_sample.aux_data)) / 2)
-                    whole_sample = OpenBCISample(sample.id, sample.channel_data + self.last_odd_sample.channel_data,
-                                                 avg_aux_data)
-                    for call in callback:
-                        call(whole_sample)
-            else:
+            for sample in block:
                 for call in callback:
                     call(sample)
 
-            if lapse > 0 and timeit.default_timer() - start_time > lapse:
+            if lapse > 0 and time.monotonic() - start_time > lapse:
+                self.stop()
+            if cfg.logging:
+                self.log_packet_count = self.log_packet_count + len(block)
+
+    def _stream_blocks(self, callback, lapse, start_time, read_block):
+        """
+        The block mode version of the streaming loop. The samples are collected into SampleBlock objects of
+        cfg.block_size samples. A smaller block is sent if the oldest sample has waited more than cfg.block_latency
+        seconds.
+
+        Plugins with a process_block method get the whole block, plain callback functions one sample at a time.
+        The samples still collected when streaming stops are sent on as well.
+        """
+        builder = sb.BlockBuilder(cfg.block_size, cfg.block_latency)
+
+        def deliver(blocks):
+            for ready in blocks:
+                for call in callback:
+                    if hasattr(call, 'process_block'):
+                        call.process_block(ready)
+                    else:
+                        for sample in ready:
+                            call(sample)
+
+        while self.streaming:
+
+            block = read_block()
+            now = time.monotonic()
+
+            builder.add(block)
+            deliver(builder.pop_blocks(now))
+
+            if lapse > 0 and now - start_time > lapse:
                 self.stop()
             if cfg.logging:
-                self.log_packet_count = self.log_packet_count + 1
+                self.log_packet_count = self.log_packet_count + len(block)
+
+        deliver(builder.flush())
+
+    # ===================================
+    # ACQUISITION
+    #
+    # The acquisition thread does nothing but read the serial port, decode the packets and store the samples in
+    # the ring buffer (see ring_buffer.py). The plugins are called from the streaming loop, which reads from the
+    # ring buffer through its own cursor.
+    #
+    def start_acquisition(self):
+        """
+        Start the acquisition thread, unless it is already running, and return a new cursor for reading the
+        ring buffer. The cursor is created before the thread starts, so no samples are missed. Give the cursor
+        back with self.ring.release when done with it.
+        """
+        if self.acquisition is not None and self.acquisition.is_alive():
+            return self.ring.cursor()
+
+        capacity = cfg.ring_seconds * self.get_sample_rate()
+        self.ring = rb.RingBuffer(capacity, self.get_nb_eeg_channels(), self.get_nb_aux_channels())
+        cursor = self.ring.cursor()
+
+        self.acquisition = threading.Thread(target=self._acquisition_loop)
+        self.acquisition.daemon = True
+        self.acquisition.start()
+
+        return cursor
+
+    def _acquisition_loop(self):
+        while self.streaming:
+            try:
+                block = self._read_block()
+            except (OSError, serial.SerialException):
+                #
+                # The port has been closed, by stop() or because the board is gone. In the latter case the
+                # watchdog reopens it, meanwhile the ring buffer and its readers stay as they are.
+                #
+                if self.streaming:
+                    time.sleep(cfg.watchdog_interval)
+                continue
+            self.ring.write(block)
+
+    def get_acquisition_stats(self):
+        """
+        Returns the counters of the acquisition: samples written to the ring buffer, overruns per reader
+        and the bytes skipped by the decoder.
+        """
+        stats = self.ring.get_stats() if self.ring is not None else {}
+        stats['skipped_bytes'] = self.decoder.skipped_bytes
+        stats['resyncs'] = self.decoder.resyncs
+        stats['clock'] = self.clock.get_stats()
+        stats['continuity'] = self.continuity.get_stats()
+        stats['watchdog'] = self.watchdog.get_stats()
+        stats['commands'] = self.commands.get_stats()
+        stats['daisy'] = self.daisy_pairer.get_stats()
+        return stats
+
+    def _read_block(self):
+        """
+        Read the waiting packets from the serial port and return them as a SampleBlock, with daisy samples merged,
+        lost samples replaced according to cfg.gap_policy and timestamps from the sample clock. The commands waiting
+        in the command queue are written first.
+        """
+        self.commands.flush(self.ser, self.frames_decoded)
+
+        if cfg.bulk_decoding:
+            ids, channel_data, aux_data = self._read_serial_frames()
+        else:
+            sample = self._read_serial_binary()
+            if sample is None:
+                return sb.SampleBlock([], np.zeros((0, self.get_nb_eeg_channels())),
+                                      np.zeros((0, self.aux_channels_per_sample)), [])
+            ids = np.array([sample.id])
+            channel_data = np.array([sample.channel_data])
+            aux_data = np.array([sample.aux_data])
+
+        host_ns = time.monotonic_ns()
+
+        if self.layout.daisy:
+            ids, channel_data, aux_data = self._merge_daisy_frames(ids, channel_data, aux_data)
+
+        return self._stamp_block(ids, channel_data, aux_data, host_ns)
+
+    def _stamp_block(self, ids, channel_data, aux_data, host_ns):
+        """ Fill in the lost samples of a block read at host_ns and give every sample its timestamp. """
+        if self.resume_pending and len(ids):
+            self._resume_counters(len(ids), host_ns)
+
+        lost = self.continuity.lost
+        ids, channel_data, aux_data, _ = self.continuity.fill(ids, channel_data, aux_data)
+        if self.continuity.lost != lost:
+            self.warn('Lost %d samples' % (self.continuity.lost - lost))
+
+        return sb.SampleBlock(ids, channel_data, aux_data, self.clock.update(ids, host_ns))
+
+    def _resume_counters(self, n_samples, host_ns):
+        """
+        The first samples after a reconnect have arrived. The packet counter of the board has started over, so the
+        number of samples lost during the reconnect is estimated from the time since the last frame before it.
+        """
+        self.resume_pending = False
+        step = self.continuity.step
+        elapsed = host_ns / 1e9 - self.resume_from
+        missing = max(0, int(round(elapsed * SAMPLE_RATE / step)) - n_samples)
+        self.continuity.resume(missing)
+
+        # The placeholders for the lost samples are numbered back from the first new sample, the clock counts them
+        # itself. Without placeholders it has to skip the gap.
+        #
+        self.clock.resume((missing + 1) * step if self.continuity.policy == 'none' else step)
+
+    def _merge_daisy_frames(self, ids, channel_data, aux_data):
+        """
+        Merge decoded main board and daisy frames into 16 channel samples, see daisy_pairing.py. Returns the
+        (ids, channel_data, aux_data) arrays of the merged samples.
+        """
+        ids, channel_data, aux_data, _ = self.daisy_pairer.pair(ids, channel_data, aux_data)
+        return ids, channel_data, aux_data
 
     """
       PARSER:
@@ -334,18 +607,22 @@ class OpenBCIBoard(object):
     #
     def _read_serial_binary(self, max_bytes_to_skip=3000):
 
-        # The local read function tests for a stalled stream. If not, the read bytes are returned.
+        # The local read function tests for a stalled stream. A stalled stream returns None, the connection
+        # watchdog deals with it.
         #
         def read(n):
             bb = self.ser.read(n)
-            if not bb:
+            capture = self.capture
+            if capture is not None:
+                capture.write(bb)
+            if len(bb) < n:
                 self.warn(dict.get_string('stallwarn'))
-                sys.exit()
-                raise Exception(dict.get_string('stalled'))
-                sys.exit()
-                return '\xFF'
-            else:
-                return bb
+                self.packet_log.add(pl.STALL, bb)
+                return None
+            self.bytes_received += n
+            return bb
+
+        layout = self.layout
 
         # if the stream is filled with trash, we can skip until the set limits of bytes until the start byte is
         # detected.
@@ -353,101 +630,87 @@ class OpenBCIBoard(object):
         for rep in range(max_bytes_to_skip):
 
             #
-            #  ---------Start Byte & ID---------
+            #  ---------Start Byte---------
             #
             # We have to find the start byte in the stream, before we start reading.
             #
-            if self.read_state == 0:
-
-                # read 1 byte to start with
-                #
-                b = read(1)
+            b = read(1)
+            if b is None:
+                return None
+            if b[0] != START_BYTE:
+                continue
 
-                if struct.unpack('B', b)[0] == START_BYTE:
-
-                    # Warn for skipped bytes in the beginning.
-                    #
-                    if rep != 0:
-                        self.warn('Skipped %d bytes before start found' % (rep))
-                        rep = 0
-
-                    packet_id = struct.unpack('B', read(1))[0]  # packet id goes from 0-255
-                    log_bytes_in = str(packet_id)
-
-                    self.read_state = 1
-
-            # If we have found the start byte and accepted it, we continue reading the data.
-            #
-            # ---------Channel Data---------
+            # Warn for skipped bytes in the beginning.
             #
-            elif self.read_state == 1:
-
-                channel_data = []
-
-                # We have to read the whole number of used channels.
-                #
-                for c in range(self.eeg_channels_per_sample):
-
-                    # The channel data is represented by 3 byte ints
-                    #
-                    literal_read = read(3)
-
-                    unpacked = struct.unpack('3B', literal_read)
-                    log_bytes_in = log_bytes_in + '|' + str(literal_read)
-
-                    #
-                    # Store the 3-byte int in 2s compliment
-                    #
-                    if unpacked[0] > 127:
-                        pre_fix = bytes(bytearray.fromhex('FF'))
-                    else:
-                        pre_fix = bytes(bytearray.fromhex('00'))
-
-                    literal_read = pre_fix + literal_read
-
-                    # unpack little endian(>) signed integer(i) (makes unpacking platform independent)
-                    #
-                    myInt = struct.unpack('>i', literal_read)[0]
-
-                    # finally we apply a proper scaling (if desired).
-                    #
-                    if cfg.scaling:
-                        channel_data.append(myInt * scale_fac_uVolts_per_count)
-                    else:
-                        channel_data.append(myInt)
-
-                self.read_state = 2
+            if rep != 0:
+                self.warn('Skipped %d bytes before start found' % (rep))
 
             #
-            # ---------Accelerometer Data---------
+            # ---------Packet id, Channel Data, Accelerometer Data, End Byte---------
             #
-            elif self.read_state == 2:
-                aux_data = []
-                for a in range(self.aux_channels_per_sample):
-
-                    # short = h
-                    acc = struct.unpack('>h', read(2))[0]
-                    log_bytes_in = log_bytes_in + '|' + str(acc)
+            # The rest of the packet is read at once and decoded with the layout chosen when connecting
+            # (see packet_decoder.py).
+            #
+            rest = read(pdec.FRAME_SIZE - 1)
+            if rest is None:
+                return None
+            frame = b + rest
+            val = frame[-1]
+
+            if val == END_BYTE:
+                packet_id, channel_data, aux_data = layout.decode(frame)
+                self.packet_log.add(pl.VALID, frame, frame[1], rep)
+                self.packets_dropped = 0
+                self.frames_decoded += 1
+                self.last_frame_time = time.monotonic()
+                return OpenBCISample(packet_id, channel_data, aux_data)
+            else:
+                self.warn("{0},{1} and {2}".format(frame[1], val, END_BYTE))
+                self.packet_log.add(pl.BAD_END, frame, frame[1], rep)
+                self.packets_dropped = self.packets_dropped + 1
 
-                    if cfg.scaling:
-                        aux_data.append(acc * scale_fac_accel_G_per_count)
-                    else:
-                        aux_data.append(acc)
-
-                self.read_state = 3
-            # ---------End Byte---------
-            elif self.read_state == 3:
-                val = struct.unpack('B', read(1))[0]
-                log_bytes_in = log_bytes_in + '|' + str(val)
-                self.read_state = 0  # read next packet
-                if val == END_BYTE:
-                    sample = OpenBCISample(packet_id, channel_data, aux_data)
-                    self.packets_dropped = 0
-                    return sample
-                else:
-                    self.warn("{0},{1} and {2}".format(packet_id, val, END_BYTE))
-                    logging.debug(log_bytes_in)
-                    self.packets_dropped = self.packets_dropped + 1
+    # The bulk version of the parser. Everything waiting in the serial buffer is read at once, and all complete
+    # packets are decoded in one pass by the decoder (see packet_decoder.py).
+    #
+    def _read_serial_frames(self):
+        """
+        Read all waiting bytes (at least one packet) and return the decoded (ids, channel_data, aux_data) arrays.
+        """
+        bb = self.ser.read(max(self.ser.inWaiting(), pdec.FRAME_SIZE))
+        if not bb:
+            # Stalled stream, the connection watchdog deals with it
+            self.warn(dict.get_string('stallwarn'))
+            self.packet_log.add(pl.STALL)
+        self.bytes_received += len(bb)
+        capture = self.capture
+        if capture is not None:
+            capture.write(bb)
+
+        if self.decoder_reset_pending:
+            self.decoder_reset_pending = False
+            self.decoder.reset()
+        skipped = self.decoder.skipped_bytes
+        frames = self.decoder.feed(bb)
+        self.packet_log.add_frames(self.decoder.frames, self.decoder.skipped_bytes - skipped)
+        if self.decoder.skipped_bytes != skipped:
+            self.warn('Skipped %d bytes before start found' % (self.decoder.skipped_bytes - skipped))
+            self.packets_dropped = self.packets_dropped + 1
+        elif len(frames[0]):
+            self.packets_dropped = 0
+
+        if len(frames[0]):
+            self.frames_decoded += len(frames[0])
+            self.last_frame_time = time.monotonic()
+
+        return frames
+
+    def _read_serial_samples(self):
+        """
+        Read all waiting packets and return them as a SampleBlock, which gives the samples one by one when
+        iterated over. The timestamps are not set.
+        """
+        ids, channel_data, aux_data = self._read_serial_frames()
+        return sb.SampleBlock(ids, channel_data, aux_data, np.full(len(ids), np.nan))
 
     """
   
@@ -460,6 +723,8 @@ class OpenBCIBoard(object):
         print("Stopping streaming...\nWait for buffer to flush...")
         self.streaming = False
         self.ser.write(b's')
+        self.close_capture()
+        self.packet_log.stop()
         self.ctrl.clean_up()
         if cfg.logging:
             logging.warning('sent <s>: stopped streaming')
@@ -467,6 +732,8 @@ class OpenBCIBoard(object):
     def disconnect(self):
         if (self.streaming == True):
             self.stop()
+        self.close_capture()
+        self.watchdog.stop()
         if (self.ser.isOpen()):
             print("Closing Serial...")
             self.ser.close()
@@ -499,22 +766,8 @@ class OpenBCIBoard(object):
         we get to a line with the end sequence '$$$'.
 
         """
-        line = ''
-        # Wait for device to send data
-        time.sleep(1)
-
-        if self.ser.inWaiting():
-            line = ''
-            c = ''
-
-            #
-            # Look for end sequence $$$
-            #
-            while '$$$' not in line:
-                c = self.ser.read().decode('utf-8',
-                                           errors='replace')  # we're supposed to get UTF8 text,
-                # but the board might behave otherwise
-                line += c
+        line = self.handshake.read_reply()
+        if line is not None:
             print(line)
         else:
             self.warn("No Message")
@@ -545,9 +798,8 @@ class OpenBCIBoard(object):
         return False
 
     def print_register_settings(self):
-        self.ser.write(b'?')
-        time.sleep(0.5)
-        self.print_incoming_text()
+        for _, line in self.handshake.send(b'?'):
+            print(line if line is not None else "No Message")
 
     # DEBBUGING: Prints individual incoming bytes
     #
@@ -563,237 +815,129 @@ class OpenBCIBoard(object):
           0xA0|0-255|8, 3-byte signed ints|3 2-byte signed ints|0xC0'''
 
     def print_packets_in(self):
+        """
+        DEBUGGING: Prints every incoming packet, with its status and raw bytes, from the packet log.
+        """
+        if not self.streaming:
+            self.ser.write(b'b')
+            self.streaming = True
+        seen = self.packet_log.count
         while self.streaming:
-            b = struct.unpack('B', self.ser.read())[0]
-
-            if b == START_BYTE:
-                self.attempt_reconnect = False
-                if skipped_str:
-                    logging.debug('SKIPPED\n' + skipped_str + '\nSKIPPED')
-                    skipped_str = ''
-
-                packet_str = "%03d" % (b) + '|'
-                b = struct.unpack('B', self.ser.read())[0]
-                packet_str = packet_str + "%03d" % (b) + '|'
+            self._read_serial_binary()
+            for record in self.packet_log.records(seen):
+                print(pl.format_record(record))
+            seen = self.packet_log.count
 
-                # data channels
-                for i in range(24 - 1):
-                    b = struct.unpack('B', self.ser.read())[0]
-                    packet_str = packet_str + '.' + "%03d" % (b)
-
-                b = struct.unpack('B', self.ser.read())[0]
-                packet_str = packet_str + '.' + "%03d" % (b) + '|'
-
-                # aux channels
-                for i in range(6 - 1):
-                    b = struct.unpack('B', self.ser.read())[0]
-                    packet_str = packet_str + '.' + "%03d" % (b)
-
-                b = struct.unpack('B', self.ser.read())[0]
-                packet_str = packet_str + '.' + "%03d" % (b) + '|'
-
-                # end byte
-                b = struct.unpack('B', self.ser.read())[0]
-
-                # Valid Packet
-                if b == END_BYTE:
-                    packet_str = packet_str + '.' + "%03d" % (b) + '|VAL'
-                    print(packet_str)
-                    # logging.debug(packet_str)
-
-                # Invalid Packet
-                else:
-                    packet_str = packet_str + '.' + "%03d" % (b) + '|INV'
-                    # Reset
-                    self.attempt_reconnect = True
-
-
-            else:
-                print(b)
-                if b == END_BYTE:
-                    skipped_str = skipped_str + '|END|'
-                else:
-                    skipped_str = skipped_str + "%03d" % (b) + '.'
-
-            if self.attempt_reconnect and (timeit.default_timer() - self.last_reconnect) > self.reconnect_freq:
-                self.last_reconnect = timeit.default_timer()
-                self.warn('Reconnecting')
-                self.reconnect()
-
-    def check_connection(self, interval=2, max_packets_to_skip=10):
-        # stop checking when we're no longer streaming
-        if not self.streaming:
-            return
-        # check number of dropped packages and establish connection problem if too large
-        if self.packets_dropped > max_packets_to_skip:
-            # if error, attempt to reconect
-            self.reconnect()
-        # check again again in 2 seconds
-        threading.Timer(interval, self.check_connection).start()
+    def check_connection(self, interval=None, max_packets_to_skip=10):
+        """
+        Start watching the connection, see connection_watchdog.py. A single watchdog thread is used for the whole
+        life of the board, calling this again only changes its settings.
+        """
+        if interval is not None:
+            self.watchdog.interval = interval
+        self.watchdog.max_packets_to_skip = max_packets_to_skip
+        self.watchdog.start()
 
     def reconnect(self):
+        """
+        Restart the board without stopping the streaming: the acquisition thread, the ring buffer and the plugins
+        stay as they are, and the samples lost meanwhile are accounted for when the stream comes back.
+        Returns False if the port could not be reached.
+        """
         self.packets_dropped = 0
         self.warn('Reconnecting')
-        self.stop()
-        time.sleep(0.5)
-        self.ser.write(b'v')
-        time.sleep(0.5)
-        self.ser.write(b'b')
-        time.sleep(0.5)
-        self.streaming = True
-        # self.attempt_reconnect = False
+        self.packet_log.add(pl.RECONNECT)
+        try:
+            if not self.ser.isOpen():
+                self.ser.open()
+            self.ser.write(b's')
+            self.ser.reset_input_buffer()
+            self.decoder_reset_pending = True
+            self.ser.write(b'v')
+            time.sleep(0.5)
+            self.ser.reset_input_buffer()
+            self.ser.write(b'b')
+        except (OSError, serial.SerialException) as e:
+            self.warn('Reconnect failed: ' + str(e))
+            try:
+                self.ser.close()
+            except (OSError, serial.SerialException):
+                pass
+            return False
+
+        if not self.resume_pending:
+            self.resume_from = self.last_frame_time
+            self.resume_pending = True
+        self.last_frame_time = time.monotonic()
+        return True
 
     # Adds a filter at 60hz to cancel out ambient electrical noise
     #
     def enable_filters(self):
-        self.ser.write(b'f')
+        self.send_command(b'f', 'filters')
         self.filtering_data = True
 
     #
     #
     def disable_filters(self):
-        self.ser.write(b'g')
+        self.send_command(b'g', 'filters')
         self.filtering_data = False
 
+    def send_command(self, command, key=None):
+        """
+        Queue a command for the board, see command_queue.py. While streaming it is written by the thread reading
+        the port, between two reads, otherwise right away. Commands with the same key replace each other until
+        they are written. Returns the ticket of the command.
+        """
+        ticket = self.commands.put(command, key)
+        if not self.streaming:
+            self.commands.flush(self.ser, self.frames_decoded)
+        return ticket
+
     def test_signal(self, signal):
-        """ Enable / disable test signal """
-        if signal == 0:
-            self.ser.write(b'0')
-            self.warn("Connecting all pins to ground")
-        elif signal == 1:
-            self.ser.write(b'p')
-            self.warn("Connecting all pins to Vcc")
-        elif signal == 2:
-            self.ser.write(b'-')
-            self.warn("Connecting pins to low frequency 1x amp signal")
-        elif signal == 3:
-            self.ser.write(b'=')
-            self.warn("Connecting pins to high frequency 1x amp signal")
-        elif signal == 4:
-            self.ser.write(b'[')
-            self.warn("Connecting pins to low frequency 2x amp signal")
-        elif signal == 5:
-            self.ser.write(b']')
-            self.warn("Connecting pins to high frequency 2x amp signal")
+        """ Enable / disable test signal. Returns the ticket of the command, see command_queue.py. """
+        if signal in TEST_SIGNALS:
+            command, text = TEST_SIGNALS[signal]
+            self.warn(text)
+            return self.send_command(command, 'test_signal')
         else:
             self.warn("%s is not a known test signal. Valid signals go from 0-5" % (signal))
 
     def set_channel(self, channel, toggle_position):
-        """ Enable / disable channels """
+        """ Enable / disable channels. Returns the ticket of the command, see command_queue.py. """
+        if not 1 <= channel <= (16 if cfg.daisyBoard else 8):
+            return
         # Commands to set toggle to on position
         if toggle_position == 1:
-            if channel is 1:
-                self.ser.write(b'!')
-            if channel is 2:
-                self.ser.write(b'@')
-            if channel is 3:
-                self.ser.write(b'#')
-            if channel is 4:
-                self.ser.write(b'$')
-            if channel is 5:
-                self.ser.write(b'%')
-            if channel is 6:
-                self.ser.write(b'^')
-            if channel is 7:
-                self.ser.write(b'&')
-            if channel is 8:
-                self.ser.write(b'*')
-            if channel is 9 and cfg.daisyBoard:
-                self.ser.write(b'Q')
-            if channel is 10 and cfg.daisyBoard:
-                self.ser.write(b'W')
-            if channel is 11 and cfg.daisyBoard:
-                self.ser.write(b'E')
-            if channel is 12 and cfg.daisyBoard:
-                self.ser.write(b'R')
-            if channel is 13 and cfg.daisyBoard:
-                self.ser.write(b'T')
-            if channel is 14 and cfg.daisyBoard:
-                self.ser.write(b'Y')
-            if channel is 15 and cfg.daisyBoard:
-                self.ser.write(b'U')
-            if channel is 16 and cfg.daisyBoard:
-                self.ser.write(b'I')
+            return self.send_command(CHANNEL_ON[channel - 1:channel], ('channel', channel))
         # Commands to set toggle to off position
         elif toggle_position == 0:
-            if channel is 1:
-                self.ser.write(b'1')
-            if channel is 2:
-                self.ser.write(b'2')
-            if channel is 3:
-                self.ser.write(b'3')
-            if channel is 4:
-                self.ser.write(b'4')
-            if channel is 5:
-                self.ser.write(b'5')
-            if channel is 6:
-                self.ser.write(b'6')
-            if channel is 7:
-                self.ser.write(b'7')
-            if channel is 8:
-                self.ser.write(b'8')
-            if channel is 9 and cfg.daisyBoard:
-                self.ser.write(b'q')
-            if channel is 10 and cfg.daisyBoard:
-                self.ser.write(b'w')
-            if channel is 11 and cfg.daisyBoard:
-                self.ser.write(b'e')
-            if channel is 12 and cfg.daisyBoard:
-                self.ser.write(b'r')
-            if channel is 13 and cfg.daisyBoard:
-                self.ser.write(b't')
-            if channel is 14 and cfg.daisyBoard:
-                self.ser.write(b'y')
-            if channel is 15 and cfg.daisyBoard:
-                self.ser.write(b'u')
-            if channel is 16 and cfg.daisyBoard:
-                self.ser.write(b'i')
+            return self.send_command(CHANNEL_OFF[channel - 1:channel], ('channel', channel))
 
     #
     # This method is used to find the serial port connected to the OpenBCI headware. This is
     # used when the AUTO setting is used when selecting port in the GUI.
     #
     def find_port(self):
-        #
-        # Finds the serial port names. The port addresses are different on different
-        # platforms.
-        #
-        if sys.platform.startswith('study_window'):
-            self.gui.log_mess(dict.get_string(self, 'checkwin'))
-            ports = ['COM%s' % (i + 1) for i in range(256)]
-        elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
-            self.gui.log_mess(dict.get_string(self, 'checklin'))
-            ports = glob.glob('/dev/ttyUSB*')
-        elif sys.platform.startswith('darwin'):
-            self.gui.log_mess(dict.get_string(self, 'checkmac'))
-            ports = glob.glob('/dev/tty.usbserial*')
-        else:
-            raise EnvironmentError('Error finding ports on your operating system')
-
-        openbci_port = ''
-        for port in ports:
-            try:
-                s = serial.Serial(port = cfg.portUsed,
-                                  baudrate = cfg.baudrate,
-                                  timeout = cfg.timeoutt)
-                s.write(b'v')
-                openbci_serial = self.openbci_id(s)
-                s.close()
-                if openbci_serial:
-                    openbci_port = port
-            except (OSError, serial.SerialException):
-                pass
-        if openbci_port == '':
-            raise OSError('noport')
-        else:
-            return openbci_port
+        """
+        Finds the port of the dongle: the port found last time first, then all the candidate ports of the
+        platform probed at the same time (see port_discovery.py).
+        """
+        try:
+            return pd.find_serial_port(cfg.baudrate, cfg.probe_timeout)
+        except OSError:
+            raise OSError(dict.get_string('noport'))
 
 
 class OpenBCISample(object):
     """Object encapulsating a single sample from the OpenBCI board. NB: dummy imp for plugin compatiblity"""
 
-    def __init__(self, packet_id, channel_data, aux_data):
+    __slots__ = ('id', 'channel_data', 'aux_data', 'imp_data', 'timestamp')
+
+    def __init__(self, packet_id, channel_data, aux_data, timestamp=None):
         self.id = packet_id
         self.channel_data = channel_data
         self.aux_data = aux_data
         self.imp_data = []
+        # host time in seconds (time.monotonic() clock), see sample_clock.py
+        self.timestamp = timestamp
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3.6
+"""
+Bulk decoder for the binary Cyton packet stream.
+
+Instead of reading the serial port one field at a time, the board drains everything that is waiting
+in the serial buffer and hands it to the decoder. The decoder finds all the aligned frames in the
+buffer and decodes them in one NumPy pass. Incomplete frames at the end of the buffer are kept until
+the next call.
+
+    Start Byte(1)|Sample ID(1)|Channel Data(24)|Aux Data(6)|End Byte(1)
+    0xA0|0-255|8, 3-byte signed ints|3 2-byte signed ints|0xC0
+
+EXAMPLE USE:
+
+    decoder = CytonDecoder()
+    ids, channel_data, aux_data = decoder.feed(ser.read(ser.inWaiting()))
+
+The single packet parser, used when every sample must be delivered as soon as it arrives, decodes one
+frame at a time with a FrameLayout:
+
+    layout = FrameLayout(daisy=False)
+    packet_id, channel_data, aux_data = layout.decode(frame)
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import struct
+
+import numpy as np
+
+# ========================
+# Constant values
+#
+START_BYTE = 0xA0  # start of data packet
+END_BYTE = 0xC0  # end of data packet
+FRAME_SIZE = 33  # bytes in one packet, start and end byte included
+
+# The layout of one packet. The channel values are kept as raw bytes, since NumPy has no 24-bit integer type.
+# The aux values are big endian shorts.
+#
+FRAME_DTYPE = np.dtype([('start', 'u1'),
+                        ('id', 'u1'),
+                        ('channels', 'u1', (8, 3)),
+                        ('aux', '>i2', (3,)),
+                        ('end', 'u1')])
+
+
+# The same layout for the struct module. Each 24-bit channel value is read as its high byte and its low
+# 16 bits, which are put together and sign extended after unpacking.
+#
+FRAME_STRUCT = struct.Struct('>BB' + 'BH' * 8 + '3h' + 'B')
+
+
+def int24_to_int32(raw):
+    """
+    Convert an array of 3-byte big endian two's complement values (last axis of size 3) to int32.
+    """
+    raw = raw.astype(np.int32)
+    values = (raw[..., 0] << 16) | (raw[..., 1] << 8) | raw[..., 2]
+
+    # Sign extension of the 24-bit value
+    #
+    return (values ^ 0x800000) - 0x800000
+
+
+class CytonDecoder(object):
+    """
+    Finds and decodes the complete frames in a stream of bytes from the Cyton board.
+
+    Args:
+      channel_scale: factor applied to the channel counts (e.g. uV per count), None to keep counts.
+      aux_scale: factor applied to the aux counts (e.g. G per count), None to keep counts.
+
+    The number of skipped bytes and the number of times the decoder had to search for the next start byte are
+    counted in skipped_bytes and resyncs.
+    """
+
+    def __init__(self, channel_scale=None, aux_scale=None):
+        self.channel_scale = channel_scale
+        self.aux_scale = aux_scale
+
+        # Bytes that have been received but not yet decoded, i.e. the start of a frame that is not complete.
+        #
+        self.pending = bytearray()
+
+        self.skipped_bytes = 0
+        self.resyncs = 0
+
+        # The raw frames decoded by the last call to feed, e.g. for the packet log.
+        #
+        self.frames = np.empty(0, dtype=FRAME_DTYPE)
+
+    def reset(self):
+        """ Forget any partial frame, e.g. after the board has been restarted. """
+        self.pending = bytearray()
+
+    def find_frames(self, buf):
+        """
+        Return the offsets of the aligned frames in buf (a uint8 array) and the offset where decoding
+        should continue next time.
+
+        A frame starts with START_BYTE and has END_BYTE 32 bytes later. In a healthy stream the frames follow
+        each other back to back, so we check whole runs of frames at once and only search when a run breaks.
+        """
+        size = len(buf)
+        if size < FRAME_SIZE:
+            return np.empty(0, dtype=np.intp), 0
+
+        last = size - FRAME_SIZE
+        valid = (buf[:last + 1] == START_BYTE) & (buf[FRAME_SIZE - 1:] == END_BYTE)
+        candidates = np.flatnonzero(valid)
+
+        offsets = []
+        pos = 0
+        while pos <= last:
+            if valid[pos]:
+                # Check the whole run of back to back frames from here
+                #
+                run = np.arange(pos, last + 1, FRAME_SIZE)
+                broken = np.flatnonzero(~valid[run])
+                if len(broken):
+                    run = run[:broken[0]]
+                offsets.append(run)
+                pos = int(run[-1]) + FRAME_SIZE
+            else:
+                # Resynchronise at the next possible start byte
+                #
+                nxt = np.searchsorted(candidates, pos)
+                if nxt == len(candidates):
+                    # No frame can start before the tail. Keep the tail, it may hold the start of the next frame.
+                    #
+                    self.skipped_bytes += last + 1 - pos
+                    self.resyncs += 1
+                    pos = last + 1
+                    break
+                self.skipped_bytes += int(candidates[nxt]) - pos
+                self.resyncs += 1
+                pos = int(candidates[nxt])
+
+        if not offsets:
+            return np.empty(0, dtype=np.intp), pos
+
+        return np.concatenate(offsets), pos
+
+    def decode(self, frames):
+        """
+        Decode an array of frames with FRAME_DTYPE into (ids, channel_data, aux_data), applying scaling if set.
+        """
+        ids = frames['id'].astype(np.int32)
+        channel_data = int24_to_int32(frames['channels'])
+        aux_data = frames['aux'].astype(np.int32)
+
+        if self.channel_scale is not None:
+            channel_data = channel_data * self.channel_scale
+        if self.aux_scale is not None:
+            aux_data = aux_data * self.aux_scale
+
+        return ids, channel_data, aux_data
+
+    def feed(self, data):
+        """
+        Add the bytes in data to the stream and decode every complete frame.
+
+        Returns the tuple (ids, channel_data, aux_data) with one row per frame. The arrays are empty if no
+        complete frame has arrived yet.
+        """
+        self.pending += data
+        buf = np.frombuffer(bytes(self.pending), dtype=np.uint8)
+
+        offsets, consumed = self.find_frames(buf)
+
+        # Gather all frames into one (n, 33) block and view it with the packet layout.
+        #
+        rows = buf[offsets[:, None] + np.arange(FRAME_SIZE)]
+        frames = rows.view(FRAME_DTYPE).reshape(-1)
+        self.frames = frames
+
+        del self.pending[:consumed]
+
+        return self.decode(frames)
+
+
+class FrameLayout(object):
+    """
+    Decodes single Cyton frames with a precompiled struct.
+
+    The layout is created once when connecting, from the daisy and scaling settings, so the parser does not
+    have to look them up for every packet.
+
+    Args:
+      daisy: True if a daisy module is attached (the frames are merged in pairs by the board).
+      channel_scale: factor applied to the channel counts (e.g. uV per count), None to keep counts.
+      aux_scale: factor applied to the aux counts (e.g. G per count), None to keep counts.
+    """
+
+    def __init__(self, daisy=False, channel_scale=None, aux_scale=None):
+        self.daisy = daisy
+        self.channel_scale = channel_scale
+        self.aux_scale = aux_scale
+
+    def decode(self, frame, offset=0):
+        """
+        Decode the 33-byte frame starting at offset. The start and end bytes must have been checked by
+        the caller. Returns (packet_id, channel_data, aux_data) as lists.
+        """
+        values = FRAME_STRUCT.unpack_from(frame, offset)
+
+        channel_data = [((high << 16 | low) ^ 0x800000) - 0x800000
+                        for high, low in zip(values[2:18:2], values[3:18:2])]
+        aux_data = list(values[18:21])
+
+        if self.channel_scale is not None:
+            channel_data = [value * self.channel_scale for value in channel_data]
+        if self.aux_scale is not None:
+            aux_data = [value * self.aux_scale for value in aux_data]
+
+        return values[1], channel_data, aux_data
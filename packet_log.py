@@ -0,0 +1,273 @@
+#!/usr/bin/env python3.6
+"""
+Binary diagnostic log of the packets read from the Cyton board.
+
+Every packet the parser sees is stored as a fixed-size record in a preallocated ring in memory: the time it
+was read, the packet id, its status (valid, bad end byte, skipped bytes, stall, reconnect), the number of bytes
+skipped before it, and the raw 33 byte frame. Storing a record is a copy into the ring, nothing is formatted
+or allocated while streaming. The ring always holds the last records, e.g. to look at what came in before a
+stall.
+
+When logging is enabled, a writer thread appends the new records to a log file once a second. The records are
+written as they are, after a short header, and turned into text only by the report tool:
+
+    python packet_log.py packets_20190101_120000.obl              # summary
+    python packet_log.py packets_20190101_120000.obl --list bad    # every record with a bad end byte
+
+EXAMPLE USE:
+
+    log = PacketLog(4096)
+    log.start('packets.obl', enabled=lambda: cfg.logging)
+    log.add(VALID, frame, packet_id)
+    log.add_frames(decoder.frames)
+    ...
+    log.stop()
+
+    records = read_log('packets.obl')
+    print('\\n'.join(report(records)))
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import argparse
+import struct
+import threading
+import time
+
+import numpy as np
+
+import packet_decoder as pdec
+
+# ========================
+# Constant values
+#
+MAGIC = b'OBCIPLG1'
+FILE_NAME = 'packets_%Y%m%d_%H%M%S.obl'  # goes through time.strftime
+
+# Status of a record
+#
+VALID = 0  # a frame with start and end byte
+BAD_END = 1  # a frame with a start byte but no end byte
+SKIPPED = 2  # bytes skipped without finding a frame (the bulk decoder resynchronising)
+STALL = 3  # the read timed out
+RECONNECT = 4  # the board was restarted
+STATUS_NAMES = ['valid', 'bad', 'skipped', 'stall', 'reconnect']
+
+# One record: time.time() of the read, skipped bytes before the frame, packet id (-1 if none), status, frame.
+#
+RECORD = struct.Struct('<dIhB%ds' % pdec.FRAME_SIZE)
+RECORD_DTYPE = np.dtype([('time', '<f8'),
+                         ('skipped', '<u4'),
+                         ('id', '<i2'),
+                         ('status', 'u1'),
+                         ('frame', 'u1', (pdec.FRAME_SIZE,))])
+HEADER = struct.Struct('<8sI')  # magic, record size
+
+
+class PacketLog(object):
+    """
+    Args:
+      capacity: number of records kept in memory
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.ring = np.zeros(capacity, dtype=RECORD_DTYPE)
+
+        # Records added since the start, and the number of them handled by the writer
+        #
+        self.count = 0
+        self.written = 0
+        self.lost = 0
+
+        self.file = None
+        self.file_name = None
+        self.enabled = None
+        self.interval = 1.0
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def add(self, status, frame=b'', packet_id=-1, skipped=0):
+        """ Store one record. frame is the raw frame (bytes), or empty. """
+        RECORD.pack_into(self.ring, (self.count % self.capacity) * RECORD.size,
+                         time.time(), skipped, packet_id, status, frame)
+        self.count += 1
+
+    def add_frames(self, frames, skipped=0):
+        """
+        Store a record for every frame of an array of valid frames with FRAME_DTYPE, read at the same time, e.g.
+        from the bulk decoder. Skipped bytes get a record of their own in front.
+        """
+        if skipped:
+            self.add(SKIPPED, skipped=skipped)
+        n = len(frames)
+        if n == 0:
+            return
+        raw = frames.view(np.uint8).reshape(n, pdec.FRAME_SIZE)
+        ids = frames['id']
+        if n > self.capacity:
+            self.count += n - self.capacity
+            raw, ids = raw[-self.capacity:], ids[-self.capacity:]
+            n = self.capacity
+
+        # At most two contiguous stretches of the ring
+        #
+        now = time.time()
+        start = self.count % self.capacity
+        done = 0
+        while done < n:
+            stop = min(start + n - done, self.capacity)
+            rows = self.ring[start:stop]
+            rows['time'] = now
+            rows['skipped'] = 0
+            rows['id'] = ids[done:done + stop - start]
+            rows['status'] = VALID
+            rows['frame'] = raw[done:done + stop - start]
+            done += stop - start
+            start = 0
+        self.count += n
+
+    def records(self, start=0, stop=None):
+        """
+        Returns a copy of the records with numbers start to stop (counted since the log was created), in order.
+        Records that have already been overwritten in the ring are left out.
+        """
+        stop = self.count if stop is None else stop
+        first = max(start, stop - self.capacity)
+        idx = np.arange(first, stop) % self.capacity
+        rows = self.ring[idx]
+
+        # The rows overwritten while copying may be torn
+        #
+        overwritten = min(max(0, self.count - self.capacity - first), len(rows))
+        return rows[overwritten:]
+
+    """
+
+    Writer thread
+
+    """
+
+    def start(self, file_name, enabled=None, interval=1.0):
+        """
+        Start writing the new records to file_name every interval seconds, as long as enabled() is true (always
+        if enabled is None). The file is only created when there is something to write.
+        """
+        if self.thread is not None:
+            return
+        self.file_name = file_name
+        self.enabled = enabled
+        self.interval = interval
+        self.written = self.count
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="packet log")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """ Write the records added since the last call, if enabled. """
+        count = self.count
+        if count == self.written:
+            return
+        if self.enabled is not None and not self.enabled():
+            self.written = count
+            return
+
+        rows = self.records(self.written, count)
+        self.lost += count - self.written - len(rows)
+        if self.file is None:
+            self.file = open(self.file_name, 'wb')
+            self.file.write(HEADER.pack(MAGIC, RECORD_DTYPE.itemsize))
+        self.file.write(rows.tobytes())
+        self.file.flush()
+        self.written = count
+
+    def stop(self):
+        """ Stop the writer thread after a last write. """
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def get_stats(self):
+        return {'records': self.count,
+                'written': self.written,
+                'lost': self.lost}
+
+
+"""
+
+Reading and reporting
+
+"""
+
+
+def read_log(file_name):
+    """ Returns the records of a log file as an array with RECORD_DTYPE. """
+    with open(file_name, 'rb') as f:
+        magic, size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or size != RECORD_DTYPE.itemsize:
+            raise ValueError('%s is not a packet log' % file_name)
+        return np.fromfile(f, dtype=RECORD_DTYPE)
+
+
+def format_record(record):
+    """ One record as a line of text. """
+    return '%s.%03d  %4d  %-9s %5d  %s' % (time.strftime('%H:%M:%S', time.localtime(record['time'])),
+                                           int(record['time'] % 1 * 1000), record['id'],
+                                           STATUS_NAMES[record['status']], record['skipped'],
+                                           record['frame'].tobytes().hex() if record['status'] <= BAD_END else '')
+
+
+def report(records, id_modulo=256):
+    """ Returns a summary of the records as lines of text. """
+    if not len(records):
+        return ['No records']
+
+    span = records['time'][-1] - records['time'][0]
+    lines = ['%d records over %.1f s, from %s' % (len(records), span,
+                                                 time.strftime('%Y-%m-%d %H:%M:%S',
+                                                               time.localtime(records['time'][0])))]
+    for status, name in enumerate(STATUS_NAMES):
+        n = np.count_nonzero(records['status'] == status)
+        if n:
+            lines.append('  %-9s %d' % (name, n))
+    lines.append('  skipped bytes %d' % records['skipped'].sum())
+
+    # Jumps in the packet counter between valid frames
+    #
+    ids = records['id'][records['status'] == VALID].astype(np.int64)
+    if len(ids) > 1:
+        steps = (ids[1:] - ids[:-1]) % id_modulo
+        jumps = np.flatnonzero(steps != 1)
+        lines.append('  id jumps  %d, %d ids missing' % (len(jumps), (steps[jumps] - 1).sum()))
+    if span > 0:
+        lines.append('  %.1f valid frames/s' % (len(ids) / span))
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Report on a binary packet log")
+    parser.add_argument('log', help="the log file")
+    parser.add_argument('--list', nargs='*', choices=STATUS_NAMES + ['all'],
+                        help="print the records with these statuses (all by default)")
+    args = parser.parse_args()
+
+    records = read_log(args.log)
+    print('\n'.join(report(records)))
+    if args.list is not None:
+        names = args.list if args.list and 'all' not in args.list else STATUS_NAMES
+        shown = records[np.isin(records['status'], [STATUS_NAMES.index(name) for name in names])]
+        for record in shown:
+            print(format_record(record))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3.6
+"""
+Growing in-memory store of fixed-size packets of samples, each with a label, for the collecting plugins.
+
+The packets are kept in one preallocated array of shape (packets, rows, channels) and the labels in a vector
+next to it. The rows of the packet being collected are written straight into the next free slot. When the
+array is full it is replaced by one twice as large, so adding a row costs the same whether the session has
+lasted a minute or an hour (the old approach, stacking every row and every packet onto the whole array, copied
+everything collected so far each time).
+
+The collected data is a view of the array, and is saved without a copy.
+
+EXAMPLE USE:
+
+    store = PacketStore(rows=16, channels=16)
+    for sample in samples:
+        if store.add_row(sample.channel_data):
+            store.close_packet(label)
+    store.save('data', 'result')
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import numpy as np
+
+
+class PacketStore(object):
+    """
+    Args:
+      rows: number of samples in a packet
+      channels: number of values in a sample
+      capacity: number of packets allocated at the start
+      dtype, label_dtype: types of the values and of the labels
+    """
+
+    def __init__(self, rows, channels, capacity=64, dtype=np.float64, label_dtype=np.int64):
+        self.rows = rows
+        self.channels = channels
+        self.buffer = np.empty((capacity, rows, channels), dtype=dtype)
+        self.label_buffer = np.empty(capacity, dtype=label_dtype)
+
+        # Complete packets, and rows in the packet being collected
+        #
+        self.count = 0
+        self.row = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self):
+        return len(self.buffer)
+
+    @property
+    def data(self):
+        """ The complete packets, (packets, rows, channels). A view, valid until the store grows. """
+        return self.buffer[:self.count]
+
+    @property
+    def labels(self):
+        return self.label_buffer[:self.count]
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes + self.label_buffer.nbytes
+
+    def _grow(self):
+        buffer = np.empty((2 * self.capacity, self.rows, self.channels), dtype=self.buffer.dtype)
+        buffer[:self.count] = self.buffer[:self.count]
+        label_buffer = np.empty(2 * self.capacity, dtype=self.label_buffer.dtype)
+        label_buffer[:self.count] = self.label_buffer[:self.count]
+        self.buffer = buffer
+        self.label_buffer = label_buffer
+
+    def add_row(self, values):
+        """ Add one sample to the packet being collected. Returns True when the packet is full. """
+        self.buffer[self.count, self.row] = values
+        self.row += 1
+        return self.row == self.rows
+
+    def close_packet(self, label):
+        """ Store the label of the full packet and start the next one. """
+        self.label_buffer[self.count] = label
+        self.count += 1
+        self.row = 0
+        if self.count == self.capacity:
+            self._grow()
+
+    def save(self, data_file, label_file, flat=True):
+        """
+        Save the complete packets and their labels with np.save. With flat, the data is saved as (packets * rows,
+        channels), one sample per row.
+        """
+        data = self.data
+        if flat:
+            data = data.reshape(-1, self.channels)
+        np.save(data_file, data)
+        np.save(label_file, self.labels)
@@ -9,6 +9,10 @@ Fields of interest for plugins:
   
 If needed, plugins that need to report an error can set self.is_activated to False during activate() call.
 
+When the board streams in block mode (cfg.block_mode), plugins receive a SampleBlock (see sample_block.py) through
+process_block() instead of one sample at a time. The default implementation calls the plugin once per sample, so
+plugins only need to override it when they can handle the arrays directly.
+
 NB: because of how yapsy discovery system works, plugins must use the following syntax to inherit to use polymorphism (see http://yapsy.sourceforge.net/Advices.html):
 
     import plugin_interface as plugintypes
@@ -45,6 +49,13 @@ class IPluginExtended(IPlugin):
     def deactivate(self):
         print("Plugin %s deactivated." % (self.__class__.__name__))
 
+    # called with a SampleBlock in block mode. By default the samples are handed over one by one,
+    # override to work on the arrays directly.
+    #
+    def process_block(self, block):
+        for sample in block:
+            self(sample)
+
     # plugins that require arguments should implement this method
     #
     def show_help(self):
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3.6
+"""
+Runs a plugin on its own thread, fed through a bounded queue.
+
+Normally all plugins are called one after the other on the streaming thread, so one slow plugin (e.g. a TCP
+streamer with a stalled client) holds up all the others. A plugin wrapped in a PluginWorker only costs the
+streaming thread a queue insert. What happens when the queue is full is decided by the policy:
+
+    block        wait until the plugin has caught up (nothing is lost)
+    drop-oldest  throw away the oldest queued item to make room
+    drop-newest  throw away the incoming item
+    coalesce     merge everything queued into one SampleBlock (nothing is lost, the plugin gets larger blocks)
+
+The worker is selected per plugin in cfg.plugins by adding the arguments worker=<policy> and, optionally,
+worker_depth=<n>, e.g. ['streamer_tcp', 'localhost', '12345', 'worker=drop-oldest', 'worker_depth=512'].
+These arguments are removed before the plugin is activated.
+"""
+# ===================
+# Imports
+# ===================
+#
+import collections
+import threading
+import time
+
+import sample_block as sb
+
+POLICIES = ('block', 'drop-oldest', 'drop-newest', 'coalesce')
+
+
+def split_worker_args(args, default_depth=256):
+    """
+    Take the worker options out of a list of plugin arguments. Returns (policy, depth, remaining args), where
+    policy is None if the plugin should run inline.
+    """
+    policy = None
+    depth = default_depth
+    rest = []
+    for arg in args:
+        if arg.startswith('worker='):
+            policy = arg[len('worker='):]
+        elif arg.startswith('worker_depth='):
+            depth = int(arg[len('worker_depth='):])
+        else:
+            rest.append(arg)
+
+    if policy is not None and policy not in POLICIES:
+        raise ValueError("Unknown worker policy %s, use one of %s" % (policy, ', '.join(POLICIES)))
+
+    return policy, depth, rest
+
+
+def to_block(item):
+    """ Turn a single sample into a one sample SampleBlock. Blocks are returned as they are. """
+    if isinstance(item, sb.SampleBlock):
+        return item
+    if isinstance(item, sb.SampleView):
+        return item.block.slice(item.row, item.row + 1)
+    timestamp = getattr(item, 'timestamp', None)
+    if timestamp is None:
+        timestamp = time.monotonic()
+    return sb.SampleBlock([item.id], [item.channel_data], [item.aux_data], [timestamp])
+
+
+class PluginWorker(object):
+    """
+    Wraps a plugin so that it is called from its own thread.
+
+    Args:
+      plugin: the plugin object (an IPluginExtended)
+      name: the plugin name, used in reports
+      policy: what to do when the queue is full, one of POLICIES
+      depth: maximum number of queued items (samples or blocks)
+
+    The worker can be used as a callback in the same way as the plugin: call it with a sample or
+    use process_block with a SampleBlock.
+    """
+
+    def __init__(self, plugin, name, policy='block', depth=256):
+        self.plugin = plugin
+        self.name = name
+        self.policy = policy
+        self.depth = depth
+
+        self.queue = collections.deque()
+        self.changed = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        # Counters for the report
+        #
+        self.received = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_queued = 0
+        self.errors = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="worker-" + self.name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self, timeout=2.0):
+        """ Let the worker finish what is queued (within timeout seconds) and stop the thread. """
+        with self.changed:
+            self.running = False
+            self.changed.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def __call__(self, sample):
+        self._put(sample, 1)
+
+    def process_block(self, block):
+        self._put(block, len(block))
+
+    def _put(self, item, size):
+        with self.changed:
+            self.received += size
+
+            if len(self.queue) >= self.depth:
+                if self.policy == 'block':
+                    self.changed.wait_for(lambda: len(self.queue) < self.depth or not self.running)
+                elif self.policy == 'drop-oldest':
+                    old = self.queue.popleft()
+                    self.dropped += len(old) if isinstance(old, sb.SampleBlock) else 1
+                elif self.policy == 'drop-newest':
+                    self.dropped += size
+                    return
+                elif self.policy == 'coalesce':
+                    merged = sb.SampleBlock.concatenate([to_block(queued) for queued in self.queue])
+                    self.coalesced += len(self.queue)
+                    self.queue.clear()
+                    self.queue.append(merged)
+
+            self.queue.append(item)
+            self.max_queued = max(self.max_queued, len(self.queue))
+            self.changed.notify_all()
+
+    def _run(self):
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: self.queue or not self.running)
+                if not self.queue:
+                    return
+                item = self.queue.popleft()
+                self.changed.notify_all()
+
+            try:
+                if isinstance(item, sb.SampleBlock):
+                    self.plugin.process_block(item)
+                else:
+                    self.plugin(item)
+            except Exception as e:
+                self.errors += 1
+                print("Something went wrong in plugin [ " + self.name + " ]: " + str(e))
+
+    def get_stats(self):
+        """ Returns the queue depth and the drop counters of the worker. """
+        return {'policy': self.policy,
+                'queued': len(self.queue),
+                'max_queued': self.max_queued,
+                'depth': self.depth,
+                'received': self.received,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'errors': self.errors}
@@ -0,0 +1,90 @@
+import datetime
+
+import bdf_writer as bdf
+import config as cfg
+import plugin_interface as plugintypes
+import recording as rec
+import segments as sg
+import triggers
+
+
+class PluginBdfRecord(plugintypes.IPluginExtended):
+    """
+    Records the session as BDF+ (see bdf_writer.py): the 24 bit counts of the channels and the accelerometer in
+    data records of cfg.bdf_record_seconds, with the events of the stimulus display and of the collecting plugins
+    as annotations. The file can be opened in any EDF/BDF reader while it is written, up to the last checkpoint.
+    Long sessions are split into segments by cfg.segment_seconds and cfg.segment_bytes, each starting at its time
+    in the session.
+    """
+
+    def __init__(self, file_name="recording"):
+        now = datetime.datetime.now()
+        self.time_stamp = '%d-%d-%d_%d-%d-%d' % (now.year, now.month, now.day, now.hour, now.minute, now.second)
+        self.file_name = file_name
+        self.segments = None
+
+    def activate(self):
+        if len(self.args) > 0:
+            self.file_name = self.args[0]
+        if 'no_time' not in self.args:
+            self.file_name = self.file_name + '_' + self.time_stamp
+        self.file_name = self.file_name + '.bdf'
+
+        self.header = rec.board_header(self.sample_rate, self.eeg_channels, self.aux_channels)
+        self.started = datetime.datetime.now()
+        record_samples = int(round(cfg.bdf_record_seconds * self.sample_rate))
+
+        # Samples waiting to be turned into counts, a record at a time. The segments of a long session end on
+        # whole records (see segments.py).
+        #
+        self.stage = rec.CountStage(self.header, record_samples, ids=False)
+        self.segments = sg.Segments(self.file_name, self.open_segment, self.close_segment,
+                                    lambda writer, rows: writer.write(rows),
+                                    self.sample_rate, cfg.segment_seconds, cfg.segment_bytes, record_samples)
+        self.segments.start()
+
+        self.watch = triggers.TriggerWatch()
+        print("Will record BDF to:" + self.file_name)
+
+    def open_segment(self, file_name, segment):
+        """ A segment starts at the start of the session plus its place in it, and says which file it follows. """
+        start = self.started + datetime.timedelta(seconds=segment['start'])
+        writer = bdf.BdfWriter(file_name, self.header, cfg.bdf_record_seconds, cfg.bdf_checkpoint_seconds,
+                               start=start)
+        if segment['previous']:
+            writer.add_event(0, 'segment %d, after %s' % (segment['index'], segment['previous']))
+        return writer
+
+    def close_segment(self, writer, segment):
+        writer.close()
+        return writer.get_stats()
+
+    def deactivate(self):
+        if self.segments is None:
+            return
+        self.flush_stage()
+        self.segments.close()
+        print("Closing, BDF saved to:" + self.file_name, self.segments.get_stats())
+        self.segments = None
+
+    def show_help(self):
+        print("Optional arguments: [filename] (default: recording), no_time")
+
+    def poll_triggers(self):
+        writer = self.segments.writer
+        for value, text in self.watch.poll():
+            writer.add_event(value, text, writer.samples + len(self.stage))
+
+    def __call__(self, sample):
+        self.poll_triggers()
+        if self.stage.add(sample):
+            self.flush_stage()
+
+    def process_block(self, block):
+        self.poll_triggers()
+        self.flush_stage()
+        self.segments.write(self.stage.counts(block.ids, block.channel_data, block.aux_data))
+
+    def flush_stage(self):
+        if len(self.stage):
+            self.segments.write(self.stage.take()[0])
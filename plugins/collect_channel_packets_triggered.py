@@ -14,15 +14,18 @@ The trigger mechanism is available in the file displaytrigger.py
 # IMPORTS
 #
 import datetime
+import os
 import threading
 import timeit
 from tkinter import ttk
 
-import numpy as np
-
 import config as cfg
+import dataset_writer as dw
 import displaytrigger as trig
+import packet_store as ps
 import plugin_interface as plugintypes
+import segments as sg
+import triggers
 from dictionary import Dictionary as dict
 
 
@@ -59,6 +62,10 @@ class PluginChanCollectTrig(plugintypes.IPluginExtended):
         #
         self.trigger_value = 0
 
+        # The recorders get an event when the label of the packets changes (see triggers.py).
+        #
+        self.posted_label = None
+
         # Set current time at the initialisation
         #
         now = datetime.datetime.now()
@@ -91,14 +98,15 @@ class PluginChanCollectTrig(plugintypes.IPluginExtended):
         self.data_arr_string = ''
         self.result_arr_string = ''
 
-        # Collecting real data variables as well.
-        #
-        self.data_arr_np = np.array([], int)
-        self.result_arr_np = np.array([], int)
-
-        # We use a temporary variable to collect the packages
+        # Collecting real data variables as well. The packets and their trigger values go into a growing store
+        # (see packet_store.py), created with the first sample when the number of channels is known. With
+        # cfg.dataset_dir set, they are written to disk in shards as they are collected instead (see
+        # dataset_writer.py). A long session is split into segments (see segments.py), each with its own files and
+        # store, so the memory used does not grow with the length of the session.
         #
-        self.arr_collector = np.array([], int)
+        self.store = None
+        self.segments = None
+        self.channels = None
 
         self.t2 = 0.0
 
@@ -149,10 +157,13 @@ class PluginChanCollectTrig(plugintypes.IPluginExtended):
 
             # self.trigger.studyStart()
 
-            # Open the file in append mode
+            # The files of a segment get its number, the first segment is opened with the first sample.
             #
-            with open(self.data_file_name, 'a') as f:
-                f.write('%' + self.time_stamp + '\n')
+            self.file_names = (self.data_file_name, self.result_file_name, self.data_file_name_np,
+                               self.result_file_name_np)
+            self.segments = sg.Segments(self.data_file_name, self.open_segment, self.close_segment,
+                                        sample_rate=self.sample_rate, max_seconds=cfg.segment_seconds,
+                                        max_bytes=cfg.segment_bytes)
 
     # The deactivate function is used to close down the plugin in a controlled way.
     #
@@ -176,14 +187,43 @@ class PluginChanCollectTrig(plugintypes.IPluginExtended):
             f.write(self.result_arr_string)
             f.close()
 
-        np.save(self.data_file_name_np, self.data_arr_np)
-        np.save(self.result_file_name_np, self.result_arr_np)
+        if self.store is not None:
+            self.segments.close()
+            print(self.segments.get_stats())
 
         print(dict.get_string('plugclose') + self.data_file_name)
         print(dict.get_string('checkarray'))
 
         return
 
+    def open_segment(self, file_name, segment):
+        """ Start the files and the store of a segment. Returns what close_segment needs to finish it. """
+        index = segment['index'] if self.segments.rotating else None
+        self.data_file_name, self.result_file_name, self.data_file_name_np, self.result_file_name_np = \
+            [sg.segment_name(name, index) for name in self.file_names]
+
+        # Open the file in append mode
+        #
+        with open(self.data_file_name, 'a') as f:
+            f.write('%' + self.time_stamp + '\n')
+        self.store = self.create_store(self.channels)
+        return self.store, self.data_file_name_np, self.result_file_name_np
+
+    def close_segment(self, writer, segment):
+        store, data_file_name_np, result_file_name_np = writer
+        if isinstance(store, dw.DatasetWriter):
+            store.close()
+            return store.get_stats()
+        store.save(data_file_name_np, result_file_name_np)
+        return {'packets': len(store)}
+
+    def create_store(self, channels):
+        if cfg.dataset_dir:
+            directory = os.path.join(cfg.dataset_dir, os.path.basename(self.data_file_name_np))
+            print("Writing dataset shards to:" + directory)
+            return dw.DatasetWriter(directory, self.pack_size + 1, channels, cfg.triggerval, cfg.dataset_shard_size)
+        return ps.PacketStore(self.pack_size + 1, channels)
+
     def show_help(self):
         print("Optional argument: [filename] (default: collect.csv)")
 
@@ -262,9 +302,14 @@ class PluginChanCollectTrig(plugintypes.IPluginExtended):
         # =========================================================================
         # Checking the data and adding it into rows, both numeric and string-form in parallell.
         #
-        # First the int data in a numpy array.
+        # First the numeric data, written straight into the packet being collected.
         #
-        self.int_row_np = np.array(sample.channel_data)  # TODO check the polarity. Is abs() necessary?
+        if self.store is None:
+            self.channels = len(sample.channel_data)
+            self.segments.start()
+        elif self.segments.due:
+            self.segments.rotate()
+        self.store.add_row(sample.channel_data)  # TODO check the polarity. Is abs() necessary?
 
         for i in sample.channel_data:
             row += str(abs(i))          # TODO likewise
@@ -285,13 +330,6 @@ class PluginChanCollectTrig(plugintypes.IPluginExtended):
         #
         self.data_arr_string += row
 
-        # Add the np component to the collector array.
-        #
-        if np.size(self.arr_collector) == 0:
-            self.arr_collector = np.hstack((self.arr_collector, self.int_row_np))
-        else:
-            self.arr_collector = np.vstack((self.arr_collector, self.int_row_np))
-
         delta_t = self.t - self.t2
 
         # =========================================================================
@@ -318,12 +356,13 @@ class PluginChanCollectTrig(plugintypes.IPluginExtended):
             #
             # First the numpy data
             #
-            if np.size(self.data_arr_np) == 0:
-                self.data_arr_np = np.array(self.arr_collector)
-            else:
-                self.data_arr_np = np.vstack((self.data_arr_np, self.arr_collector))
+            self.store.close_packet(self.trigger_value)
 
-            self.result_arr_np = np.hstack((self.result_arr_np, np.array(self.trigger_value)))
+            # Tell the recorders about a new label, at the end of the first packet that has it.
+            #
+            if self.trigger_value != self.posted_label:
+                triggers.post(self.trigger_value, 'label %d' % self.trigger_value)
+                self.posted_label = self.trigger_value
 
             # Then the string data
             #
@@ -354,6 +393,10 @@ class PluginChanCollectTrig(plugintypes.IPluginExtended):
 
             self.no_of_packets = 0
 
+            # A new segment starts after this packet when the current one is long enough.
+            #
+            self.segments.advance(self.pack_size + 1)
+
     # def second__call__(self, sample):
     #     t = timeit.default_timer() - self.start_time
     #
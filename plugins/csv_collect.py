@@ -1,18 +1,39 @@
-import timeit
+import time
 import datetime
 
+import numpy as np
+
+import config as cfg
+import file_writer as fw
 import plugin_interface as plugintypes
+import sample_block as sb
+import segments as sg
+
+# Rows are time since start | sample id | channels | aux. Channel values are float32, 7 digits keep them whole.
+#
+TIME_FORMAT = '%.6f'
+ID_FORMAT = '%d'
+VALUE_FORMAT = '%.7g'
 
 
 class PluginCSVCollect(plugintypes.IPluginExtended):
+    """
+    Writes the samples to a CSV file. The rows are formatted a batch at a time and written by a background writer
+    that keeps the file open (see file_writer.py), flushing after cfg.csv_flush_size characters or
+    cfg.csv_flush_latency seconds, with the fsync policy cfg.csv_fsync. Long sessions are split into segments by
+    cfg.segment_seconds and cfg.segment_bytes, the time column counts from the start of the session in all of
+    them.
+    """
 
     def __init__(self, file_name="collect.csv", delim=",", verbose=True):
         now = datetime.datetime.now()
         self.time_stamp = '%d-%d-%d_%d-%d-%d' % (now.year, now.month, now.day, now.hour, now.minute, now.second)
         self.file_name = self.time_stamp
-        self.start_time = timeit.default_timer()
+        self.start_time = time.monotonic()
         self.delim = delim
-        self.verbose = True
+        self.verbose = False
+        self.segments = None
+        self.row_format = None
 
     def activate(self):
         if len(self.args) > 0:
@@ -25,40 +46,99 @@ class PluginCSVCollect(plugintypes.IPluginExtended):
 
         self.file_name = self.file_name + '.csv'
         print("Will export CSV to:" + self.file_name)
-        # Open in append mode
-        with open(self.file_name, 'a') as f:
-            f.write('%' + self.time_stamp + '\n')
+        self.start_time = time.monotonic()
+
+        # Open in append mode, the writer keeps the file open until its segment is closed (see segments.py).
+        #
+        self.segments = sg.Segments(self.file_name, self.open_segment, self.close_segment, self.put_block,
+                                    self.sample_rate, cfg.segment_seconds, cfg.segment_bytes)
+        self.segments.start()
+
+    def open_segment(self, file_name, segment):
+        writer = fw.FileWriter(file_name, self.format_rows, 'a', cfg.csv_flush_size, cfg.csv_flush_latency,
+                               cfg.csv_fsync, cfg.csv_queue_depth)
+        writer.start()
+        if self.segments.rotating:
+            writer.put('%%%s segment %d sample %d after %s\n' % (self.time_stamp, segment['index'],
+                                                                 segment['first_sample'], segment['previous']))
+        else:
+            writer.put('%' + self.time_stamp + '\n')
+        return writer
+
+    def close_segment(self, writer, segment):
+        writer.close()
+        return writer.get_stats()
 
     def deactivate(self):
-        print("Closing, CSV saved to:" + self.file_name)
+        if self.segments is not None:
+            self.segments.close()
+            print("Closing, CSV saved to:" + self.file_name, self.segments.get_stats())
+            self.segments = None
         return
 
     def show_help(self):
         print("Optional argument: [filename] (default: collect.csv)")
 
     def __call__(self, sample):
-        t = timeit.default_timer() - self.start_time
-
-        # print(timeSinceStart|Sample Id)
-        if self.verbose:
-            print("CSV: %f | %d" % (t, sample.id))
-
-        row = ''
-        row += str(t)
-        row += self.delim
-        row += str(sample.id)
-        row += self.delim
-        for i in sample.channel_data:
-            row += str(i)
-            row += self.delim
-        for i in sample.aux_data:
-            row += str(i)
-            row += self.delim
-        # TODO remove last comma
-
-        if self.verbose:
-            row += "CSV: %f | %d" % (t, sample.id)
-
-        row += '\n'
-        with open(self.file_name, 'a') as f:
-            f.write(row)
+        # The time is that of the sample when it has one, otherwise the time it arrives here.
+        #
+        timestamp = getattr(sample, 'timestamp', None)
+        if timestamp is None or timestamp != timestamp:
+            timestamp = time.monotonic()
+        if isinstance(sample, sb.SampleView):
+            self.segments.writer.put((timestamp, sample.id, sample.channels, sample.aux))
+        else:
+            self.segments.writer.put((timestamp, sample.id, sample.channel_data, sample.aux_data))
+        self.segments.advance(1)
+
+    def process_block(self, block):
+        timestamps = block.timestamps
+        if np.isnan(timestamps).any():
+            timestamps = np.where(np.isnan(timestamps), time.monotonic(), timestamps)
+        self.segments.write(block.ids, block.channel_data, block.aux_data, timestamps)
+
+    def put_block(self, writer, ids, channel_data, aux_data, timestamps):
+        writer.put(sb.SampleBlock(ids, channel_data, aux_data, timestamps))
+
+    def format_rows(self, items):
+        """
+        Runs on the writer thread: turns the queued samples and blocks into the rows of text, all in one array and
+        one string formatting. Text items (the header) are written as they are.
+        """
+        text = []
+        samples = []
+        blocks = []
+
+        def flush_samples():
+            if samples:
+                blocks.append(np.array([[t, i] + list(c) + list(a) for t, i, c, a in samples], dtype=np.float64))
+                del samples[:]
+
+        for item in items:
+            if isinstance(item, str):
+                flush_samples()
+                text.append((len(blocks), item))
+            elif isinstance(item, sb.SampleBlock):
+                flush_samples()
+                blocks.append(np.column_stack((item.timestamps, item.ids, item.channel_data, item.aux_data)))
+            else:
+                samples.append(item)
+        flush_samples()
+
+        out = []
+        for n, block in enumerate(blocks):
+            while text and text[0][0] == n:
+                out.append(text.pop(0)[1])
+            block[:, 0] -= self.start_time
+            out.append(self.rows_to_text(block))
+        out.extend(t for _, t in text)
+
+        if self.verbose and blocks and len(blocks[-1]):
+            print("CSV: %f | %d" % (blocks[-1][-1, 0], blocks[-1][-1, 1]))
+        return ''.join(out)
+
+    def rows_to_text(self, rows):
+        if self.row_format is None or self.row_format[0] != rows.shape[1]:
+            fmt = self.delim.join([TIME_FORMAT, ID_FORMAT] + [VALUE_FORMAT] * (rows.shape[1] - 2)) + '\n'
+            self.row_format = (rows.shape[1], fmt)
+        return (self.row_format[1] * len(rows)) % tuple(rows.ravel().tolist())
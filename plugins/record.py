@@ -0,0 +1,86 @@
+import datetime
+
+import config as cfg
+import plugin_interface as plugintypes
+import recording as rec
+import segments as sg
+import triggers
+
+
+class PluginRecord(plugintypes.IPluginExtended):
+    """
+    Records the session in the native recording format (see recording.py): the counts of every sample in
+    compressed chunks of cfg.record_chunk_seconds, the trigger events of the stimulus display, and an index to
+    find any part of the recording quickly. Long sessions are split into segments by cfg.segment_seconds and
+    cfg.segment_bytes, each segment has its place in the session in its header.
+
+    The samples are gathered in a small array and turned into counts a second at a time. Compression and writing
+    are done on the worker thread of the recording.
+    """
+
+    def __init__(self, file_name="recording"):
+        now = datetime.datetime.now()
+        self.time_stamp = '%d-%d-%d_%d-%d-%d' % (now.year, now.month, now.day, now.hour, now.minute, now.second)
+        self.file_name = file_name
+        self.segments = None
+
+    def activate(self):
+        if len(self.args) > 0:
+            self.file_name = self.args[0]
+        if 'no_time' not in self.args:
+            self.file_name = self.file_name + '_' + self.time_stamp
+        self.file_name = self.file_name + '.obcr'
+
+        self.header = rec.board_header(self.sample_rate, self.eeg_channels, self.aux_channels)
+
+        # Samples waiting to be turned into counts, a second at a time. The segments of a long session end on these
+        # seconds (see segments.py).
+        #
+        self.stage = rec.CountStage(self.header, int(self.sample_rate))
+        self.segments = sg.Segments(self.file_name, self.open_segment, self.close_segment,
+                                    lambda writer, rows, timestamps: writer.write(rows, timestamps),
+                                    self.sample_rate, cfg.segment_seconds, cfg.segment_bytes, len(self.stage.rows))
+        self.segments.start()
+
+        self.watch = triggers.TriggerWatch()
+        print("Will record to:" + self.file_name)
+
+    def open_segment(self, file_name, segment):
+        header = dict(self.header, segment=segment) if self.segments.rotating else self.header
+        columns = 1 + self.eeg_channels + self.aux_channels
+        chunk_samples = int(round(cfg.record_chunk_seconds * self.sample_rate))
+        return rec.RecordingWriter(file_name, header, columns, chunk_samples, cfg.record_compression)
+
+    def close_segment(self, writer, segment):
+        writer.close()
+        return writer.get_stats()
+
+    def deactivate(self):
+        if self.segments is None:
+            return
+        self.flush_stage()
+        self.segments.close()
+        print("Closing, recording saved to:" + self.file_name, self.segments.get_stats())
+        self.segments = None
+
+    def show_help(self):
+        print("Optional arguments: [filename] (default: recording), no_time")
+
+    def poll_triggers(self):
+        writer = self.segments.writer
+        for value, text in self.watch.poll():
+            writer.add_event(value, text, writer.samples + len(self.stage))
+
+    def __call__(self, sample):
+        self.poll_triggers()
+        if self.stage.add(sample):
+            self.flush_stage()
+
+    def process_block(self, block):
+        self.poll_triggers()
+        self.flush_stage()
+        self.segments.write(self.stage.counts(block.ids, block.channel_data, block.aux_data), block.timestamps)
+
+    def flush_stage(self):
+        if len(self.stage):
+            self.segments.write(*self.stage.take())
@@ -22,12 +22,18 @@ class MonitorStreamer(Thread):
         self.server = streamer
 
     def run(self):
-        # run until we DIE
-        while True:
+        # run until the server socket is closed by deactivate
+        while self.server.server_socket.fileno() != -1:
             # check FPS + listen for new connections
             # FIXME: not so great with threads -- use a lock?
             # TODO: configure interval
-            self.server.check_connections()
+            try:
+                self.server.check_connections()
+            except (OSError, ValueError):
+                # closed by deactivate while checking
+                if self.server.server_socket.fileno() == -1:
+                    return
+                raise
             time.sleep(1)
 
 
@@ -94,7 +100,7 @@ class StreamerTCPServer(plugintypes.IPluginExtended):
         for sock in self.CONNECTION_LIST:
             if sock != self.server_socket:
                 try:
-                    sock.send("closing!\n")
+                    sock.send(b"closing!\n")
                 # at this point don't bother if message not sent
                 except:
                     continue
@@ -112,7 +118,7 @@ class StreamerTCPServer(plugintypes.IPluginExtended):
             # If one error should happen, we remove socket from the list
             try:
                 if as_string:
-                    sock.send(str(values) + "\n")
+                    sock.send((str(values) + "\n").encode())
                 else:
                     nb_channels = len(values)
                     # format for binary data, network endian (big) and float (float32)
@@ -69,7 +69,7 @@ class UDPServer(plugintypes.IPluginExtended):
         self.send_data(json.dumps(sample.channel_data))
 
     def send_data(self, data):
-        self.server.sendto(data, (self.ip, self.port))
+        self.server.sendto(data.encode(), (self.ip, self.port))
 
     # From IPlugin: close sockets, send message to client
     def deactivate(self):
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3.6
+"""
+Finding the port of the board, for the serial boards (Cyton) and the BLE board (Ganglion).
+
+The candidate serial ports are probed in parallel, at most PROBE_WORKERS at a time, each with its own
+short deadline, instead of one after the other. The port that answered last time is remembered in a small cache file, by a key that does not
+change when the device is plugged in again (the USB serial number, or the /dev/serial/by-id path), and is
+tried first on the next start. For the Ganglion the cache holds the MAC address, and the BLE scan stops as
+soon as that address is seen.
+
+EXAMPLE USE:
+
+    port = find_serial_port(115200)
+
+    cache = PortCache()
+    _, address = cache.get('ganglion')
+    cache.remember('ganglion', address, address)
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import concurrent.futures
+import glob
+import json
+import os
+import sys
+
+import serial
+
+import handshake as hs
+
+# ========================
+# Constant values
+#
+CACHE_FILE = os.path.join(os.path.expanduser('~'), '.openbci_ports.json')
+
+# Most ports probed at the same time. On Windows there are 256 candidates, most of which fail right away.
+#
+PROBE_WORKERS = 16
+
+
+class PortCache(object):
+    """
+    The last port found for every kind of board, stored as {kind: {'key': ..., 'port': ...}} in a JSON file.
+    A missing or broken file is an empty cache.
+    """
+
+    def __init__(self, file_name=CACHE_FILE):
+        self.file_name = file_name
+        try:
+            with open(file_name) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, kind):
+        """ Returns (key, port) of the last port found for kind, or (None, None). """
+        entry = self.entries.get(kind, {})
+        return entry.get('key'), entry.get('port')
+
+    def remember(self, kind, key, port):
+        self.entries[kind] = {'key': key, 'port': port}
+        try:
+            with open(self.file_name, 'w') as f:
+                json.dump(self.entries, f, indent=2)
+        except OSError:
+            pass
+
+
+def serial_candidates():
+    """ Returns the serial ports that may have a dongle on them, for the current platform. """
+    if sys.platform.startswith('win'):
+        return ['COM%s' % (i + 1) for i in range(256)]
+    elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
+        return sorted(glob.glob('/dev/ttyUSB*'))
+    elif sys.platform.startswith('darwin'):
+        return sorted(glob.glob('/dev/tty.usbserial*'))
+    else:
+        raise EnvironmentError('Error finding ports on your operating system')
+
+
+def serial_keys():
+    """
+    Returns {port: key} for the serial ports known to the system. The key is the USB serial number if there is
+    one, otherwise the /dev/serial/by-id path pointing to the port.
+    """
+    keys = {}
+    for link in glob.glob('/dev/serial/by-id/*'):
+        keys[os.path.realpath(link)] = link
+    try:
+        from serial.tools import list_ports
+        for info in list_ports.comports():
+            if info.serial_number:
+                keys[info.device] = 'serial:' + info.serial_number
+    except ImportError:
+        pass
+    return keys
+
+
+def probe_serial(port, baudrate, timeout=1.0):
+    """ Returns True if an OpenBCI board answers a soft reset on port within timeout seconds. """
+    try:
+        s = serial.Serial(port=port, baudrate=baudrate, timeout=hs.POLL)
+    except (OSError, serial.SerialException):
+        return False
+    try:
+        _, reply = hs.Handshake(s, timeout).send(b'v')[0]
+        return reply is not None and 'OpenBCI' in reply
+    except (OSError, serial.SerialException):
+        return False
+    finally:
+        s.close()
+
+
+def probe_all(ports, probe, max_workers=PROBE_WORKERS):
+    """
+    Run probe(port) on all ports, max_workers at a time. Returns the first port for which it returned True,
+    without waiting for the others, or None. A probe that raises counts as False.
+    """
+    if not ports:
+        return None
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(ports)),
+                                                     thread_name_prefix="probe")
+    futures = {executor.submit(probe, port): port for port in ports}
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                ok = future.result()
+            except Exception:
+                ok = False
+            if ok:
+                return futures[future]
+        return None
+    finally:
+        # The probes not started yet are dropped, the running ones end with their own deadline
+        #
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def find_serial_port(baudrate, timeout=1.0, kind='cyton', cache=None):
+    """
+    Find the port of a serial board: the cached port first, then all the other candidates at once.
+    Raises OSError if no board answers.
+    """
+    cache = cache if cache is not None else PortCache()
+    ports = serial_candidates()
+    keys = serial_keys()
+
+    def probe(port):
+        return probe_serial(port, baudrate, timeout)
+
+    # The cached board may have come back on another device name, the key tells where it is now.
+    #
+    cached_key, cached_port = cache.get(kind)
+    ports_by_key = {key: port for port, key in keys.items()}
+    first = ports_by_key.get(cached_key, cached_port)
+    if first in ports and probe(first):
+        port = first
+    else:
+        port = probe_all([p for p in ports if p != first], probe)
+
+    if port is None:
+        raise OSError('Cannot find OpenBCI port')
+    cache.remember(kind, keys.get(port, port), port)
+    return port
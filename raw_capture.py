@@ -0,0 +1,273 @@
+#!/usr/bin/env python3.6
+"""
+Capture of the raw byte stream from the Cyton board, and offline decoding of the captures.
+
+The recorder copies every byte read from the serial port, exactly as it came, into a large preallocated
+memory-mapped file. Writing is a copy into memory, the operating system takes care of getting it to disk.
+The header at the start of the file, with the number of bytes written so far, is updated every few seconds
+and when the capture is closed, so a capture cut short by a crash can still be read up to its last update.
+The file grows by another preallocated stretch when it is full.
+
+The reader maps the file without loading it, and decodes it lazily in chunks, one chunk at a time or several
+in parallel, with the frame layout and scaling that the board was using (stored in the header). Since the
+bytes are kept as they are, they can be decoded again later in other ways, e.g. to look at how the stream
+broke down before a crash.
+
+    Header(4096)|Raw bytes(length)|Preallocated space
+
+EXAMPLE USE:
+
+    capture = RawCapture('session.raw', daisy=False, channel_scale=0.02235, aux_scale=0.002 / 16)
+    capture.write(ser.read(ser.inWaiting()))
+    capture.close()
+
+    reader = RawCaptureReader('session.raw')
+    ids, channel_data, aux_data, offsets = reader.decode(workers=4)
+
+    python raw_capture.py session.raw --output session.npz
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import argparse
+import concurrent.futures
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+import daisy_pairing as dp
+import packet_decoder as pdec
+
+# ========================
+# Constant values
+#
+MAGIC = b'OBCIRAW1'
+VERSION = 1
+HEADER_SIZE = 4096  # one page, so the data starts page aligned
+
+# magic, version, capacity, length, start time, last update, sample rate, daisy, channel scale, aux scale.
+# A scale of NaN means the values were kept as counts.
+#
+HEADER = struct.Struct('<8sIQQdddBdd')
+LENGTH_OFFSET = 8 + 4 + 8
+UPDATED_OFFSET = LENGTH_OFFSET + 8 + 8
+
+
+class RawCapture(object):
+    """
+    Writes the raw bytes to a memory-mapped file.
+
+    Args:
+      file_name: the capture file, overwritten if it exists
+      daisy, sample_rate, channel_scale, aux_scale: how the board decodes the stream, stored for the reader
+      preallocate: bytes reserved at a time
+      header_interval: seconds between two updates of the header
+    """
+
+    def __init__(self, file_name, daisy=False, sample_rate=250.0, channel_scale=None, aux_scale=None,
+                 preallocate=64 * 1024 * 1024, header_interval=2.0):
+        self.file_name = file_name
+        self.preallocate = preallocate
+        self.header_interval = header_interval
+
+        self.start_time = time.time()
+        self.sample_rate = sample_rate
+        self.daisy = daisy
+        self.channel_scale = channel_scale
+        self.aux_scale = aux_scale
+
+        self.length = 0
+        self.capacity = preallocate
+        self.next_header = time.monotonic() + header_interval
+        self.lock = threading.Lock()
+
+        self.file = open(file_name, 'w+b')
+        self.file.truncate(HEADER_SIZE + self.capacity)
+        self.map = mmap.mmap(self.file.fileno(), HEADER_SIZE + self.capacity)
+        self.write_header()
+
+    def write_header(self):
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, self.capacity, self.length, self.start_time, time.time(),
+                         self.sample_rate, int(self.daisy),
+                         np.nan if self.channel_scale is None else self.channel_scale,
+                         np.nan if self.aux_scale is None else self.aux_scale)
+
+    def write(self, data):
+        """ Append the bytes in data. Does nothing once the capture is closed. """
+        n = len(data)
+        with self.lock:
+            if self.map is None or n == 0:
+                return
+            if self.length + n > self.capacity:
+                self._grow(self.length + n)
+
+            start = HEADER_SIZE + self.length
+            self.map[start:start + n] = data
+            self.length += n
+
+            # Only the length and the time of the update change
+            #
+            now = time.monotonic()
+            if now >= self.next_header:
+                struct.pack_into('<Q', self.map, LENGTH_OFFSET, self.length)
+                struct.pack_into('<d', self.map, UPDATED_OFFSET, time.time())
+                self.next_header = now + self.header_interval
+
+    def _grow(self, needed):
+        while self.capacity < needed:
+            self.capacity += self.preallocate
+        self.map.close()
+        self.file.truncate(HEADER_SIZE + self.capacity)
+        self.map = mmap.mmap(self.file.fileno(), HEADER_SIZE + self.capacity)
+        self.write_header()
+
+    def close(self):
+        """ Write the final header and cut the preallocated space that was not used. """
+        with self.lock:
+            if self.map is None:
+                return
+            self.capacity = self.length
+            self.write_header()
+            self.map.flush()
+            self.map.close()
+            self.map = None
+            self.file.truncate(HEADER_SIZE + self.length)
+            self.file.close()
+
+
+class RawCaptureReader(object):
+    """
+    Reads and decodes a capture made by RawCapture. The file is memory-mapped, nothing is decoded until asked.
+
+    Args:
+      file_name: the capture file
+      scaled: apply the scaling that the board was using. False gives counts.
+    """
+
+    def __init__(self, file_name, scaled=True):
+        with open(file_name, 'rb') as f:
+            header = HEADER.unpack(f.read(HEADER.size))
+        (magic, version, capacity, length, self.start_time, self.updated, self.sample_rate, daisy,
+         channel_scale, aux_scale) = header
+        if magic != MAGIC:
+            raise ValueError('%s is not a raw capture' % file_name)
+
+        self.daisy = bool(daisy)
+        self.channel_scale = None if np.isnan(channel_scale) else channel_scale
+        self.aux_scale = None if np.isnan(aux_scale) else aux_scale
+
+        # The board's own layout and bulk decoder
+        #
+        if scaled:
+            self.layout = pdec.FrameLayout(self.daisy, self.channel_scale, self.aux_scale)
+        else:
+            self.layout = pdec.FrameLayout(self.daisy)
+        self.scaled = scaled
+
+        self.data = np.memmap(file_name, dtype=np.uint8, mode='r', offset=HEADER_SIZE, shape=(length,)) \
+            if length else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        """ Number of bytes captured. """
+        return len(self.data)
+
+    def decoder(self):
+        """ A new bulk decoder with the scaling of the layout. """
+        return pdec.CytonDecoder(self.layout.channel_scale, self.layout.aux_scale)
+
+    def chunks(self, chunk_size=1024 * 1024):
+        """ Returns the (start, stop) byte ranges of the chunks. """
+        starts = range(0, len(self.data), chunk_size)
+        return [(start, min(start + chunk_size, len(self.data))) for start in starts]
+
+    def decode_chunk(self, start, stop):
+        """
+        Decode the frames starting in the byte range [start, stop), searching for the first frame from start.
+        Frames running over stop are read up to their end. Returns (ids, channel_data, aux_data, offsets), offsets
+        being the byte position of each frame.
+
+        A chunk decoded on its own may start in the middle of a frame, and take bytes of it for a frame. To decode
+        a capture in chunks, use iter_chunks or decode, which start each chunk where the one before it ended.
+        """
+        return self._decode_range(start, stop)[:4]
+
+    def _decode_range(self, start, stop):
+        """ decode_chunk, and the position where decoding continues: after its last frame, or the next start byte. """
+        decoder = self.decoder()
+        buf = np.asarray(self.data[start:min(stop + pdec.FRAME_SIZE - 1, len(self.data))])
+        found, position = decoder.find_frames(buf)
+        beyond = np.flatnonzero(found >= stop - start)
+        if len(beyond):
+            position = found[beyond[0]]
+            found = found[:beyond[0]]
+
+        rows = buf[found[:, None] + np.arange(pdec.FRAME_SIZE)]
+        ids, channel_data, aux_data = decoder.decode(rows.view(pdec.FRAME_DTYPE).reshape(-1))
+        return ids, channel_data, aux_data, found + start, max(start + int(position), stop)
+
+    def iter_chunks(self, chunk_size=1024 * 1024):
+        """ Decode the capture one chunk at a time, each chunk starting where the frames of the one before end. """
+        position = 0
+        for start, stop in self.chunks(chunk_size):
+            ids, channel_data, aux_data, offsets, position = self._decode_range(max(start, position), stop)
+            yield ids, channel_data, aux_data, offsets
+
+    def decode(self, workers=None, chunk_size=1024 * 1024, merge_daisy=None):
+        """
+        Decode the whole capture, several chunks at a time on workers threads (all processors if None).
+        With a daisy module the frames are merged into 16 channel samples, unless merge_daisy is False.
+        Returns (ids, channel_data, aux_data, offsets); offsets of merged samples are those of their odd frame.
+        """
+        chunks = self.chunks(chunk_size)
+        with concurrent.futures.ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+            parts = list(pool.map(lambda chunk: self._decode_range(*chunk), chunks))
+
+        # The chunks were decoded each from its own start. Decoding continues where the chunk before ended
+        # instead: from a frame found in the chunk the rest is the same, otherwise (rarely) it is decoded again.
+        #
+        position = 0
+        for i, (start, stop) in enumerate(chunks):
+            if position == start:
+                position = parts[i][4]
+                continue
+            offsets = parts[i][3]
+            first = np.searchsorted(offsets, position)
+            if first < len(offsets) and offsets[first] == position:
+                parts[i] = tuple(column[first:] for column in parts[i][:4]) + (parts[i][4],)
+            else:
+                parts[i] = self._decode_range(max(start, position), stop)
+            position = parts[i][4]
+        parts = [part[:4] for part in parts]
+
+        if not parts:
+            return (np.zeros(0, dtype=np.int32), np.zeros((0, 8)), np.zeros((0, 3)),
+                    np.zeros(0, dtype=np.intp))
+        ids, channel_data, aux_data, offsets = (np.concatenate(column) for column in zip(*parts))
+
+        if self.daisy and merge_daisy is not False:
+            ids, channel_data, aux_data, second = dp.DaisyPairer(256).pair(ids, channel_data, aux_data)
+            offsets = offsets[second]
+        return ids, channel_data, aux_data, offsets
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Decode a raw capture of the Cyton byte stream")
+    parser.add_argument('capture', help="the capture file")
+    parser.add_argument('-o', '--output', help="write ids, channel_data, aux_data and offsets to this .npz file")
+    parser.add_argument('--counts', action='store_true', help="keep counts, do not scale")
+    parser.add_argument('--workers', type=int, default=None, help="number of decoding threads")
+    args = parser.parse_args()
+
+    reader = RawCaptureReader(args.capture, scaled=not args.counts)
+    t0 = time.time()
+    ids, channel_data, aux_data, offsets = reader.decode(args.workers)
+    print("%d bytes, %d samples decoded in %.2f s, daisy: %s" % (len(reader), len(ids), time.time() - t0,
+                                                                 reader.daisy))
+    if args.output:
+        np.savez(args.output, ids=ids, channel_data=channel_data, aux_data=aux_data, offsets=offsets)
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3.6
+"""
+Native recording format: compressed chunks of raw counts with a seek index.
+
+A recording starts with a header describing the board (type, sample rate, gain, scale factors, channel map,
+daisy), followed by chunks of a fixed number of samples. A chunk holds the packet ids, channel counts and aux
+counts of its samples as int32 columns. Before compression with zlib, each column is replaced by the difference
+between successive samples and the bytes are regrouped by significance, which lets zlib do much better on EEG.
+The chunks are compressed and written by a worker thread.
+
+Samples lost on the way reach the recorders as placeholders with NaN values (cfg.gap_policy 'nan'). They are
+stored as the count GAP_COUNT, which the ADS1299 never delivers, and read back as NaN.
+
+Trigger events are written next to the chunk they fall in. At the end of the file an index maps sample ranges
+and events to file offsets, so any part of a long recording is read without reading the rest. If the
+recording was not closed (a crash), the reader rebuilds the index by walking the chunk headers.
+
+    Magic | header length | JSON header
+    CHNK record | compressed chunk | EVNT record | ... | CHNK record | compressed chunk
+    INDX record | chunk table | event table | trailer (index offset, end magic)
+
+EXAMPLE USE:
+
+    writer = RecordingWriter('session.obcr', {'board': 'Cyton', 'sample_rate': 250.0, ...}, columns=12,
+                             chunk_samples=2500)
+    writer.write(rows, timestamps)         # rows: (n, 12) int32 = id | 8 channels | 3 aux
+    writer.add_event(12, 'image 12')
+    writer.close()
+
+    reader = RecordingReader('session.obcr')
+    ids, channel_data, aux_data = reader.read_seconds(600, 60)
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import argparse
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+import config as cfg
+import sample_block as sb
+
+# ========================
+# Constant values
+#
+MAGIC = b'OBCIREC1'
+END_MAGIC = b'OBCIEND1'
+VERSION = 1
+GAP_COUNT = -2 ** 31  # a lost sample
+
+PREAMBLE = struct.Struct('<8sI')  # magic, header length
+CHUNK = struct.Struct('<4sqiid')  # b'CHNK', first sample, samples, compressed size, timestamp of the first sample
+EVENT = struct.Struct('<4sqid32s')  # b'EVNT', sample, value, timestamp, text
+INDEX = struct.Struct('<4sii')  # b'INDX', chunks, events
+TRAILER = struct.Struct('<q8s')  # index offset, end magic
+
+CHUNK_DTYPE = np.dtype([('first', '<i8'), ('count', '<i4'), ('offset', '<i8'), ('size', '<i4'), ('time', '<f8')])
+EVENT_DTYPE = np.dtype([('sample', '<i8'), ('value', '<i4'), ('time', '<f8'), ('text', 'S32')])
+
+
+def encode_chunk(rows, level=6):
+    """ Compress an (n, columns) int32 array: differences along time, bytes grouped by significance, zlib. """
+    rows = np.ascontiguousarray(rows, dtype='<i4')
+    deltas = np.diff(rows, axis=0, prepend=np.zeros((1, rows.shape[1]), dtype='<i4'))
+    planes = deltas.view(np.uint8).reshape(len(rows), rows.shape[1], 4).transpose(2, 0, 1)
+    return zlib.compress(planes.tobytes(), level)
+
+
+def decode_chunk(data, samples, columns):
+    """ The reverse of encode_chunk. """
+    planes = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(4, samples, columns)
+    deltas = np.ascontiguousarray(planes.transpose(1, 2, 0)).view('<i4').reshape(samples, columns)
+    return np.cumsum(deltas, axis=0, dtype='<i4')
+
+
+def board_header(sample_rate, eeg_channels, aux_channels):
+    """
+    Describe the board in use (from the config module and the board module) for the header of a recording.
+    The samples reach the plugins scaled if cfg.scaling is set, the recorders turn them back into counts with
+    the scale factors.
+    """
+    if cfg.boardType == 'Ganglion':
+        try:
+            import open_bci_ganglion as board
+        except ImportError:
+            board = None
+        gain = 51.0
+    else:
+        import open_bci_v4 as board
+        gain = board.ADS1299_gain
+
+    active = list(cfg.channels) + (list(cfg.dchannels) if cfg.daisyBoard else [])
+    return {'board': cfg.boardType,
+            'sample_rate': float(sample_rate),
+            'gain': gain,
+            'channel_scale': getattr(board, 'scale_fac_uVolts_per_count', None),
+            'aux_scale': getattr(board, 'scale_fac_accel_G_per_count', None),
+            'scaled_input': bool(cfg.scaling),
+            'daisy': bool(cfg.daisyBoard),
+            'eeg_channels': eeg_channels,
+            'aux_channels': aux_channels,
+            'channel_map': [{'label': 'EEG %d' % (i + 1), 'active': bool(i < len(active) and active[i])}
+                            for i in range(eeg_channels)]}
+
+
+def to_counts(values, scale, scaled_input):
+    """ Turn channel or aux values as the plugins get them into int32 counts, NaN (a lost sample) into GAP_COUNT. """
+    values = np.asarray(values, dtype=np.float64)
+    if scaled_input and scale:
+        values = values / scale
+    gaps = np.isnan(values)
+    if gaps.any():
+        return np.where(gaps, GAP_COUNT, np.rint(np.where(gaps, 0.0, values))).astype(np.int32)
+    return np.rint(values).astype(np.int32)
+
+
+def from_counts(counts, scale=None):
+    """ The values of int32 counts as float64, scaled if scale is given, with NaN for GAP_COUNT. """
+    values = counts * scale if scale else counts.astype(np.float64)
+    values[counts == GAP_COUNT] = np.nan
+    return values
+
+
+class CountStage(object):
+    """
+    The samples as the plugins get them, gathered in a small array and turned into counts a batch at a time, for
+    the recorders.
+
+    Args:
+      header: the board description from board_header
+      samples: number of samples gathered before add reports the stage full
+      ids: put the packet id in the first column of the counts
+    """
+
+    def __init__(self, header, samples, ids=True):
+        self.header = header
+        self.channels = header['eeg_channels']
+        self.ids = ids
+        self.rows = np.empty((max(1, samples), 1 + self.channels + header['aux_channels']))
+        self.timestamps = np.empty(len(self.rows))
+        self.fill = 0
+
+    def __len__(self):
+        return self.fill
+
+    def add(self, sample):
+        """ Stage one sample. Returns True when the stage is full. """
+        row = self.rows[self.fill]
+        row[0] = sample.id
+        if isinstance(sample, sb.SampleView):
+            row[1:1 + self.channels] = sample.channels
+            row[1 + self.channels:] = sample.aux
+        else:
+            row[1:1 + self.channels] = sample.channel_data
+            row[1 + self.channels:] = sample.aux_data
+        timestamp = getattr(sample, 'timestamp', None)
+        self.timestamps[self.fill] = timestamp if timestamp is not None else time.monotonic()
+        self.fill += 1
+        return self.fill == len(self.rows)
+
+    def take(self):
+        """ Returns (counts, timestamps) of the staged samples and empties the stage. """
+        rows = self.rows[:self.fill]
+        counts = self.counts(rows[:, 0], rows[:, 1:1 + self.channels], rows[:, 1 + self.channels:])
+        timestamps = self.timestamps[:self.fill].copy()
+        self.fill = 0
+        return counts, timestamps
+
+    def counts(self, ids, channel_data, aux_data):
+        """ The int32 counts of a block of samples. """
+        scaled = self.header['scaled_input']
+        columns = [to_counts(channel_data, self.header['channel_scale'], scaled),
+                   to_counts(aux_data, self.header['aux_scale'], scaled)]
+        if self.ids:
+            columns.insert(0, np.asarray(ids, dtype=np.int32))
+        return np.column_stack(columns)
+
+
+class RecordingWriter(object):
+    """
+    Args:
+      file_name: the recording, overwritten if it exists
+      header: dict with the board description, stored as JSON
+      columns: number of int32 columns of a sample
+      chunk_samples: number of samples in a chunk
+      level: zlib compression level
+      depth: number of full chunks that may wait for the worker, write waits when it is reached
+    """
+
+    def __init__(self, file_name, header, columns, chunk_samples=2500, level=6, depth=8):
+        self.file_name = file_name
+        self.columns = columns
+        self.chunk_samples = chunk_samples
+        self.level = level
+
+        self.header = dict(header)
+        self.header.update({'version': VERSION,
+                            'gap_count': GAP_COUNT,
+                            'columns': columns,
+                            'chunk_samples': chunk_samples,
+                            'compression': 'zlib',
+                            'filters': ['delta', 'shuffle'],
+                            'created': time.strftime('%Y-%m-%d %H:%M:%S')})
+
+        self.file = open(file_name, 'wb')
+        text = json.dumps(self.header, indent=2).encode('utf-8')
+        self.file.write(PREAMBLE.pack(MAGIC, len(text)) + text)
+
+        # The chunk being filled, and the events that fall in it
+        #
+        self.buffer = np.empty((chunk_samples, columns), dtype='<i4')
+        self.fill = 0
+        self.first_time = None
+        self.events = []
+
+        # Samples written so far, and the index built by the worker
+        #
+        self.samples = 0
+        self.chunk_table = []
+        self.event_table = []
+        self.bytes_in = 0
+        self.errors = 0
+
+        self.queue = queue.Queue(depth)
+        self.thread = threading.Thread(target=self._run, name="recording " + os.path.basename(file_name))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, rows, timestamps=None):
+        """ Add (n, columns) rows of counts. timestamps (seconds) are only kept for the first sample of a chunk. """
+        rows = np.asarray(rows)
+        done = 0
+        while done < len(rows):
+            if self.fill == 0:
+                self.first_time = float(timestamps[done]) if timestamps is not None else time.monotonic()
+            n = min(len(rows) - done, self.chunk_samples - self.fill)
+            self.buffer[self.fill:self.fill + n] = rows[done:done + n]
+            self.fill += n
+            self.samples += n
+            done += n
+            if self.fill == self.chunk_samples:
+                self._send_chunk()
+
+    def add_event(self, value, text='', sample=None, timestamp=None):
+        """ A trigger event at the given sample (the next sample to be written by default). """
+        sample = self.samples if sample is None else sample
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        self.events.append((sample, value, timestamp, text.encode('utf-8')[:32]))
+
+    def _send_chunk(self):
+        if self.fill == 0 and not self.events:
+            return
+        self.queue.put((self.samples - self.fill, self.buffer[:self.fill], self.first_time, self.events))
+        self.buffer = np.empty((self.chunk_samples, self.columns), dtype='<i4')
+        self.fill = 0
+        self.events = []
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                self._write_chunk(*item)
+            except (OSError, ValueError, zlib.error) as e:
+                self.errors += 1
+                print("Recording %s: %s" % (self.file_name, e))
+
+    def _write_chunk(self, first, rows, first_time, events):
+        data = encode_chunk(rows, self.level)
+        offset = self.file.tell()
+        self.file.write(CHUNK.pack(b'CHNK', first, len(rows), len(data), first_time or 0.0) + data)
+        self.chunk_table.append((first, len(rows), offset, len(data), first_time or 0.0))
+        for event in events:
+            self.file.write(EVENT.pack(b'EVNT', *event))
+            self.event_table.append(event)
+        self.file.flush()
+        self.bytes_in += rows.nbytes
+
+    def flush(self):
+        """ Send the chunk being filled to the worker, e.g. before a checkpoint. """
+        self._send_chunk()
+
+    def close(self):
+        """ Write the last chunk, the index and the trailer. """
+        if self.thread is None:
+            return
+        self._send_chunk()
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+        offset = self.file.tell()
+        self.file.write(INDEX.pack(b'INDX', len(self.chunk_table), len(self.event_table)))
+        self.file.write(np.array(self.chunk_table, dtype=CHUNK_DTYPE).tobytes())
+        self.file.write(np.array(self.event_table, dtype=EVENT_DTYPE).tobytes())
+        self.file.write(TRAILER.pack(offset, END_MAGIC))
+        self.file.close()
+
+    def get_stats(self):
+        return {'samples': self.samples,
+                'chunks': len(self.chunk_table),
+                'events': len(self.event_table),
+                'bytes_in': self.bytes_in,
+                'errors': self.errors}
+
+
+class RecordingReader(object):
+    """
+    Random access to a recording. Only the header and the index are read when opening.
+
+    Args:
+      file_name: the recording
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.file = open(file_name, 'rb')
+        magic, length = PREAMBLE.unpack(self.file.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError('%s is not a recording' % file_name)
+        self.header = json.loads(self.file.read(length).decode('utf-8'))
+        self.data_start = PREAMBLE.size + length
+        self.columns = self.header['columns']
+
+        self.recovered = False
+        if not self._read_index():
+            self._scan()
+            self.recovered = True
+
+    def _read_index(self):
+        size = os.path.getsize(self.file_name)
+        if size < self.data_start + TRAILER.size:
+            return False
+        self.file.seek(size - TRAILER.size)
+        offset, magic = TRAILER.unpack(self.file.read(TRAILER.size))
+        if magic != END_MAGIC:
+            return False
+        self.file.seek(offset)
+        tag, chunks, events = INDEX.unpack(self.file.read(INDEX.size))
+        self.chunks = np.frombuffer(self.file.read(chunks * CHUNK_DTYPE.itemsize), dtype=CHUNK_DTYPE)
+        self.events = np.frombuffer(self.file.read(events * EVENT_DTYPE.itemsize), dtype=EVENT_DTYPE)
+        return True
+
+    def _scan(self):
+        """ Rebuild the index from the records, for a recording that was not closed. """
+        chunks = []
+        events = []
+        self.file.seek(self.data_start)
+        while True:
+            offset = self.file.tell()
+            record = self.file.read(CHUNK.size)
+            if len(record) < 4:
+                break
+            if record[:4] == b'CHNK' and len(record) == CHUNK.size:
+                _, first, count, size, first_time = CHUNK.unpack(record)
+                if offset + CHUNK.size + size > os.path.getsize(self.file_name):
+                    break  # cut short
+                chunks.append((first, count, offset, size, first_time))
+                self.file.seek(offset + CHUNK.size + size)
+            elif record[:4] == b'EVNT':
+                self.file.seek(offset)
+                record = self.file.read(EVENT.size)
+                if len(record) < EVENT.size:
+                    break
+                events.append(EVENT.unpack(record)[1:])
+            else:
+                break
+        self.chunks = np.array(chunks, dtype=CHUNK_DTYPE)
+        self.events = np.array(events, dtype=EVENT_DTYPE)
+
+    def __len__(self):
+        """ Number of samples. """
+        if not len(self.chunks):
+            return 0
+        return int(self.chunks['first'][-1] + self.chunks['count'][-1])
+
+    @property
+    def sample_rate(self):
+        return self.header['sample_rate']
+
+    def read_chunk(self, number):
+        """ The (samples, columns) int32 counts of one chunk. """
+        chunk = self.chunks[number]
+        self.file.seek(int(chunk['offset']) + CHUNK.size)
+        return decode_chunk(self.file.read(int(chunk['size'])), int(chunk['count']), self.columns)
+
+    def read_counts(self, start=0, stop=None):
+        """
+        The int32 rows (id | channels | aux) of samples start to stop, reading only the chunks needed. Lost samples
+        have GAP_COUNT for their channels and aux.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        if stop <= start:
+            return np.zeros((0, self.columns), dtype='<i4')
+        first = max(0, int(np.searchsorted(self.chunks['first'], start, side='right')) - 1)
+        last = int(np.searchsorted(self.chunks['first'], stop, side='left'))
+        rows = np.concatenate([self.read_chunk(i) for i in range(first, last)])
+        skip = start - int(self.chunks['first'][first])
+        return rows[skip:skip + stop - start]
+
+    def read(self, start=0, stop=None, scaled=True):
+        """
+        Returns (ids, channel_data, aux_data) for samples start to stop, the values as float64 with NaN for the
+        lost samples. Scaled with the factors of the header if scaled is set and the header has them, as counts
+        otherwise.
+        """
+        rows = self.read_counts(start, stop)
+        channels = self.header['eeg_channels']
+        ids = rows[:, 0]
+        channel_data = from_counts(rows[:, 1:1 + channels], self.header.get('channel_scale') if scaled else None)
+        aux_data = from_counts(rows[:, 1 + channels:], self.header.get('aux_scale') if scaled else None)
+        return ids, channel_data, aux_data
+
+    def read_seconds(self, start, duration, scaled=True):
+        """ Like read, with the start and duration in seconds from the start of the recording. """
+        first = int(round(start * self.sample_rate))
+        return self.read(first, first + int(round(duration * self.sample_rate)), scaled)
+
+    def events_between(self, start=0, stop=None):
+        """ The events at samples start to stop. """
+        stop = len(self) if stop is None else stop
+        return self.events[(self.events['sample'] >= start) & (self.events['sample'] < stop)]
+
+    def close(self):
+        self.file.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Describe a recording, or export part of it")
+    parser.add_argument('recording', help="the recording file")
+    parser.add_argument('--start', type=float, default=0.0, help="start of the export, in seconds")
+    parser.add_argument('--duration', type=float, default=None, help="length of the export, in seconds")
+    parser.add_argument('-o', '--output', help="write ids, channel_data, aux_data and events to this .npz file")
+    args = parser.parse_args()
+
+    reader = RecordingReader(args.recording)
+    print(json.dumps(reader.header, indent=2))
+    print("%d samples (%.1f s) in %d chunks, %d events%s" % (len(reader), len(reader) / reader.sample_rate,
+                                                            len(reader.chunks), len(reader.events),
+                                                            ", index rebuilt" if reader.recovered else ""))
+    if args.output:
+        duration = args.duration if args.duration is not None else len(reader) / reader.sample_rate
+        ids, channel_data, aux_data = reader.read_seconds(args.start, duration)
+        np.savez(args.output, ids=ids, channel_data=channel_data, aux_data=aux_data, events=reader.events)
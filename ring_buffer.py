@@ -0,0 +1,160 @@
+#!/usr/bin/env python3.6
+"""
+Preallocated ring buffer for decoded samples, shared between the acquisition thread and the consumers.
+
+The acquisition thread is the only writer. It copies each decoded block into the arrays and then moves the
+write counter forward, so readers never see half written samples and no lock is needed around the data.
+Every consumer reads through its own RingCursor and can fall behind without holding up the writer or the
+other consumers. If a consumer falls more than a whole buffer behind, the oldest samples are lost for that
+consumer only, and counted in its overruns counter.
+
+EXAMPLE USE:
+
+    ring = RingBuffer(250 * 60, 8, 3)
+    cursor = ring.cursor()
+
+    # acquisition thread
+    ring.write(block)
+
+    # consumer thread
+    block = cursor.read(timeout=0.1)
+    ring.release(cursor)
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import threading
+
+import numpy as np
+
+import sample_block as sb
+
+
+class RingBuffer(object):
+    """
+    A fixed size store of the latest samples.
+
+    Args:
+      capacity: number of samples kept
+      n_channels: number of EEG channels per sample
+      n_aux: number of AUX channels per sample
+    """
+
+    def __init__(self, capacity, n_channels, n_aux):
+        self.capacity = int(capacity)
+        self.n_channels = n_channels
+        self.n_aux = n_aux
+
+        self.ids = np.zeros(self.capacity, dtype=np.int32)
+        self.channel_data = np.zeros((self.capacity, n_channels), dtype=np.float32)
+        self.aux_data = np.zeros((self.capacity, n_aux), dtype=np.float32)
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+
+        # Total number of samples written since the start. The slot of sample number k is k % capacity.
+        #
+        self.written = 0
+
+        # Only used to wake up waiting readers, never to protect the data.
+        #
+        self.new_data = threading.Condition()
+
+        self.cursors = []
+
+    def write(self, block):
+        """ Copy a SampleBlock into the buffer, overwriting the oldest samples. """
+        n = len(block)
+        if n == 0:
+            return
+
+        # A block larger than the buffer only leaves its last part.
+        #
+        skip = max(0, n - self.capacity)
+        slots = (self.written + skip + np.arange(n - skip)) % self.capacity
+
+        self.ids[slots] = block.ids[skip:]
+        self.channel_data[slots] = block.channel_data[skip:]
+        self.aux_data[slots] = block.aux_data[skip:]
+        self.timestamps[slots] = block.timestamps[skip:]
+
+        # Publish the samples only after they are in place.
+        #
+        self.written += n
+
+        with self.new_data:
+            self.new_data.notify_all()
+
+    def cursor(self):
+        """ Create a new reader, starting at the current write position. """
+        reader = RingCursor(self)
+        self.cursors.append(reader)
+        return reader
+
+    def release(self, reader):
+        """ Forget a reader that is done reading. """
+        if reader in self.cursors:
+            self.cursors.remove(reader)
+
+    def get_stats(self):
+        """ Return the number of samples written and the overruns of every reader. """
+        return {'written': self.written,
+                'capacity': self.capacity,
+                'overruns': [reader.overruns for reader in self.cursors]}
+
+
+class RingCursor(object):
+    """
+    A reading position in a RingBuffer. Each consumer has its own cursor.
+    """
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.position = ring.written
+
+        # Number of samples this reader lost because the writer had already overwritten them.
+        #
+        self.overruns = 0
+
+    def available(self):
+        """ Number of samples written but not yet read by this reader. """
+        return self.ring.written - self.position
+
+    def read(self, max_samples=None, timeout=None):
+        """
+        Return the unread samples as a SampleBlock (a copy), at most max_samples of them. If nothing is
+        available, wait up to timeout seconds for the writer. The block is empty if nothing arrived.
+        """
+        ring = self.ring
+
+        if timeout and self.available() == 0:
+            with ring.new_data:
+                ring.new_data.wait_for(lambda: self.available() > 0, timeout)
+
+        written = ring.written
+        self._skip_overwritten(written)
+
+        n = written - self.position
+        if max_samples is not None:
+            n = min(n, max_samples)
+
+        slots = (self.position + np.arange(n)) % ring.capacity
+        block = sb.SampleBlock(ring.ids[slots], ring.channel_data[slots],
+                               ring.aux_data[slots], ring.timestamps[slots])
+
+        # The writer may have wrapped around while we copied. Drop what could have been overwritten.
+        #
+        lost = ring.written - ring.capacity - self.position
+        if lost > 0:
+            lost = min(lost, n)
+            self.overruns += lost
+            block = block.slice(lost, n)
+
+        self.position += n
+        return block
+
+    def _skip_overwritten(self, written):
+        oldest = written - self.ring.capacity
+        if self.position < oldest:
+            self.overruns += oldest - self.position
+            self.position = oldest
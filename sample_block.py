@@ -0,0 +1,213 @@
+#!/usr/bin/env python3.6
+"""
+Blocks of samples from the board, used when streaming in block mode (cfg.block_mode).
+
+Instead of calling every plugin once per sample, the board collects the decoded samples into a SampleBlock
+and hands the whole block to the plugins. Plugins that implement process_block (see plugin_interface.py) get
+the arrays directly, the others are called once per sample as before.
+
+EXAMPLE USE:
+
+    def handle_block(block):
+        print(block.channel_data.mean(axis=0))
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import numpy as np
+
+
+class SampleBlock(object):
+    """
+    A number of consecutive samples from the board, stored as arrays.
+
+    Single samples are taken out of a block as SampleView objects, which only point at a row of the arrays.
+    Blocks own their arrays, so the views stay valid for as long as they are kept.
+
+    Args:
+      ids: packet ids, shape (n_samples,)
+      channel_data: EEG values, shape (n_samples, n_channels), float32
+      aux_data: AUX values, shape (n_samples, n_aux), float32
+      timestamps: host time (in seconds, time.monotonic() clock) of each sample, shape (n_samples,),
+          see sample_clock.py
+      imp_data: impedance values, shape (n_samples, n_imp), int32. None if the board has none.
+    """
+
+    def __init__(self, ids, channel_data, aux_data, timestamps, imp_data=None):
+        self.ids = np.asarray(ids, dtype=np.int32)
+        self.channel_data = np.asarray(channel_data, dtype=np.float32)
+        self.aux_data = np.asarray(aux_data, dtype=np.float32)
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.imp_data = None if imp_data is None else np.asarray(imp_data, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self.ids)
+        if not 0 <= row < len(self.ids):
+            raise IndexError('sample %d out of a block of %d' % (row, len(self.ids)))
+        return SampleView(self, row)
+
+    def __iter__(self):
+        """
+        Iterate over the samples one by one, for plugins that only handle single samples.
+        """
+        for row in range(len(self.ids)):
+            yield SampleView(self, row)
+
+    @property
+    def nbytes(self):
+        """ Memory used by the arrays of the block. """
+        arrays = (self.ids, self.channel_data, self.aux_data, self.timestamps, self.imp_data)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def slice(self, start, stop):
+        """ Return the samples from start up to (not including) stop as a new block. """
+        return SampleBlock(self.ids[start:stop], self.channel_data[start:stop],
+                           self.aux_data[start:stop], self.timestamps[start:stop],
+                           None if self.imp_data is None else self.imp_data[start:stop])
+
+    @staticmethod
+    def concatenate(blocks):
+        """ Join a list of blocks into one block. """
+        has_imp = all(b.imp_data is not None for b in blocks)
+        return SampleBlock(np.concatenate([b.ids for b in blocks]),
+                           np.concatenate([b.channel_data for b in blocks]),
+                           np.concatenate([b.aux_data for b in blocks]),
+                           np.concatenate([b.timestamps for b in blocks]),
+                           np.concatenate([b.imp_data for b in blocks]) if has_imp else None)
+
+
+class SampleView(object):
+    """
+    A single sample: a row of a SampleBlock. Compatible with OpenBCISample.
+
+    channel_data, aux_data and imp_data are given as lists, made on first access and kept with the view, so
+    plugins written for OpenBCISample keep working and every plugin after the first gets the same list, as with
+    OpenBCISample. Changes to these lists are not written back to the block. channels and aux give the row of
+    the arrays itself, without a copy.
+    """
+
+    # The list slots are only set on first access, so views that are never asked for them cost nothing more
+    #
+    __slots__ = ('block', 'row', '_channel_data', '_aux_data', '_imp_data')
+
+    def __init__(self, block, row):
+        self.block = block
+        self.row = row
+
+    @property
+    def id(self):
+        return int(self.block.ids[self.row])
+
+    @property
+    def channels(self):
+        return self.block.channel_data[self.row]
+
+    @property
+    def aux(self):
+        return self.block.aux_data[self.row]
+
+    @property
+    def channel_data(self):
+        try:
+            return self._channel_data
+        except AttributeError:
+            self._channel_data = self.block.channel_data[self.row].tolist()
+            return self._channel_data
+
+    @property
+    def aux_data(self):
+        try:
+            return self._aux_data
+        except AttributeError:
+            self._aux_data = self.block.aux_data[self.row].tolist()
+            return self._aux_data
+
+    @property
+    def imp_data(self):
+        try:
+            return self._imp_data
+        except AttributeError:
+            imp_data = self.block.imp_data
+            self._imp_data = [] if imp_data is None else imp_data[self.row].tolist()
+            return self._imp_data
+
+    @property
+    def timestamp(self):
+        return float(self.block.timestamps[self.row])
+
+    @timestamp.setter
+    def timestamp(self, value):
+        self.block.timestamps[self.row] = value
+
+
+class BlockBuilder(object):
+    """
+    Collects decoded samples and cuts them into blocks.
+
+    A block is released when block_size samples have been collected, or when the oldest collected sample
+    has waited longer than latency seconds, whichever comes first.
+    """
+
+    def __init__(self, block_size=32, latency=0.1):
+        self.block_size = block_size
+        self.latency = latency
+        self.pending = []
+        self.count = 0
+        self.first_time = None
+
+    def add(self, block):
+        """ Add the samples in a SampleBlock. """
+        if len(block) == 0:
+            return
+        if self.first_time is None:
+            self.first_time = block.timestamps[0]
+        self.pending.append(block)
+        self.count += len(block)
+
+    def pop_blocks(self, now):
+        """ Return the list of blocks that are ready at time now. """
+        if self.count == 0:
+            return []
+        if self.count < self.block_size and now - self.first_time < self.latency:
+            return []
+
+        whole = SampleBlock.concatenate(self.pending)
+        self.pending = []
+        self.count = 0
+        self.first_time = None
+
+        # Full blocks are sent on. What remains waits for more samples, unless the latency budget is spent.
+        #
+        blocks = []
+        start = 0
+        while len(whole) - start >= self.block_size:
+            blocks.append(whole.slice(start, start + self.block_size))
+            start += self.block_size
+
+        if start < len(whole):
+            rest = whole.slice(start, len(whole))
+            if now - rest.timestamps[0] >= self.latency:
+                blocks.append(rest)
+            else:
+                self.pending = [rest]
+                self.count = len(rest)
+                self.first_time = rest.timestamps[0]
+
+        return blocks
+
+    def flush(self):
+        """ Return everything collected, in full blocks and a last smaller one, e.g. when streaming stops. """
+        if self.count == 0:
+            return []
+        whole = SampleBlock.concatenate(self.pending)
+        self.pending = []
+        self.count = 0
+        self.first_time = None
+        return [whole.slice(start, min(start + self.block_size, len(whole)))
+                for start in range(0, len(whole), self.block_size)]
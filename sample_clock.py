@@ -0,0 +1,163 @@
+#!/usr/bin/env python3.6
+"""
+Timestamps for the samples, from the host clock and the packet counter of the board.
+
+The host time at which a read from the board returns is late by a varying amount (serial or BLE buffering,
+thread scheduling), and all samples of one read arrive together. The board on the other hand samples at a
+steady rate, which is known through the packet counter. The clock fits a line through (sample index, host
+time) for the last sample of every read, forgetting old reads over a window of some seconds so that slow
+drift between the two clocks is followed. Every sample gets its time from that line, which removes the
+jitter of the reads.
+
+The host times are taken with time.monotonic_ns(), the timestamps are in seconds on the same clock
+(time.monotonic()).
+
+EXAMPLE USE:
+
+    clock = SampleClock(250, id_modulo=256)
+    timestamps = clock.update(ids, time.monotonic_ns())
+    print(clock.get_stats())
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import math
+
+import numpy as np
+
+
+class SampleClock(object):
+    """
+    Online linear model of host time against sample index.
+
+    Args:
+      sample_rate: nominal number of counter steps per second (packets per second on Cyton)
+      id_modulo: the packet counter wraps around to 0 after id_modulo - 1
+      window: time constant, in seconds, with which old reads are forgotten
+    """
+
+    def __init__(self, sample_rate, id_modulo=256, window=30.0):
+        self.sample_rate = float(sample_rate)
+        self.id_modulo = id_modulo
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        """ Forget everything, e.g. when streaming is restarted. """
+        self.last_id = None
+        self.index = 0
+
+        # Host time (s) and index of the first read. Everything else is relative to them.
+        #
+        self.origin_time = None
+        self.origin_index = 0
+
+        # Weighted means and co-moments of the fit points (index, time)
+        #
+        self.weight = 0.0
+        self.mean_index = 0.0
+        self.mean_time = 0.0
+        self.c_ii = 0.0
+        self.c_it = 0.0
+        self.last_time = 0.0
+
+        self.offset = 0.0
+        self.period = 1.0 / self.sample_rate
+
+        # Statistics
+        #
+        self.reads = 0
+        self.jitter_var = 0.0
+        self.max_residual = 0.0
+
+    def resume(self, steps):
+        """
+        The packet counter starts over (e.g. after a reconnect): the next id is taken to be steps counter steps
+        after the last one, whatever its value.
+        """
+        self.last_id = None
+        self.index += steps
+
+    def unwrap(self, ids):
+        """ Turn packet ids into a sample index that keeps growing when the counter wraps around. """
+        ids = np.asarray(ids, dtype=np.int64)
+        previous = np.empty(len(ids), dtype=np.int64)
+        previous[1:] = ids[:-1]
+        previous[0] = ids[0] if self.last_id is None else self.last_id
+
+        steps = (ids - previous) % self.id_modulo
+        index = self.index + np.cumsum(steps)
+
+        self.last_id = int(ids[-1])
+        self.index = int(index[-1])
+        return index
+
+    def update(self, ids, host_ns):
+        """
+        Add a read: the packet ids of the samples it returned and the host time (time.monotonic_ns()) at which
+        it returned. Returns the timestamps of the samples in seconds.
+        """
+        if len(ids) == 0:
+            return np.zeros(0)
+
+        index = self.unwrap(ids)
+        host_time = host_ns / 1e9
+
+        if self.origin_time is None:
+            self.origin_time = host_time
+            self.origin_index = int(index[-1])
+
+        i = index[-1] - self.origin_index
+        t = host_time - self.origin_time
+
+        # How far the read is from the model so far, before adding it
+        #
+        if self.reads > 0:
+            residual = t - (self.offset + self.period * i)
+            alpha = 0.01 if self.reads > 100 else 1.0 / self.reads
+            self.jitter_var += alpha * (residual * residual - self.jitter_var)
+            self.max_residual = max(self.max_residual, abs(residual))
+
+        self._add_point(i, t)
+        self.reads += 1
+
+        return self.origin_time + self.offset + self.period * (index - self.origin_index)
+
+    def _add_point(self, i, t):
+        # Older points lose weight with the time passed since the last one.
+        #
+        decay = math.exp(-(t - self.last_time) / self.window) if self.weight else 0.0
+        self.last_time = t
+
+        self.weight = self.weight * decay + 1.0
+        self.c_ii *= decay
+        self.c_it *= decay
+
+        di = i - self.mean_index
+        self.mean_index += di / self.weight
+        dt = t - self.mean_time
+        self.mean_time += dt / self.weight
+        self.c_ii += di * (i - self.mean_index)
+        self.c_it += di * (t - self.mean_time)
+
+        # Until the points span a second of samples, the nominal rate is safer than the fitted one.
+        #
+        if self.c_ii > 0 and self.c_ii / self.weight > (self.sample_rate / 2) ** 2 / 3:
+            self.period = self.c_it / self.c_ii
+        else:
+            self.period = 1.0 / self.sample_rate
+        self.offset = self.mean_time - self.period * self.mean_index
+
+    def get_stats(self):
+        """
+        Returns the estimated sample rate of the board, its drift against the host clock in parts per million
+        (positive when the board is slower than its nominal rate), and the jitter of the reads around the
+        model in milliseconds (standard deviation and maximum).
+        """
+        return {'reads': self.reads,
+                'rate': float(1.0 / self.period),
+                'drift_ppm': float((self.period * self.sample_rate - 1.0) * 1e6),
+                'jitter_ms': float(math.sqrt(self.jitter_var) * 1000.0),
+                'max_jitter_ms': float(self.max_residual * 1000.0)}
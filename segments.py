@@ -0,0 +1,243 @@
+#!/usr/bin/env python3.6
+"""
+Segment rotation for the recorder plugins, so a session of any length is written as a series of files.
+
+A recorder hands its samples to a Segments object instead of to its writer. When the current segment has lasted
+max_seconds, or its file has grown past max_bytes, the next segment is opened with the next sample and the writer
+of the current one is closed. Segments end on a multiple of boundary samples (a BDF record, a packet), so no file
+ends with a partial record. The old writer is closed on a separate thread, the streaming thread only waits for the
+new file to be opened.
+
+Every segment knows its place in the session (the segment dict passed to the plugin when it is opened): its
+index, the sample of the session it starts with, its start in seconds from the start of the session and the file
+before it. The plugins store this in their files where the format allows. The session manifest,
+<file name>.manifest.json, lists the segments with their samples, sizes, the files before and after them, and the
+stats of their writers. It is rewritten whenever a segment is opened or closed.
+
+Without max_seconds and max_bytes there is a single segment with the plain file name and no manifest.
+
+    collect_000.csv, collect_001.csv, ..., collect.manifest.json
+
+EXAMPLE USE:
+
+    segments = Segments('session.obcr', open_segment, close_segment, sample_rate=250, max_seconds=3600)
+    segments.start()
+    segments.write(counts, timestamps)  # calls write_segment(writer, counts, timestamps), rotating as needed
+    segments.close()
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import json
+import math
+import os
+import threading
+import time
+
+
+def segment_name(file_name, index):
+    """ The file of segment index of a session, 'name_003.ext'. None for the plain file name. """
+    if index is None:
+        return file_name
+    root, extension = os.path.splitext(file_name)
+    return '%s_%03d%s' % (root, index, extension)
+
+
+def manifest_name(file_name):
+    return os.path.splitext(file_name)[0] + '.manifest.json'
+
+
+def read_manifest(file_name):
+    """ The manifest of the session written under file_name (the plain file name, or the manifest itself). """
+    if not file_name.endswith('.manifest.json'):
+        file_name = manifest_name(file_name)
+    with open(file_name) as f:
+        return json.load(f)
+
+
+class Segments(object):
+    """
+    Args:
+      file_name: the file name of the session, the segments get a number before the extension
+      open_segment: function(file_name, segment) returning the writer of a new segment
+      close_segment: function(writer, segment) closing it, may return a dict of stats for the manifest. It runs on
+        a separate thread, except for the last segment.
+      write_segment: function(writer, *parts) used by write
+      sample_rate: samples per second of the session
+      max_seconds: longest segment in seconds, None for no limit
+      max_bytes: size of the file of a segment after which it is closed (at the next boundary), None for no limit
+      boundary: segments end on a multiple of this many samples
+    """
+
+    def __init__(self, file_name, open_segment, close_segment, write_segment=None, sample_rate=250,
+                 max_seconds=None, max_bytes=None, boundary=1):
+        self.file_name = file_name
+        self.open_segment = open_segment
+        self.close_segment = close_segment
+        self.write_segment = write_segment
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.boundary = max(1, int(boundary))
+        self.max_samples = None
+        if max_seconds:
+            self.max_samples = max(1, math.ceil(max_seconds * sample_rate / self.boundary)) * self.boundary
+        self.rotating = bool(max_seconds or max_bytes)
+
+        self._writer = None
+        self.segment = None
+        self.due = False
+        self.samples = 0
+        self.segment_samples = 0
+        self.size_due = False
+        self.checked = 0
+        self.closer = None
+        self.errors = 0
+
+        self.lock = threading.Lock()
+        self.manifest = {'session': os.path.basename(file_name),
+                         'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                         'sample_rate': sample_rate,
+                         'max_seconds': max_seconds,
+                         'max_bytes': max_bytes,
+                         'boundary': self.boundary,
+                         'samples': 0,
+                         'segments': [],
+                         'complete': False}
+
+    def start(self):
+        """ Open the first segment. Returns its writer. """
+        self._open(0)
+        return self._writer
+
+    @property
+    def writer(self):
+        """ The writer of the current segment. When the segment has ended, the next one is opened first. """
+        if self.due:
+            self.rotate()
+        return self._writer
+
+    def _open(self, index):
+        previous = self.segment
+        file_name = segment_name(self.file_name, index if self.rotating else None)
+        self.segment = {'index': index,
+                        'file': os.path.basename(file_name),
+                        'session': self.manifest['session'],
+                        'first_sample': self.samples,
+                        'start': self.samples / self.sample_rate,
+                        'previous': previous['file'] if previous else None,
+                        'opened': time.strftime('%Y-%m-%d %H:%M:%S')}
+        self.segment_samples = 0
+        self.size_due = False
+        self.checked = 0
+        self.due = False
+        self._writer = self.open_segment(file_name, dict(self.segment))
+        with self.lock:
+            self.manifest['segments'].append(dict(self.segment, samples=None, next=None))
+        self._write_manifest()
+
+    def room(self):
+        """ Samples that still go into the current segment before it ends. """
+        if self.size_due:
+            return self.boundary - self.segment_samples % self.boundary
+        if self.max_samples:
+            return self.max_samples - self.segment_samples
+        return math.inf
+
+    def write(self, *parts):
+        """
+        Hand samples to write_segment, in pieces that end where the segments end: the arrays in parts all have a
+        row per sample and are cut alike.
+        """
+        count = len(parts[0])
+        done = 0
+        while done < count:
+            if self.due:
+                self.rotate()
+            n = int(min(count - done, self.room()))
+            if done == 0 and n == count:
+                self.write_segment(self._writer, *parts)
+            else:
+                self.write_segment(self._writer, *[part[done:done + n] for part in parts])
+            done += n
+            self.advance(n)
+
+    def advance(self, samples):
+        """ Count samples given to the writer directly, and roll to the next segment when the current one ends. """
+        self.samples += samples
+        self.segment_samples += samples
+        if not self.rotating:
+            return
+        if self.max_bytes and not self.size_due and self.segment_samples - self.checked >= self.sample_rate:
+            self.checked = self.segment_samples
+            try:
+                self.size_due = os.path.getsize(segment_name(self.file_name, self.segment['index'])) >= self.max_bytes
+            except OSError:
+                pass
+        if (self.max_samples and self.segment_samples >= self.max_samples) or \
+                (self.size_due and self.segment_samples % self.boundary == 0):
+            self.due = True
+
+    def rotate(self):
+        """ Open the next segment and close the current one on the closing thread. """
+        writer, segment, samples = self._writer, self.segment, self.segment_samples
+        self._open(segment['index'] + 1)
+        if self.closer is not None:
+            self.closer.join()
+        self.closer = threading.Thread(target=self._close, args=(writer, segment, samples, self.segment['file']),
+                                       name="closing " + segment['file'])
+        self.closer.start()
+
+    def _close(self, writer, segment, samples, next_file):
+        try:
+            stats = self.close_segment(writer, segment)
+        except (OSError, ValueError) as e:
+            self.errors += 1
+            stats = {'error': str(e)}
+            print("Segment %s: %s" % (segment['file'], e))
+        try:
+            size = os.path.getsize(os.path.join(os.path.dirname(self.file_name), segment['file']))
+        except OSError:
+            size = None
+        with self.lock:
+            entry = self.manifest['segments'][segment['index']]
+            entry.update({'samples': samples,
+                          'seconds': samples / self.sample_rate,
+                          'bytes': size,
+                          'next': next_file,
+                          'closed': time.strftime('%Y-%m-%d %H:%M:%S'),
+                          'stats': stats})
+            self.manifest['samples'] = sum(s['samples'] or 0 for s in self.manifest['segments'])
+        self._write_manifest()
+
+    def _write_manifest(self):
+        """
+        Replace the manifest with the current one. The streaming and the closing thread both write it, the lock is
+        held until the file is in place so they do not share the temporary file and the last version wins.
+        """
+        if not self.rotating:
+            return
+        file_name = manifest_name(self.file_name)
+        with self.lock:
+            with open(file_name + '.tmp', 'w') as f:
+                json.dump(self.manifest, f, indent=2)
+            os.replace(file_name + '.tmp', file_name)
+
+    def close(self):
+        """ Close the last segment and mark the manifest complete. """
+        if self._writer is None:
+            return
+        if self.closer is not None:
+            self.closer.join()
+            self.closer = None
+        self._close(self._writer, self.segment, self.segment_samples, None)
+        self._writer = None
+        with self.lock:
+            self.manifest['complete'] = True
+        self._write_manifest()
+
+    def get_stats(self):
+        return {'segments': len(self.manifest['segments']),
+                'samples': self.samples,
+                'errors': self.errors}
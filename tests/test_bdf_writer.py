@@ -0,0 +1,87 @@
+import numpy as np
+
+import bdf_writer as bdf
+import recording as rec
+
+RATE = 250
+
+
+def make_counts(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.hstack([rng.integers(bdf.DIGITAL_MIN, bdf.DIGITAL_MAX, (n, 8)),
+                      rng.integers(bdf.AUX_DIGITAL_MIN, bdf.AUX_DIGITAL_MAX, (n, 3))]).astype(np.int32)
+
+
+def write(file_name, counts, pieces=7, **events):
+    writer = bdf.BdfWriter(file_name, rec.board_header(RATE, 8, 3), record_seconds=1, checkpoint_seconds=2)
+    for sample, text in events.items():
+        writer.add_event(0, text, int(sample[1:]))
+    for piece in np.array_split(counts, pieces):
+        writer.write(piece)
+    writer.close()
+    return writer.get_stats()
+
+
+def test_round_trip(tmp_path):
+    file_name = str(tmp_path / 'session.bdf')
+    counts = make_counts()
+    stats = write(file_name, counts, s700='image 3')
+    header, data, annotations = bdf.read_bdf(file_name)
+    assert stats['clipped'] == 0 and stats['gaps'] == 0
+    assert header['records'] == header['records_read'] == 8
+    assert np.array_equal(data[:len(counts)], counts)
+    assert (data[len(counts):] == counts[-1]).all()
+    assert (700 / RATE, 'image 3') in annotations
+
+
+def test_gaps_hold_the_last_sample(tmp_path):
+    file_name = str(tmp_path / 'gaps.bdf')
+    counts = make_counts()
+    with_gaps = counts.copy()
+    with_gaps[500:530] = rec.GAP_COUNT   # within one write
+    with_gaps[840:900] = rec.GAP_COUNT   # across writes (pieces of 286 samples)
+    with_gaps[:3] = rec.GAP_COUNT        # before any sample
+    stats = write(file_name, with_gaps)
+    header, data, annotations = bdf.read_bdf(file_name)
+
+    assert stats['clipped'] == 0
+    assert stats['gaps'] == 3 and stats['gap_samples'] == 93
+    assert (data[:3] == 0).all()
+    assert (data[500:530] == counts[499]).all()
+    assert (data[840:900] == counts[839]).all()
+    keep = np.ones(len(counts), dtype=bool)
+    keep[:3] = keep[500:530] = keep[840:900] = False
+    assert np.array_equal(data[:len(counts)][keep], counts[keep])
+    assert sorted(onset for onset, text in annotations if text == 'gap') == [0, 500 / RATE, 840 / RATE]
+
+
+def test_gap_durations(tmp_path):
+    file_name = str(tmp_path / 'duration.bdf')
+    counts = make_counts(600)
+    counts[100:150] = rec.GAP_COUNT
+    counts[575:] = rec.GAP_COUNT         # still going on when the file is closed
+    write(file_name, counts, pieces=3)
+    with open(file_name, 'rb') as f:
+        text = f.read()
+    assert b'+0.4\x150.2\x14gap\x14' in text
+    assert b'+2.3\x150.1\x14gap\x14' in text
+
+
+def test_convert_recording_with_gaps(tmp_path):
+    recording_name = str(tmp_path / 'session.obcr')
+    file_name = str(tmp_path / 'session.bdf')
+    counts = make_counts(1500)
+    header = rec.board_header(RATE, 8, 3)
+    channel_data = counts[:, :8].astype(np.float64)
+    channel_data[600:640] = np.nan
+    stage = rec.CountStage(header, 100)
+    writer = rec.RecordingWriter(recording_name, header, 12, 500)
+    writer.write(stage.counts(np.arange(1500) % 256, channel_data, counts[:, 8:]), np.arange(1500) / RATE)
+    writer.close()
+
+    stats = bdf.convert_recording(recording_name, file_name)
+    _, data, annotations = bdf.read_bdf(file_name)
+    assert stats['clipped'] == 0 and stats['gaps'] == 1
+    assert (data[600:640, :8] == counts[599, :8]).all()
+    assert np.array_equal(data[:600], counts[:600])
+    assert (600 / RATE, 'gap') in annotations
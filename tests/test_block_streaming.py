@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+import pytest
+
+import config as cfg
+import open_bci_v4 as v4
+import sample_block as sb
+
+
+START = time.monotonic()
+
+
+def make_block(first, n):
+    """ Samples first..first + n, timestamped as if they had just arrived. """
+    index = np.arange(first, first + n)
+    return sb.SampleBlock(index % 256, np.zeros((n, 8)), np.zeros((n, 3)), START + index / 250.0)
+
+
+class BlockPlugin(object):
+
+    def __init__(self):
+        self.samples = []
+
+    def process_block(self, block):
+        self.samples.extend((block.timestamps - START) * 250)
+
+
+@pytest.mark.parametrize('block_size', [32, 1000])
+def test_stopping_mid_block_delivers_every_sample(monkeypatch, block_size):
+    monkeypatch.setattr(cfg, 'block_size', block_size)
+    monkeypatch.setattr(cfg, 'block_latency', 60.0)
+    monkeypatch.setattr(cfg, 'logging', False)
+    board = object.__new__(v4.OpenBCIBoard)
+    board.streaming = True
+    reads = [make_block(7 * i, 7) for i in range(71)]
+
+    def read_block():
+        block = reads.pop(0)
+        if not reads:
+            board.streaming = False
+        return block
+
+    block_plugin = BlockPlugin()
+    samples = []
+    board._stream_blocks([block_plugin, lambda sample: samples.append(sample.id)], -1, 0.0, read_block)
+    assert [round(t) for t in block_plugin.samples] == list(range(497))
+    assert samples == [i % 256 for i in range(497)]
+
+
+def test_builder_flush():
+    builder = sb.BlockBuilder(32, 60.0)
+    builder.add(make_block(0, 70))
+    assert [len(block) for block in builder.pop_blocks(START)] == [32, 32]
+    builder.add(make_block(70, 3))
+    assert [len(block) for block in builder.flush()] == [9]
+    assert builder.flush() == [] and builder.count == 0
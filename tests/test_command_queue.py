@@ -0,0 +1,82 @@
+import threading
+import time
+
+import command_queue as cq
+import packet_decoder as pdec
+
+
+class FakeSerial(object):
+    """ A port with waiting frames that only records what is written. """
+
+    def __init__(self, waiting_frames=0):
+        self.waiting = waiting_frames * pdec.FRAME_SIZE
+        self.writes = []
+
+    def inWaiting(self):
+        return self.waiting
+
+    def write(self, b):
+        self.writes.append(b)
+
+
+class ReadLoop(threading.Thread):
+    """ The reading thread of the board: write the queued commands, then read frames_per_read frames. """
+
+    def __init__(self, commands, ser, frames_per_read=10):
+        super().__init__(daemon=True)
+        self.commands = commands
+        self.ser = ser
+        self.frames_per_read = frames_per_read
+        self.frames_read = 0
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.commands.flush(self.ser, self.frames_read)
+            time.sleep(0.002)
+            self.frames_read += self.frames_per_read
+
+
+def test_commands_with_a_key_replace_each_other():
+    commands = cq.CommandQueue()
+    off = commands.put('1', ('channel', 1))
+    test_signal = commands.put(b'-')
+    on = commands.put(b'!', ('channel', 1))
+    assert off.wait(0) and off.superseded and off.frame is None
+    assert len(commands) == 2
+
+    ser = FakeSerial(waiting_frames=3)
+    assert commands.flush(ser, 100) == [test_signal, on]
+    assert ser.writes == [b'-!']
+    assert on.frame == test_signal.frame == 103
+    assert not on.superseded and on.written_at >= on.queued_at
+    assert commands.flush(ser, 110) == [] and len(ser.writes) == 1
+    assert commands.get_stats() == {'queued': 3, 'written': 2, 'superseded': 1, 'writes': 1, 'pending': 0}
+    assert list(commands.history) == [test_signal, on]
+
+
+def test_tickets_from_the_read_loop():
+    commands = cq.CommandQueue()
+    ser = FakeSerial()
+    loop = ReadLoop(commands, ser)
+    loop.start()
+    try:
+        tickets = []
+        for i in range(20):
+            before = loop.frames_read
+            ticket = commands.put(b'x%dX' % i, ('channel', i % 4))
+            assert ticket.wait(2.0)
+            tickets.append(ticket)
+            assert before <= ticket.frame <= loop.frames_read
+            assert ticket.frame % loop.frames_per_read == 0
+    finally:
+        loop.running = False
+        loop.join()
+    assert [t.frame for t in tickets] == sorted(t.frame for t in tickets)
+    assert b''.join(ser.writes) == b''.join(b'x%dX' % i for i in range(20))
+
+
+def test_wait_times_out_without_a_read_loop():
+    ticket = cq.CommandQueue().put(b'b')
+    assert not ticket.wait(0.01)
+    assert ticket.frame is None
@@ -0,0 +1,94 @@
+import time
+
+import connection_watchdog as wd
+import daisy_pairing as dp
+import open_bci_v3 as v3
+import packet_decoder as pdec
+import packet_log as pl
+
+
+class FakeSerial(object):
+    """ A port that returns the bytes given to it, then nothing (a stalled stream), and records what is written. """
+
+    def __init__(self, data=b''):
+        self.data = data
+        self.written = []
+        self.open = True
+
+    def read(self, n=1):
+        bb, self.data = self.data[:n], self.data[n:]
+        return bb
+
+    def inWaiting(self):
+        return len(self.data)
+
+    def write(self, b):
+        self.written.append(b)
+
+    def isOpen(self):
+        return self.open
+
+    def reset_input_buffer(self):
+        self.data = b''
+
+
+def frame(packet_id):
+    return bytes([v3.START_BYTE, packet_id]) + bytes(30) + bytes([v3.END_BYTE])
+
+
+def make_board(data=b''):
+    board = object.__new__(v3.OpenBCIBoard)
+    board.ser = FakeSerial(data)
+    board.log = False
+    board.streaming = True
+    board.daisy = False
+    board.packets_dropped = 0
+    board.bytes_received = 0
+    board.frames_decoded = 0
+    board.last_frame_time = time.monotonic()
+    board.decoder = pdec.CytonDecoder()
+    board.decoder_reset_pending = False
+    board.layout = pdec.FrameLayout(False)
+    board.daisy_pairer = dp.DaisyPairer(256)
+    board.packet_log = pl.PacketLog()
+    board.watchdog = wd.Watchdog(board, stall_timeout=0.0, backoff=60.0)
+    return board
+
+
+def test_stalled_stream_returns_instead_of_exiting():
+    board = make_board(frame(1) + frame(2)[:10])
+    assert board._read_serial_binary().id == 1
+    assert board._read_serial_binary() is None
+    assert board.frames_decoded == 1 and board.bytes_received == 33 + 1
+    ids, _, _ = board._read_serial_frames()
+    assert len(ids) == 0
+
+
+def test_watchdog_reconnects_with_backoff(monkeypatch):
+    monkeypatch.setattr(v3.time, 'sleep', lambda seconds: None)
+    board = make_board()
+    board.last_frame_time -= 1
+    board.watchdog.check()
+    assert board.watchdog.reconnects == 1
+    assert board.ser.written == [b's', b'v', b'b']
+    assert board.streaming
+
+    # Still stalled: the next attempt waits for the backoff
+    board.last_frame_time -= 1
+    board.watchdog.check()
+    assert board.watchdog.reconnects == 1
+
+
+def test_reconnect_leaves_the_decoder_to_the_reading_thread(monkeypatch):
+    monkeypatch.setattr(v3.time, 'sleep', lambda seconds: None)
+    board = make_board(frame(1)[:20])
+    ids, _, _ = board._read_serial_frames()
+    assert len(ids) == 0 and len(board.decoder.pending) == 20
+
+    # The half frame from before the reconnect is only dropped by the next read
+    board.reconnect()
+    assert len(board.decoder.pending) == 20
+    board.ser.data = frame(7) + frame(8)
+    ids, _, _ = board._read_serial_frames()
+    assert list(ids) == [7, 8]
+    assert board.decoder.skipped_bytes == 0 and not board.decoder_reset_pending
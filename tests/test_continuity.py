@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+import continuity as ct
+import open_bci_v4 as v4
+import sample_clock as sc
+
+RATE = 250.0
+
+
+def test_gap_is_filled_with_nan_placeholders():
+    tracker = ct.ContinuityTracker(256, policy='nan')
+    ids = np.array([250, 251, 254, 255, 0, 3])
+    channels = np.arange(12, dtype=np.float64).reshape(6, 2)
+    out_ids, out_channels, out_aux, counts = tracker.fill(ids, channels, np.zeros((6, 1)))
+
+    assert out_ids.tolist() == [250, 251, 252, 253, 254, 255, 0, 1, 2, 3]
+    assert np.isnan(out_channels[[2, 3, 7, 8]]).all()
+    assert np.array_equal(out_channels[[0, 1, 4, 5, 6, 9]], channels)
+    assert counts.tolist() == [1, 1, 3, 1, 1, 3]
+    assert tracker.lost == 4 and tracker.gaps == 2
+
+
+def test_gap_across_blocks_is_interpolated():
+    tracker = ct.ContinuityTracker(256, policy='interpolate')
+    tracker.fill(np.array([10]), np.array([[0.0]]), np.array([[0.0]]))
+    out_ids, out_channels, _, _ = tracker.fill(np.array([14]), np.array([[4.0]]), np.array([[0.0]]))
+    assert out_ids.tolist() == [11, 12, 13, 14]
+    assert out_channels[:, 0].tolist() == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_daisy_step_and_repeated_ids():
+    tracker = ct.ContinuityTracker(256, step=2, policy='none')
+    assert tracker.missing(np.array([0, 2, 2, 8])).tolist() == [0, 0, 0, 2]
+
+
+def test_resume_fills_before_the_next_sample():
+    tracker = ct.ContinuityTracker(256, policy='nan')
+    tracker.fill(np.array([99]), np.zeros((1, 1)), np.zeros((1, 1)))
+    tracker.resume(5)
+    out_ids, out_channels, _, _ = tracker.fill(np.array([0, 1]), np.ones((2, 1)), np.zeros((2, 1)))
+    assert len(out_ids) == 7
+    assert np.isnan(out_channels[:5]).all() and tracker.lost == 5
+
+
+def test_clock_unwraps_the_counter():
+    clock = sc.SampleClock(RATE, 256)
+    assert clock.unwrap(np.array([254, 255, 0, 1])).tolist() == [0, 1, 2, 3]
+    clock.resume(10)
+    assert clock.unwrap(np.array([0])).tolist() == [13]
+
+
+def test_clock_follows_a_steady_stream():
+    clock = sc.SampleClock(RATE, 256)
+    t0 = 1000.0
+    for k in range(100):
+        ids = np.arange(10 * k, 10 * k + 10) % 256
+        timestamps = clock.update(ids, int((t0 + (10 * k + 9) / RATE) * 1e9))
+    assert timestamps[-1] == pytest.approx(t0 + 999 / RATE, abs=1e-6)
+    assert clock.get_stats()['rate'] == pytest.approx(RATE, rel=1e-6)
+
+
+def reconnecting_board(policy):
+    """ The counters of a Cyton board, without the port. """
+    board = object.__new__(v4.OpenBCIBoard)
+    board.continuity = ct.ContinuityTracker(256, 1, policy)
+    board.clock = sc.SampleClock(v4.SAMPLE_RATE, 256)
+    board.resume_pending = False
+    return board
+
+
+@pytest.mark.parametrize('policy', ['nan', 'interpolate', 'none'])
+def test_reconnect_keeps_the_timestamps(policy):
+    """ 50 samples are lost while reconnecting, the board counter starts over at 0. """
+    board = reconnecting_board(policy)
+    t0 = 100.0
+
+    def read(first_sample, ids):
+        host_time = t0 + (first_sample + len(ids) - 1) / v4.SAMPLE_RATE
+        return board._stamp_block(np.asarray(ids), np.zeros((len(ids), 8)), np.zeros((len(ids), 3)),
+                                  int(host_time * 1e9))
+
+    for k in range(10):
+        read(10 * k, np.arange(10 * k, 10 * k + 10) % 256)
+    board.resume_from = t0 + 99 / v4.SAMPLE_RATE
+    board.resume_pending = True
+
+    blocks = [read(150 + 10 * k, np.arange(10 * k, 10 * k + 10)) for k in range(10)]
+    last = blocks[-1].timestamps[-1]
+    assert last == pytest.approx(t0 + 249 / v4.SAMPLE_RATE, abs=1e-3)
+    if policy == 'none':
+        assert len(blocks[0]) == 10
+    else:
+        assert len(blocks[0]) == 60
+        assert blocks[0].timestamps[0] == pytest.approx(t0 + 100 / v4.SAMPLE_RATE, abs=1e-3)
+    assert board.continuity.lost == 50
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import daisy_pairing as dp
+
+
+def old_pair(ids, channel_data, aux_data):
+    """ The daisy merging of open_bci_v3.start_streaming before the block pairer, a frame at a time. """
+    merged = []
+    last_id, last_channels, last_aux = -1, [], []
+    for packet_id, channels, aux in zip(ids, channel_data, aux_data):
+        if ~packet_id % 2:
+            last_id, last_channels, last_aux = packet_id, channels, aux
+        elif packet_id - 1 == last_id:
+            merged.append((packet_id, channels + last_channels, list((np.array(aux) + np.array(last_aux)) / 2)))
+    return merged
+
+
+def make_frames(n=3000, loss=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(n) % 256
+    keep = rng.random(n) > loss
+    channel_data = rng.integers(-2 ** 23, 2 ** 23, (n, 8)).astype(np.float64)
+    aux_data = rng.integers(-2 ** 15, 2 ** 15, (n, 3)).astype(np.float64)
+    return ids[keep], channel_data[keep], aux_data[keep]
+
+
+@pytest.mark.parametrize('blocks', [1, 7, 250, 2000])
+def test_pairs_like_old_parser(blocks):
+    ids, channel_data, aux_data = make_frames()
+    expected = old_pair(ids.tolist(), channel_data.tolist(), aux_data.tolist())
+
+    pairer = dp.DaisyPairer(256)
+    parts = []
+    for part in np.array_split(np.arange(len(ids)), blocks):
+        merged = pairer.pair(ids[part], channel_data[part], aux_data[part])
+        parts.append(merged[:3] + (part[merged[3]],))
+    merged_ids, merged_channels, merged_aux, second = (np.concatenate(column) for column in zip(*parts))
+
+    assert merged_ids.tolist() == [sample[0] for sample in expected]
+    assert merged_channels.tolist() == [sample[1] for sample in expected]
+    assert merged_aux.tolist() == [sample[2] for sample in expected]
+    assert np.array_equal(ids[second], merged_ids)
+    assert pairer.pairs == len(expected)
+
+
+def test_unpaired_frames_are_counted():
+    pairer = dp.DaisyPairer(256)
+    ids = np.array([254, 255, 1, 2, 4, 5, 6])
+    merged_ids = pairer.pair(ids, np.zeros((7, 8)), np.zeros((7, 3)))[0]
+    assert merged_ids.tolist() == [255, 5]
+    assert pairer.get_stats() == {'pairs': 2, 'unpaired': 2}
+
+    # The last even frame waits for its partner in the next block, reset forgets it
+    #
+    assert pairer.pair(np.array([7]), np.ones((1, 8)), np.ones((1, 3)))[0].tolist() == [7]
+    pairer.pair(np.array([8]), np.zeros((1, 8)), np.zeros((1, 3)))
+    pairer.reset()
+    assert len(pairer.pair(np.array([9]), np.zeros((1, 8)), np.zeros((1, 3)))[0]) == 0
+
+
+def test_empty_block():
+    ids, channel_data, aux_data, second = dp.DaisyPairer().pair(np.zeros(0, dtype=int), np.zeros((0, 8)),
+                                                                np.zeros((0, 3)))
+    assert channel_data.shape == (0, 16) and len(ids) == len(second) == 0
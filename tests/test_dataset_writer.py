@@ -0,0 +1,66 @@
+import time
+
+import numpy as np
+
+import dataset_writer as dw
+
+LABEL_TABLE = np.eye(4, dtype=np.int64)
+
+
+def make_packets(n=23, rows=5, channels=3, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n, rows, channels)).astype(np.float32), rng.integers(0, 4, n)
+
+
+def wait_for_packets(directory, packets, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        manifest = dw.read_manifest(directory)
+        if manifest['packets'] >= packets:
+            return manifest
+        time.sleep(0.01)
+    raise AssertionError('the writer did not write %d packets' % packets)
+
+
+def test_shards_round_trip(tmp_path):
+    directory = str(tmp_path / 'session')
+    packets, labels = make_packets()
+    dataset = dw.DatasetWriter(directory, 5, 3, LABEL_TABLE, shard_size=6)
+    assert not dw.read_manifest(directory)['complete']
+
+    for packet, label in zip(packets, labels):
+        for row in packet:
+            full = dataset.add_row(row)
+        assert full
+        dataset.close_packet(label)
+
+    # Full shards are readable while the session goes on, the partial one only after close
+    #
+    manifest = wait_for_packets(directory, 18)
+    assert [shard['packets'] for shard in manifest['shards']] == [6, 6, 6]
+    assert not manifest['complete']
+    assert len(dataset) == 23
+
+    dataset.add_row(packets[0][0])  # a packet being collected is lost
+    dataset.close()
+    manifest = dw.read_manifest(directory)
+    assert manifest['complete']
+    assert manifest['packets'] == 23
+    assert [shard['packets'] for shard in manifest['shards']] == [6, 6, 6, 5]
+    assert manifest['class_totals'] == np.bincount(labels, minlength=4).tolist()
+    assert sum(np.array(shard['class_counts']) for shard in manifest['shards']).tolist() == \
+        manifest['class_totals']
+
+    data, one_hot = dw.load_shards(directory)
+    assert np.array_equal(data, packets)
+    assert np.array_equal(one_hot, LABEL_TABLE[labels])
+    assert dataset.get_stats() == {'packets': 23, 'written': 23, 'shards': 4, 'errors': 0}
+
+
+def test_empty_dataset(tmp_path):
+    directory = str(tmp_path / 'empty')
+    dataset = dw.DatasetWriter(directory, 5, 3, LABEL_TABLE, shard_size=6)
+    dataset.close()
+    data, one_hot = dw.load_shards(directory)
+    assert data.shape == (0, 5, 3) and one_hot.shape == (0, 4)
+    assert dw.read_manifest(directory)['complete']
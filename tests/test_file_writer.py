@@ -0,0 +1,69 @@
+import threading
+import time
+
+import file_writer as fw
+
+
+def test_everything_queued_is_written(tmp_path):
+    file_name = str(tmp_path / 'rows.csv')
+    writer = fw.FileWriter(file_name, lambda rows: ''.join(rows), 'w', flush_size=100, flush_latency=10.0, depth=8)
+    writer.start()
+    for i in range(1000):
+        assert writer.put('%d\n' % i)
+    writer.close()
+    with open(file_name) as f:
+        assert f.read().split() == [str(i) for i in range(1000)]
+    assert writer.get_stats()['items'] == 1000
+
+
+def test_close_waits_for_a_slow_writer(tmp_path):
+    file_name = str(tmp_path / 'slow.csv')
+
+    def slow(rows):
+        time.sleep(0.3)
+        return ''.join(rows)
+
+    writer = fw.FileWriter(file_name, slow, 'w', flush_latency=0.0)
+    writer.start()
+    writer.put('last\n')
+    writer.close()
+    assert writer.file.closed and writer.get_stats()['errors'] == 0
+    with open(file_name) as f:
+        assert f.read() == 'last\n'
+
+
+def test_put_after_close_is_rejected(tmp_path):
+    writer = fw.FileWriter(str(tmp_path / 'closed.csv'), lambda rows: ''.join(rows), 'w')
+    writer.start()
+    writer.close()
+    assert not writer.put('late\n')
+    assert writer.get_stats()['rejected'] == 1
+
+
+def test_blocked_put_is_rejected_by_close(tmp_path):
+    release = threading.Event()
+
+    def stuck(rows):
+        release.wait()
+        return ''.join(rows)
+
+    writer = fw.FileWriter(str(tmp_path / 'full.csv'), stuck, 'w', flush_latency=0.0, depth=2)
+    writer.start()
+    results = []
+
+    def put_all():
+        for i in range(10):
+            results.append(writer.put('%d\n' % i))
+            if not results[-1]:
+                return
+
+    putter = threading.Thread(target=put_all)
+    putter.start()
+    time.sleep(0.2)
+    closer = threading.Thread(target=writer.close)
+    closer.start()
+    putter.join(2.0)
+    release.set()
+    closer.join(2.0)
+    assert not putter.is_alive() and not closer.is_alive()
+    assert results[-1] is False and writer.get_stats()['rejected'] == 1
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import ganglion_decoder as gdec
+
+
+def old_conv(raw, bits):
+    """ conv18bitToInt32 / conv19bitToInt32 of open_bci_ganglion: the LSB is the sign, the bits above are set. """
+    if raw & 1:
+        return (((1 << (32 - bits)) - 1) << bits | raw) | ~0xFFFFFFFF
+    return raw
+
+
+def old_deltas(payload, bits):
+    """ decompressDeltas18Bit / decompressDeltas19Bit before the vectorized decoder, a value at a time. """
+    value = int.from_bytes(bytes(payload[:bits]), 'big')
+    values = [(value >> (8 * bits - bits * (k + 1))) & ((1 << bits) - 1) for k in range(8)]
+    return [[old_conv(v, bits) for v in values[:4]], [old_conv(v, bits) for v in values[4:]]]
+
+
+@pytest.mark.parametrize('bits', [18, 19])
+def test_unpack_matches_old_parser(bits):
+    payloads = np.random.default_rng(bits).integers(0, 256, (2000, gdec.PAYLOAD_SIZE)).astype(np.uint8)
+    deltas = gdec.unpack_deltas(payloads, bits)
+    assert deltas.shape == (2000, 2, 4)
+    assert deltas.tolist() == [old_deltas(payload, bits) for payload in payloads.tolist()]
+
+
+@pytest.mark.parametrize('bits', [18, 19])
+def test_extreme_deltas(bits):
+    ones = np.full((1, gdec.PAYLOAD_SIZE), 0xff, dtype=np.uint8)
+    assert (gdec.unpack_deltas(ones, bits) == -1).all()
+    assert (gdec.unpack_deltas(np.zeros_like(ones), bits) == 0).all()
+
+
+def test_reconstruct_matches_old_parser():
+    rng = np.random.default_rng(3)
+    deltas = rng.integers(-2 ** 18, 2 ** 18, (300, 2, 4))
+    last = [100, -200, 300, -400]
+
+    # parse19bit: every sample is the one before minus its delta
+    #
+    expected = []
+    channel_data = last
+    for packet in deltas.tolist():
+        for delta in packet:
+            channel_data = list(np.array(channel_data) - np.array(delta))
+            expected.append(channel_data)
+    assert gdec.reconstruct(deltas, last).tolist() == expected
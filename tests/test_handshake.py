@@ -0,0 +1,70 @@
+import handshake as hs
+
+BANNER_V3 = 'OpenBCI V3 8-16 channel\nOn Board ADS1299 Device ID: 0x3E\nFirmware: v3.1.1\n$$$'
+BANNER_8BIT = 'OpenBCI V3 8-16 channel\nADS1299 Device ID: 0x3E\nLIS3DH Device ID: 0x33\n$$$'
+
+
+class FakeSerial(object):
+    """ A board answering the commands in replies with the given text as soon as they are written. """
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.incoming = bytearray()
+        self.timeout = 1.0
+
+    def write(self, commands):
+        for command in hs.split_commands(commands.decode('utf-8')):
+            self.incoming += self.replies.get(command, '').encode('utf-8')
+
+    def inWaiting(self):
+        return len(self.incoming)
+
+    def read(self, size=1):
+        data = bytes(self.incoming[:size])
+        del self.incoming[:size]
+        return data
+
+    def reset_input_buffer(self):
+        self.incoming = bytearray()
+
+
+def test_split_commands():
+    assert hs.split_commands('sdx1060110Xz10Z1') == ['s', 'd', 'x1060110X', 'z10Z', '1']
+    assert hs.split_commands('x106') == ['x106']
+
+
+def test_settings_are_acknowledged_from_firmware_2():
+    ser = FakeSerial({'v': BANNER_V3,
+                      'x1060110X': 'Success: Channel set for 1$$$',
+                      'z10Z': 'Success: Lead off set for 1$$$'})
+    handshake = hs.Handshake(ser, timeout=0.5)
+    assert handshake.reset().firmware == '3.1.1'
+
+    replies = handshake.send('x1060110Xz10Z')
+    assert replies == [('x1060110X', 'Success: Channel set for 1$$$'),
+                       ('z10Z', 'Success: Lead off set for 1$$$')]
+    assert ser.incoming == b'' and handshake.pending == b''
+
+
+def test_the_output_of_other_commands_is_drained():
+    # The 8-bit board does not tell its firmware: its setting replies are collected, not waited for
+    #
+    ser = FakeSerial({'v': BANNER_8BIT, 'd': 'updating channel settings to default$$$',
+                      'x1060110X': 'Channel set for 1$$$', '1': 'Channel 1 off\n'})
+    handshake = hs.Handshake(ser, timeout=0.5)
+    assert handshake.reset().firmware is None
+
+    replies = handshake.send('dx1060110X1')
+    assert replies == [('d', 'updating channel settings to default$$$'),
+                       (None, 'Channel set for 1$$$Channel 1 off\n')]
+
+    # Nothing is left to show up after the next command
+    #
+    assert handshake.send('d') == [('d', 'updating channel settings to default$$$')]
+
+
+def test_missing_reply():
+    ser = FakeSerial({'v': BANNER_V3})
+    handshake = hs.Handshake(ser, timeout=0.05)
+    handshake.reset()
+    assert handshake.send('d?') == [('d', None), ('?', None)]
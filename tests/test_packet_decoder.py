@@ -0,0 +1,112 @@
+import struct
+
+import numpy as np
+import pytest
+
+import open_bci_v3 as v3
+import packet_decoder as pdec
+
+START, END = pdec.START_BYTE, pdec.END_BYTE
+
+
+def old_parse(stream, scaled):
+    """ The per-byte parser of open_bci_v3 before the bulk decoder, run over a whole stream. """
+    samples = []
+    pos = 0
+    while pos + pdec.FRAME_SIZE <= len(stream):
+        if stream[pos] != START:
+            pos += 1
+            continue
+        packet_id = stream[pos + 1]
+        pos += 2
+        channel_data = []
+        for c in range(8):
+            literal_read = stream[pos:pos + 3]
+            pos += 3
+            pre_fix = b'\xff' if literal_read[0] > 127 else b'\x00'
+            value = struct.unpack('>i', pre_fix + literal_read)[0]
+            channel_data.append(value * v3.scale_fac_uVolts_per_count if scaled else value)
+        aux_data = []
+        for a in range(3):
+            acc = struct.unpack('>h', stream[pos:pos + 2])[0]
+            pos += 2
+            aux_data.append(acc * v3.scale_fac_accel_G_per_count if scaled else acc)
+        val = stream[pos]
+        pos += 1
+        if val == END:
+            samples.append((packet_id, channel_data, aux_data))
+    return samples
+
+
+def make_stream(n=500, seed=0):
+    """
+    Frames with any bytes in their data, trash between some of them and frames with a bad end byte. The trash and
+    the bad frames hold no start byte, the old parser would search them differently.
+    """
+    rng = np.random.default_rng(seed)
+    no_start = np.array([b for b in range(256) if b != START], dtype=np.uint8)
+    parts = []
+    for i in range(n):
+        payload = rng.integers(0, 256, 31).astype(np.uint8)
+        payload[0] = i % 256
+        if rng.random() < 0.05:
+            payload = rng.choice(no_start, 31)
+            parts.append(bytes([START]) + payload.tobytes() + bytes([0x00]))
+        else:
+            parts.append(bytes([START]) + payload.tobytes() + bytes([END]))
+        if rng.random() < 0.1:
+            parts.append(rng.choice(no_start, rng.integers(1, 50)).tobytes())
+    return b''.join(parts)
+
+
+@pytest.mark.parametrize('scaled', [False, True])
+def test_bulk_decoder_matches_old_parser(scaled):
+    stream = make_stream()
+    expected = old_parse(stream, scaled)
+    decoder = pdec.CytonDecoder(v3.scale_fac_uVolts_per_count, v3.scale_fac_accel_G_per_count) if scaled \
+        else pdec.CytonDecoder()
+
+    # Fed in pieces of any size, frames cut in two included
+    #
+    rng = np.random.default_rng(1)
+    cuts = np.sort(rng.integers(0, len(stream), 60))
+    parts = [decoder.feed(piece.tobytes()) for piece in np.split(np.frombuffer(stream, dtype=np.uint8), cuts)]
+    ids, channel_data, aux_data = (np.concatenate(column) for column in zip(*parts))
+
+    assert ids.tolist() == [sample[0] for sample in expected]
+    assert np.allclose(channel_data, [sample[1] for sample in expected], rtol=0, atol=1e-9)
+    assert np.allclose(aux_data, [sample[2] for sample in expected], rtol=0, atol=1e-12)
+    assert decoder.skipped_bytes > 0 and decoder.resyncs > 0
+
+
+@pytest.mark.parametrize('scaled', [False, True])
+def test_frame_layout_matches_old_parser(scaled):
+    stream = make_stream(200, seed=2)
+    layout = pdec.FrameLayout(False, v3.scale_fac_uVolts_per_count, v3.scale_fac_accel_G_per_count) if scaled \
+        else pdec.FrameLayout()
+    offsets, _ = pdec.CytonDecoder().find_frames(np.frombuffer(stream, dtype=np.uint8))
+    expected = old_parse(stream, scaled)
+    assert len(offsets) == len(expected)
+    for offset, (packet_id, channel_data, aux_data) in zip(offsets, expected):
+        decoded = layout.decode(stream, int(offset))
+        assert decoded[0] == packet_id
+        assert decoded[1] == pytest.approx(channel_data, abs=1e-9)
+        assert decoded[2] == pytest.approx(aux_data, abs=1e-12)
+
+
+def test_extreme_values():
+    frame = bytes([START, 7]) + bytes([0x80, 0, 0, 0x7f, 0xff, 0xff] * 4) + bytes([0x80, 0, 0x7f, 0xff, 0xff, 0xff]) \
+        + bytes([END])
+    ids, channel_data, aux_data = pdec.CytonDecoder().feed(frame)
+    assert channel_data.tolist() == [[-2 ** 23, 2 ** 23 - 1] * 4]
+    assert aux_data.tolist() == [[-2 ** 15, 2 ** 15 - 1, -1]]
+    assert pdec.FrameLayout().decode(frame)[1:] == ([-2 ** 23, 2 ** 23 - 1] * 4, [-2 ** 15, 2 ** 15 - 1, -1])
+
+
+def test_partial_frame_is_kept_for_the_next_feed():
+    frame = bytes([START, 1]) + bytes(30) + bytes([END])
+    decoder = pdec.CytonDecoder()
+    assert len(decoder.feed(frame[:20])[0]) == 0
+    assert decoder.feed(frame[20:] + frame[:5])[0].tolist() == [1]
+    decoder.reset()
+    assert len(decoder.feed(frame[5:])[0]) == 0
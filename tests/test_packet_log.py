@@ -0,0 +1,79 @@
+import numpy as np
+
+import packet_decoder as pdec
+import packet_log as pl
+
+
+def frame(packet_id):
+    return bytes([pdec.START_BYTE, packet_id]) + bytes(range(packet_id % 8, packet_id % 8 + 30)) + \
+        bytes([pdec.END_BYTE])
+
+
+def frames(first, n):
+    decoder = pdec.CytonDecoder()
+    decoder.feed(b''.join(frame(i % 256) for i in range(first, first + n)))
+    return decoder.frames
+
+
+def test_records_round_trip(tmp_path):
+    file_name = str(tmp_path / 'packets.obl')
+    log = pl.PacketLog(16)
+    log.start(file_name, interval=60.0)
+
+    log.add_frames(frames(0, 10))
+    log.add(pl.BAD_END, frame(10)[:32] + b'\x00', 10)
+    log.add_frames(frames(11, 3), skipped=7)
+    log.flush()
+    assert log.get_stats() == {'records': 15, 'written': 15, 'lost': 0}
+
+    # More than the ring holds between two writes: the oldest ones are lost, the ring wraps
+    log.add(pl.STALL)
+    log.add_frames(frames(250, 20))
+    log.add(pl.RECONNECT)
+    log.stop()
+    assert log.get_stats() == {'records': 37, 'written': 37, 'lost': 6}
+
+    records = pl.read_log(file_name)
+    assert len(records) == 15 + 16
+    assert records['status'].tolist() == [pl.VALID] * 10 + [pl.BAD_END, pl.SKIPPED] + [pl.VALID] * 18 + \
+        [pl.RECONNECT]
+    assert records['id'].tolist() == list(range(11)) + [-1, 11, 12, 13] + [255] + list(range(14)) + [-1]
+    assert records['skipped'].tolist()[11] == 7
+
+    frames_read = records['frame'][records['status'] == pl.VALID]
+    assert frames_read[0].tobytes() == frame(0)
+    assert frames_read[-1].tobytes() == frame(13)
+    assert records['frame'][10].tobytes() == frame(10)[:32] + b'\x00'
+
+    lines = pl.report(records)
+    assert lines[1:5] == ['  valid     28', '  bad       1', '  skipped   1', '  reconnect 1']
+    assert lines[5] == '  skipped bytes 7'
+    # 10 only came in a bad frame, 14 to 254 are gone from the ring
+    assert lines[6] == '  id jumps  2, 242 ids missing'
+    assert 'bad' in pl.format_record(records[10]) and frame(10)[:32].hex() in pl.format_record(records[10])
+
+
+def test_nothing_written_while_disabled(tmp_path):
+    file_name = tmp_path / 'packets.obl'
+    logging = [False]
+    log = pl.PacketLog(16)
+    log.start(str(file_name), enabled=lambda: logging[0], interval=60.0)
+    log.add_frames(frames(0, 5))
+    log.flush()
+    assert not file_name.exists()
+
+    logging[0] = True
+    log.add_frames(frames(5, 3))
+    log.stop()
+    assert pl.read_log(str(file_name))['id'].tolist() == [5, 6, 7]
+
+
+def test_not_a_packet_log(tmp_path):
+    file_name = tmp_path / 'other.obl'
+    file_name.write_bytes(b'OBCIRAW1' + bytes(40))
+    try:
+        pl.read_log(str(file_name))
+    except ValueError:
+        pass
+    else:
+        assert False, 'ValueError expected'
@@ -0,0 +1,40 @@
+import numpy as np
+
+import packet_store as ps
+
+
+def test_store_grows_and_saves(tmp_path):
+    rng = np.random.default_rng(0)
+    packets = rng.normal(size=(300, 4, 3))
+    labels = rng.integers(0, 10, 300)
+
+    store = ps.PacketStore(4, 3, capacity=8)
+    capacities = set()
+    for packet, label in zip(packets, labels):
+        for row in packet:
+            full = store.add_row(row)
+        assert full
+        store.close_packet(label)
+        capacities.add(store.capacity)
+    assert capacities == {8, 16, 32, 64, 128, 256, 512}
+    assert len(store) == 300
+    assert np.array_equal(store.data, packets) and np.array_equal(store.labels, labels)
+
+    # The packet being collected is not part of the data
+    #
+    store.add_row(packets[0][0])
+    data_file, label_file = str(tmp_path / 'data.npy'), str(tmp_path / 'labels.npy')
+    store.save(data_file, label_file)
+    assert np.array_equal(np.load(data_file), packets.reshape(-1, 3))
+    assert np.array_equal(np.load(label_file), labels)
+
+    store.save(data_file, label_file, flat=False)
+    assert np.array_equal(np.load(data_file), packets)
+    assert store.nbytes == 512 * 4 * 3 * 8 + 512 * 8
+
+
+def test_empty_store(tmp_path):
+    store = ps.PacketStore(4, 3)
+    data_file, label_file = str(tmp_path / 'data.npy'), str(tmp_path / 'labels.npy')
+    store.save(data_file, label_file)
+    assert np.load(data_file).shape == (0, 3) and np.load(label_file).shape == (0,)
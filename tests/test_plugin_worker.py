@@ -0,0 +1,117 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import controller
+import plugin_worker as pw
+import sample_block as sb
+
+
+class SlowPlugin(object):
+    """ Holds the worker on its first item until released, then takes delay seconds per item. """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.items = []
+
+    def __call__(self, sample):
+        self.started.set()
+        self.release.wait(5.0)
+        time.sleep(self.delay)
+        self.items.append(sample)
+
+    def process_block(self, block):
+        self(block)
+
+
+def held_worker(policy, depth=4, delay=0.0):
+    """ A started worker whose plugin is busy with item 0. """
+    plugin = SlowPlugin(delay)
+    worker = pw.PluginWorker(plugin, 'slow', policy, depth)
+    worker.start()
+    worker(0)
+    assert plugin.started.wait(2.0)
+    return worker, plugin
+
+
+def stop_workers(*workers):
+    """ Stop the workers the way the controller does. """
+    board_controller = object.__new__(controller.Controller)
+    board_controller.workers = list(workers)
+    board_controller.stop_workers()
+    assert board_controller.workers == []
+
+
+def test_drop_oldest():
+    worker, plugin = held_worker('drop-oldest')
+    for i in range(1, 10):
+        worker(i)
+    assert worker.get_stats()['dropped'] == 5
+    plugin.release.set()
+    stop_workers(worker)
+    assert plugin.items == [0, 6, 7, 8, 9]
+    stats = worker.get_stats()
+    assert stats['received'] == 10 and stats['queued'] == 0 and stats['max_queued'] == 4
+
+
+def test_drop_newest():
+    worker, plugin = held_worker('drop-newest')
+    for i in range(1, 10):
+        worker(i)
+    plugin.release.set()
+    stop_workers(worker)
+    assert plugin.items == [0, 1, 2, 3, 4]
+    assert worker.get_stats()['dropped'] == 5
+
+
+def test_block_loses_nothing():
+    worker, plugin = held_worker('block', delay=0.002)
+    threading.Timer(0.1, plugin.release.set).start()
+    started = time.monotonic()
+    for i in range(1, 40):
+        worker(i)
+    assert time.monotonic() - started >= 0.05  # waited for the plugin
+    stop_workers(worker)
+    assert plugin.items == list(range(40))
+    stats = worker.get_stats()
+    assert stats['dropped'] == 0 and stats['max_queued'] <= 4
+
+
+def test_coalesce_merges_blocks():
+    worker, plugin = held_worker('coalesce', depth=2)
+    for i in range(1, 7):
+        n = i
+        worker.process_block(sb.SampleBlock(np.full(n, i), np.zeros((n, 8)), np.zeros((n, 3)), np.zeros(n)))
+    plugin.release.set()
+    stop_workers(worker)
+    ids = np.concatenate([item.ids for item in plugin.items[1:]])
+    assert ids.tolist() == [i for i in range(1, 7) for _ in range(i)]
+    assert worker.get_stats()['dropped'] == 0 and worker.get_stats()['coalesced'] > 0
+
+
+def test_stop_workers_drains_the_queue():
+    workers = []
+    plugins = []
+    for policy in ('block', 'drop-oldest'):
+        worker, plugin = held_worker(policy, depth=50, delay=0.001)
+        for i in range(1, 50):
+            worker(i)
+        plugin.release.set()
+        workers.append(worker)
+        plugins.append(plugin)
+    stop_workers(*workers)
+    for worker, plugin in zip(workers, plugins):
+        assert plugin.items == list(range(50))
+        assert not worker.thread.is_alive() and worker.get_stats()['queued'] == 0
+
+
+def test_split_worker_args():
+    assert pw.split_worker_args(['localhost', 'worker=drop-oldest', 'worker_depth=512', '12345']) == \
+        ('drop-oldest', 512, ['localhost', '12345'])
+    assert pw.split_worker_args(['x']) == (None, 256, ['x'])
+    with pytest.raises(ValueError):
+        pw.split_worker_args(['worker=sometimes'])
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import port_discovery as pd
+
+
+class StubProbe(object):
+    """ A probe answering True on the board ports only, after delay seconds. Records the probed ports. """
+
+    def __init__(self, board_ports, delay=0.0):
+        self.board_ports = set(board_ports)
+        self.delay = delay
+        self.probed = []
+        self.running = 0
+        self.most_running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, port, *args):
+        with self.lock:
+            self.probed.append(port)
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        if port == 'COM13':
+            raise OSError('port vanished')
+        return port in self.board_ports
+
+
+def find(monkeypatch, tmp_path, ports, board_ports, keys=None):
+    probe = StubProbe(board_ports)
+    monkeypatch.setattr(pd, 'serial_candidates', lambda: ports)
+    monkeypatch.setattr(pd, 'serial_keys', lambda: keys or {})
+    monkeypatch.setattr(pd, 'probe_serial', probe)
+    cache = pd.PortCache(str(tmp_path / 'ports.json'))
+    return pd.find_serial_port(115200, cache=cache), probe
+
+
+def test_probe_all_is_capped():
+    probe = StubProbe(['COM200'], delay=0.01)
+    ports = ['COM%d' % (i + 1) for i in range(256)]
+    assert pd.probe_all(ports, probe, max_workers=8) == 'COM200'
+    assert probe.most_running <= 8
+    assert pd.probe_all(ports[:20], probe, max_workers=8) is None
+    assert pd.probe_all([], probe) is None
+
+    # A probe that raises counts as no board
+    assert pd.probe_all(['COM13', 'COM14'], StubProbe(['COM13', 'COM14']), max_workers=1) == 'COM14'
+
+
+def test_cache_miss_then_hit(monkeypatch, tmp_path):
+    ports = ['/dev/ttyUSB0', '/dev/ttyUSB1', '/dev/ttyUSB2']
+    keys = {'/dev/ttyUSB1': 'serial:DQ0081'}
+
+    # Nothing cached: the ports are probed and the key of the board is remembered
+    port, probe = find(monkeypatch, tmp_path, ports, ['/dev/ttyUSB1'], keys)
+    assert port == '/dev/ttyUSB1'
+    assert pd.PortCache(str(tmp_path / 'ports.json')).get('cyton') == ('serial:DQ0081', '/dev/ttyUSB1')
+
+    # Cached: only that port is probed
+    port, probe = find(monkeypatch, tmp_path, ports, ['/dev/ttyUSB1'], keys)
+    assert port == '/dev/ttyUSB1' and probe.probed == ['/dev/ttyUSB1']
+
+    # The board came back on another device name, found by its key
+    port, probe = find(monkeypatch, tmp_path, ports, ['/dev/ttyUSB2'], {'/dev/ttyUSB2': 'serial:DQ0081'})
+    assert port == '/dev/ttyUSB2' and probe.probed == ['/dev/ttyUSB2']
+
+
+def test_stale_cache_entry(monkeypatch, tmp_path):
+    ports = ['COM3', 'COM13', 'COM14']
+    pd.PortCache(str(tmp_path / 'ports.json')).remember('cyton', 'COM3', 'COM3')
+
+    # The cached port no longer answers: it is probed first, then the others
+    port, probe = find(monkeypatch, tmp_path, ports, ['COM14'])
+    assert port == 'COM14'
+    assert probe.probed[0] == 'COM3' and 'COM14' in probe.probed
+    assert pd.PortCache(str(tmp_path / 'ports.json')).get('cyton') == ('COM14', 'COM14')
+
+    try:
+        find(monkeypatch, tmp_path, ports, [])
+    except OSError:
+        pass
+    else:
+        assert False, 'OSError expected'
+
+
+def test_broken_cache_file(tmp_path):
+    file_name = tmp_path / 'ports.json'
+    file_name.write_text('{not json')
+    cache = pd.PortCache(str(file_name))
+    assert cache.get('ganglion') == (None, None)
+    cache.remember('ganglion', 'e8:a5:2b', 'e8:a5:2b')
+    assert pd.PortCache(str(file_name)).get('ganglion') == ('e8:a5:2b', 'e8:a5:2b')
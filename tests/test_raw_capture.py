@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import packet_decoder as pdec
+import raw_capture as rc
+
+
+def make_stream(n=400, seed=0):
+    """ Frames with trash between some of them, and channel data full of start and end bytes. """
+    rng = np.random.default_rng(seed)
+    parts = []
+    for i in range(n):
+        payload = rng.choice([pdec.START_BYTE, pdec.END_BYTE, 0, 1], 30).astype(np.uint8)
+        parts.append(bytes([pdec.START_BYTE, i % 256]) + payload.tobytes() + bytes([pdec.END_BYTE]))
+        if rng.random() < 0.1:
+            parts.append(rng.choice([pdec.START_BYTE, pdec.END_BYTE, 7], rng.integers(1, 40)).astype(np.uint8)
+                         .tobytes())
+    return b''.join(parts)
+
+
+@pytest.fixture(scope='module')
+def capture(tmp_path_factory):
+    file_name = str(tmp_path_factory.mktemp('capture') / 'session.raw')
+    data = make_stream()
+    writer = rc.RawCapture(file_name)
+    writer.write(data)
+    writer.close()
+    return file_name, data
+
+
+@pytest.mark.parametrize('chunk_size', [1, 17, 33, 100, 1000, 1 << 20])
+def test_chunks_decode_like_one_stream(capture, chunk_size):
+    file_name, data = capture
+    expected = pdec.CytonDecoder().feed(data)
+    offsets, _ = pdec.CytonDecoder().find_frames(np.frombuffer(data, dtype=np.uint8))
+    reader = rc.RawCaptureReader(file_name, scaled=False)
+
+    for result in (reader.decode(workers=4, chunk_size=chunk_size),
+                   [np.concatenate(column) for column in zip(*reader.iter_chunks(chunk_size))]):
+        ids, channel_data, aux_data, found = result
+        assert np.array_equal(found, offsets)
+        assert np.array_equal(ids, expected[0])
+        assert np.array_equal(channel_data, expected[1])
+        assert np.array_equal(aux_data, expected[2])
@@ -0,0 +1,94 @@
+import warnings
+
+import numpy as np
+
+import config as cfg
+import recording as rec
+
+RATE = 250
+
+
+def make_header(eeg_channels=8, aux_channels=3):
+    return rec.board_header(RATE, eeg_channels, aux_channels)
+
+
+def make_session(n=3000, seed=0, scale=None):
+    """ Channel and aux values as the plugins get them, with a gap of lost (NaN) samples. """
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(-2 ** 23, 2 ** 23, (n, 8))
+    aux = rng.integers(-2 ** 15, 2 ** 15, (n, 3))
+    channel_data = counts * scale[0] if scale else counts.astype(np.float64)
+    aux_data = aux * scale[1] if scale else aux.astype(np.float64)
+    channel_data[1000:1050] = np.nan
+    aux_data[1000:1050] = np.nan
+    return np.arange(n) % 256, counts, aux, channel_data, aux_data
+
+
+def write(file_name, header, ids, channel_data, aux_data, chunk_samples=500):
+    stage = rec.CountStage(header, 100)
+    writer = rec.RecordingWriter(file_name, header, 12, chunk_samples)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        writer.write(stage.counts(ids, channel_data, aux_data), np.arange(len(ids)) / RATE)
+    writer.add_event(3, 'image 3', 1200)
+    writer.close()
+
+
+def test_to_counts_marks_gaps_without_warning():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        counts = rec.to_counts(np.array([1.4, np.nan, -2.6]), None, False)
+    assert counts.tolist() == [1, rec.GAP_COUNT, -3]
+    assert np.isnan(rec.from_counts(counts)[1])
+
+
+def test_chunk_encoding_round_trip():
+    rows = np.random.default_rng(1).integers(-2 ** 23, 2 ** 23, (300, 12)).astype(np.int32)
+    rows[10:20] = rec.GAP_COUNT
+    assert np.array_equal(rec.decode_chunk(rec.encode_chunk(rows), 300, 12), rows)
+
+
+def test_round_trip_with_gaps(tmp_path):
+    file_name = str(tmp_path / 'session.obcr')
+    ids, counts, aux, channel_data, aux_data = make_session()
+    write(file_name, make_header(), ids, channel_data, aux_data)
+
+    reader = rec.RecordingReader(file_name)
+    read_ids, read_channels, read_aux = reader.read(scaled=False)
+    assert len(reader) == len(ids) and not reader.recovered
+    assert np.array_equal(read_ids, ids)
+    assert np.isnan(read_channels[1000:1050]).all() and np.isnan(read_aux[1000:1050]).all()
+    keep = np.ones(len(ids), dtype=bool)
+    keep[1000:1050] = False
+    assert np.array_equal(read_channels[keep], counts[keep])
+    assert np.array_equal(read_aux[keep], aux[keep])
+    assert reader.events_between(1000, 1500)['text'].tolist() == [b'image 3']
+
+    # Any window, across chunk boundaries
+    _, window, _ = reader.read(480, 1020, scaled=False)
+    assert np.array_equal(window[:520], counts[480:1000])
+
+
+def test_scaled_input_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(cfg, 'scaling', 1)
+    header = make_header()
+    scale = (header['channel_scale'], header['aux_scale'])
+    ids, counts, aux, channel_data, aux_data = make_session(scale=scale)
+    file_name = str(tmp_path / 'scaled.obcr')
+    write(file_name, header, ids, channel_data.astype(np.float32), aux_data.astype(np.float32))
+
+    rows = rec.RecordingReader(file_name).read_counts()
+    assert (rows[1000:1050, 1:] == rec.GAP_COUNT).all()
+    assert np.abs(rows[:1000, 1:9] - counts[:1000]).max() <= 1
+
+
+def test_recovery_without_index(tmp_path):
+    file_name = str(tmp_path / 'crash.obcr')
+    ids, counts, aux, channel_data, aux_data = make_session()
+    write(file_name, make_header(), ids, channel_data, aux_data)
+    with open(file_name, 'r+b') as f:
+        f.truncate(f.seek(0, 2) - 100)
+
+    reader = rec.RecordingReader(file_name)
+    assert reader.recovered and len(reader) == len(ids)
+    assert np.array_equal(reader.read_counts()[:1000, 1:9], counts[:1000])
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import numpy as np
+
+import ring_buffer as rb
+import sample_block as sb
+
+
+def make_block(first, n):
+    index = np.arange(first, first + n)
+    return sb.SampleBlock(index % 256, np.repeat(index[:, None], 8, axis=1).astype(np.float32),
+                          np.zeros((n, 3), dtype=np.float32), index / 250.0)
+
+
+def test_readers_get_every_sample_in_order():
+    ring = rb.RingBuffer(100, 8, 3)
+    fast, slow = ring.cursor(), ring.cursor()
+    seen_fast, seen_slow = [], []
+    first = 0
+    for n in [1, 30, 64, 35, 5, 40, 98, 2]:
+        ring.write(make_block(first, n))
+        first += n
+        seen_fast.extend(fast.read().channel_data[:, 0])
+        if first % 2:
+            seen_slow.extend(slow.read().channel_data[:, 0])
+    seen_slow.extend(slow.read().channel_data[:, 0])
+    assert seen_fast == list(range(first))
+    assert seen_slow == list(range(first))
+    assert ring.get_stats()['overruns'] == [0, 0]
+
+
+def test_slow_reader_loses_the_oldest_samples():
+    ring = rb.RingBuffer(100, 8, 3)
+    cursor = ring.cursor()
+    ring.write(make_block(0, 80))
+    ring.write(make_block(80, 70))
+    block = cursor.read()
+    assert block.channel_data[:, 0].tolist() == list(range(50, 150))
+    assert cursor.overruns == 50
+
+    # A block larger than the buffer leaves its last part
+    #
+    ring.write(make_block(150, 250))
+    assert cursor.read().channel_data[:, 0].tolist() == list(range(300, 400))
+    assert cursor.overruns == 200
+
+
+def test_max_samples_and_wait():
+    ring = rb.RingBuffer(100, 8, 3)
+    cursor = ring.cursor()
+    assert len(cursor.read(timeout=0.01)) == 0
+
+    writer = threading.Timer(0.05, lambda: ring.write(make_block(0, 20)))
+    writer.start()
+    started = time.monotonic()
+    block = cursor.read(max_samples=15, timeout=2.0)
+    writer.join()
+    assert time.monotonic() - started < 1.0
+    assert block.ids.tolist() == list(range(15))
+    assert cursor.available() == 5
+    assert cursor.read().timestamps.tolist() == (np.arange(15, 20) / 250.0).tolist()
+
+
+def test_late_cursor_starts_at_the_write_position():
+    ring = rb.RingBuffer(10, 8, 3)
+    ring.write(make_block(0, 5))
+    cursor = ring.cursor()
+    ring.write(make_block(5, 3))
+    assert cursor.read().ids.tolist() == [5, 6, 7]
+
+
+def test_released_readers_are_forgotten():
+    ring = rb.RingBuffer(100, 8, 3)
+    first, second = ring.cursor(), ring.cursor()
+    ring.write(make_block(0, 150))
+    assert first.read().channel_data[0, 0] == 50
+    assert len(second.read(max_samples=10)) == 10
+    ring.release(first)
+    ring.release(first)
+    assert ring.cursors == [second]
+    assert ring.get_stats()['overruns'] == [50]
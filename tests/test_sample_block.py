@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+import sample_block as sb
+
+
+def make_block(first, n, imp=False):
+    index = np.arange(first, first + n)
+    return sb.SampleBlock(index % 256, np.repeat(index[:, None], 8, axis=1) + np.arange(8) / 10,
+                          np.repeat(-index[:, None], 3, axis=1), index / 250.0,
+                          np.repeat(index[:, None], 4, axis=1) if imp else None)
+
+
+def test_block_arrays_and_indexing():
+    block = make_block(250, 10)
+    assert len(block) == 10
+    assert block.ids.dtype == np.int32 and block.channel_data.dtype == np.float32
+    assert block.aux_data.dtype == np.float32 and block.timestamps.dtype == np.float64
+    assert block.nbytes == 10 * (4 + 8 * 4 + 3 * 4 + 8)
+
+    assert block[0].id == 250 and block[-1].id == 3
+    assert [sample.id for sample in block] == [250, 251, 252, 253, 254, 255, 0, 1, 2, 3]
+    with pytest.raises(IndexError):
+        block[10]
+    with pytest.raises(IndexError):
+        block[-11]
+
+
+def test_slice_and_concatenate():
+    block = sb.SampleBlock.concatenate([make_block(0, 5, imp=True), make_block(5, 7, imp=True)])
+    assert block.ids.tolist() == list(range(12))
+    assert block.imp_data[:, 0].tolist() == list(range(12))
+
+    part = block.slice(3, 8)
+    assert part.ids.tolist() == [3, 4, 5, 6, 7]
+    assert part.imp_data.shape == (5, 4)
+
+    # Without impedance in every block, the joined block has none
+    assert sb.SampleBlock.concatenate([make_block(0, 5, imp=True), make_block(5, 2)]).imp_data is None
+
+
+def test_view_lists_are_made_once():
+    block = make_block(0, 3)
+    sample = block[1]
+    assert sample.channel_data == pytest.approx([1.0, 1.1, 1.2, 1.3, 1.4, 1.5, 1.6, 1.7])
+    assert sample.aux_data == [-1.0, -1.0, -1.0]
+    assert sample.imp_data == []
+    assert sample.channel_data is sample.channel_data
+    assert sample.aux_data is sample.aux_data
+
+    # As with OpenBCISample, a plugin changing the list is seen by the next one, the block stays as it is
+    sample.channel_data[0] = 42.0
+    assert sample.channel_data[0] == 42.0
+    assert block.channel_data[1, 0] == 1.0
+    assert block[1].channel_data[0] == 1.0
+
+    assert make_block(0, 3, imp=True)[2].imp_data == [2, 2, 2, 2]
+
+
+def test_view_arrays_and_timestamp():
+    block = make_block(0, 3)
+    sample = block[2]
+
+    # channels and aux are the rows of the block itself
+    assert np.shares_memory(sample.channels, block.channel_data)
+    assert np.shares_memory(sample.aux, block.aux_data)
+
+    assert sample.timestamp == pytest.approx(2 / 250.0)
+    sample.timestamp = 7.5
+    assert block.timestamps[2] == 7.5
+
+
+def test_builder_cuts_blocks_by_size_and_latency():
+    builder = sb.BlockBuilder(block_size=4, latency=0.1)
+    builder.add(make_block(0, 3))
+    assert builder.pop_blocks(now=0.0) == []
+
+    # A full block goes out, the rest waits for more samples
+    builder.add(make_block(3, 3))
+    blocks = builder.pop_blocks(now=0.02)
+    assert [b.ids.tolist() for b in blocks] == [[0, 1, 2, 3]]
+    assert builder.count == 2
+
+    # Once the oldest sample has waited for the latency, the smaller block goes out as well
+    assert builder.pop_blocks(now=4 / 250.0 + 0.05) == []
+    blocks = builder.pop_blocks(now=4 / 250.0 + 0.1)
+    assert [b.ids.tolist() for b in blocks] == [[4, 5]]
+    assert builder.count == 0 and builder.pop_blocks(now=1.0) == []
+
+    builder.add(make_block(6, 0))
+    assert builder.count == 0
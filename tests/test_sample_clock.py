@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import sample_clock as sc
+
+RATE = 250.0
+
+
+def stream(clock, seconds, true_period, start=1000.0, first=0, latency=0.004, jitter=0.006, seed=0):
+    """
+    Reads of 10 samples from a board sampling every true_period seconds. A read returns latency seconds after its
+    last sample, plus up to jitter seconds. Returns the true times and the timestamps of the samples.
+    """
+    rng = np.random.default_rng(seed)
+    true_times, timestamps = [], []
+    for k in range(int(seconds * RATE / 10)):
+        index = np.arange(first + 10 * k, first + 10 * k + 10)
+        times = start + index * true_period
+        host_time = times[-1] + latency + rng.uniform(0, jitter)
+        timestamps.append(clock.update(index % 256, int(round(host_time * 1e9))))
+        true_times.append(times)
+    return np.concatenate(true_times), np.concatenate(timestamps)
+
+
+def test_converges_to_the_true_period_and_offset():
+    true_period = 1 / (RATE * (1 + 200e-6))  # the board runs 200 ppm fast
+    clock = sc.SampleClock(RATE, 256, window=30.0)
+    true_times, timestamps = stream(clock, 120, true_period)
+
+    stats = clock.get_stats()
+    assert clock.period == pytest.approx(true_period, rel=10e-6)
+    assert stats['drift_ppm'] == pytest.approx(-200, abs=10)
+    assert stats['rate'] == pytest.approx(RATE * (1 + 200e-6), rel=10e-6)
+
+    # Once settled, the timestamps are the true times plus the mean latency, without the jitter of the reads
+    #
+    error = (timestamps - true_times)[-int(RATE) * 60:]
+    assert error.mean() == pytest.approx(0.004 + 0.003, abs=0.0005)
+    assert error.std() < 0.0003
+    assert stats['jitter_ms'] == pytest.approx(6 / np.sqrt(12), rel=0.3)
+    assert stats['max_jitter_ms'] < 8
+
+
+def test_nominal_rate_until_a_second_is_seen():
+    clock = sc.SampleClock(RATE, 256)
+    stream(clock, 0.4, 1 / (RATE * 1.01))
+    assert clock.period == 1 / RATE
+
+
+def test_follows_a_change_of_rate():
+    clock = sc.SampleClock(RATE, 256, window=10.0)
+    true_times, _ = stream(clock, 60, 1 / (RATE * (1 - 300e-6)))
+    assert clock.get_stats()['drift_ppm'] == pytest.approx(300, abs=15)
+
+    # The board warms up and runs 100 ppm fast from the next sample on
+    #
+    first = len(true_times)
+    true_period = 1 / (RATE * (1 + 100e-6))
+    stream(clock, 120, true_period, start=true_times[-1] + true_period - first * true_period, first=first, seed=1)
+    assert clock.get_stats()['drift_ppm'] == pytest.approx(-100, abs=15)
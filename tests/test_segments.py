@@ -0,0 +1,65 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+import segments as sg
+
+
+class ListWriter(object):
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.rows = []
+
+    def close(self):
+        np.save(self.file_name, np.concatenate(self.rows) if self.rows else np.zeros(0))
+        os.replace(self.file_name + '.npy', self.file_name)
+
+
+def make_segments(file_name, **kwargs):
+    return sg.Segments(file_name, lambda name, segment: ListWriter(name),
+                       lambda writer, segment: writer.close() or {'rows': sum(map(len, writer.rows))},
+                       lambda writer, rows: writer.rows.append(rows), 250, **kwargs)
+
+
+def test_segments_cover_the_session(tmp_path):
+    file_name = str(tmp_path / 'session.dat')
+    segments = make_segments(file_name, max_seconds=2, boundary=25)
+    segments.start()
+    for block in np.array_split(np.arange(3000), 37):
+        segments.write(block)
+    segments.close()
+
+    manifest = sg.read_manifest(file_name)
+    assert manifest['complete'] and manifest['samples'] == 3000
+    assert [s['samples'] for s in manifest['segments']] == [500] * 6
+    data = [np.load(str(tmp_path / s['file']), allow_pickle=False) for s in manifest['segments']]
+    assert np.array_equal(np.concatenate(data), np.arange(3000))
+    assert [s['previous'] for s in manifest['segments'][1:]] == [s['file'] for s in manifest['segments'][:-1]]
+
+
+def test_manifest_writes_do_not_race(tmp_path):
+    file_name = str(tmp_path / 'race.dat')
+    segments = make_segments(file_name, max_seconds=1)
+    segments.start()
+    errors = []
+
+    def write_manifest():
+        try:
+            for _ in range(200):
+                segments._write_manifest()
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write_manifest) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    segments.close()
+    assert not errors
+    assert not os.path.exists(sg.manifest_name(file_name) + '.tmp')
+    with open(sg.manifest_name(file_name)) as f:
+        assert json.load(f)['complete']
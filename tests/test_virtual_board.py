@@ -0,0 +1,102 @@
+import sys
+
+import numpy as np
+import pytest
+import serial
+
+import config as cfg
+import handshake as hs
+import open_bci_v4 as v4
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'), reason="the virtual board needs a pty")
+
+import virtual_board as vb  # noqa: E402  (imports tty, not on Windows)
+
+
+@pytest.fixture
+def virtual():
+    board = vb.VirtualBoard(seed=0)
+    board.start()
+    yield board
+    board.stop()
+
+
+def test_handshake_with_the_virtual_board(virtual):
+    ser = serial.Serial(port=virtual.port, baudrate=115200, timeout=1.0)
+    try:
+        handshake = hs.Handshake(ser, timeout=1.0)
+        banner = handshake.reset()
+        assert banner.firmware == vb.FIRMWARE[1:] and not banner.daisy
+
+        replies = handshake.send('x3160110Xz310Z-d2')
+        assert replies == [('x3160110X', 'Success: Channel set for 3$$$'),
+                           ('z310Z', 'Success: Lead off set for 3$$$'),
+                           ('-', 'Success: Configured internal test signal.$$$'),
+                           ('d', 'updating channel settings to default$$$')]
+        # Channel 3 was turned off by its setting and on again by 'd', channel 2 is off ('2' gets no reply)
+        assert not virtual.channels_on[1] and virtual.channels_on[2]
+
+        assert handshake.send('x3X') == [('x3X', 'Failure: too few chars$$$')]
+    finally:
+        ser.close()
+
+
+class Window(object):
+
+    def __init__(self):
+        self.messages = []
+
+    def log_mess(self, text):
+        self.messages.append(text)
+
+
+class Controller(object):
+
+    def clean_up(self):
+        pass
+
+
+class BlockPlugin(object):
+
+    def __init__(self):
+        self.ids = []
+        self.timestamps = []
+
+    def process_block(self, block):
+        self.ids.extend(block.ids.tolist())
+        self.timestamps.extend(block.timestamps.tolist())
+
+
+@pytest.mark.parametrize('acquisition_thread', [False, True])
+def test_streaming_from_the_virtual_board(monkeypatch, virtual, acquisition_thread):
+    monkeypatch.setattr(cfg, 'portUsed', virtual.port)
+    monkeypatch.setattr(cfg, 'timeout', 0.5)
+    monkeypatch.setattr(cfg, 'daisyBoard', False)
+    monkeypatch.setattr(cfg, 'logging', False)
+    monkeypatch.setattr(cfg, 'raw_capture', None)
+    monkeypatch.setattr(cfg, 'stall_timeout', 10.0)
+    monkeypatch.setattr(cfg, 'acquisition_thread', acquisition_thread)
+
+    # Blocks are never full and never late: every sample reaches the plugins only when streaming stops
+    monkeypatch.setattr(cfg, 'block_mode', True)
+    monkeypatch.setattr(cfg, 'block_size', 1000)
+    monkeypatch.setattr(cfg, 'block_latency', 60.0)
+
+    board = v4.OpenBCIBoard(Controller(), Window())
+    try:
+        assert board.banner.firmware == vb.FIRMWARE[1:]
+        block_plugin = BlockPlugin()
+        samples = []
+        board.start_streaming([block_plugin, lambda sample: samples.append(sample.id)], lapse=1.0)
+    finally:
+        board.disconnect()
+
+    ids = block_plugin.ids
+    assert len(ids) > 150 and samples == ids
+    assert ids == [(ids[0] + i) % 256 for i in range(len(ids))]
+    assert np.all(np.diff(block_plugin.timestamps) > 0)
+    if acquisition_thread:
+        board.acquisition.join(2.0)
+        assert len(ids) <= board.ring.written and board.ring.cursors == []
+    else:
+        assert len(ids) == board.frames_decoded
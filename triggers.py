@@ -0,0 +1,75 @@
+#!/usr/bin/env python3.6
+"""
+Trigger events for the recorders, from the stimulus display (displaytrigger.py) and from the collecting plugins.
+
+The display tells what it shows through the config module: cfg.image_shown is set while an image is on screen,
+and cfg.image_number counts the images shown. A TriggerWatch polls these from the streaming thread (two
+attribute reads, so it can be done for every sample) and reports a change as an event: the number of the image
+when a new one is shown, 0 when the screen goes black.
+
+Other plugins publish their own events with post, e.g. the label the triggered collector gives its packets.
+Posted events are kept in a short list of the last MAX_POSTED events, each watch reports the ones posted since
+it last looked.
+
+EXAMPLE USE:
+
+    watch = TriggerWatch()
+    for value, text in watch.poll():
+        recorder.add_event(value, text)
+
+    post(3, 'label 3')          # from a collector
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import collections
+import threading
+
+import config as cfg
+
+MAX_POSTED = 256
+
+# Events posted by the plugins, (number, value, text), and the number of the last one
+#
+_posted = collections.deque(maxlen=MAX_POSTED)
+_posted_lock = threading.Lock()
+_last_posted = 0
+
+
+def post(value, text=''):
+    """ Publish an event to every TriggerWatch. """
+    global _last_posted
+    with _posted_lock:
+        _last_posted += 1
+        _posted.append((_last_posted, value, text))
+
+
+class TriggerWatch(object):
+
+    def __init__(self):
+        self.shown = False
+        self.number = cfg.image_number
+        self.seen = _last_posted
+
+    def poll(self):
+        """ Returns the list of (value, text) events since the last call, usually empty. """
+        events = []
+        shown = cfg.image_shown
+        number = cfg.image_number
+        if shown != self.shown or number != self.number:
+            new_image = number != self.number
+            black = self.shown and not shown
+            self.shown = shown
+            self.number = number
+            if new_image:
+                events.append((number, 'image %d' % number))
+            elif black:
+                events.append((0, 'black'))
+
+        if _last_posted != self.seen:
+            with _posted_lock:
+                events.extend((value, text) for n, value, text in _posted if n > self.seen)
+                self.seen = _last_posted
+        return events
@@ -213,6 +213,11 @@ http://docs.openbci.com/software/01-OpenBCI_SDK.\n\
 For user interface: read README or view \
 https://github.com/OpenBCI/OpenBCI_Python")
 
+        elif board.streaming and board.getBoardType() == "cyton" and s[0] != '/':
+            # While streaming, the commands are queued and written between two reads (see command_queue.py)
+            ticket = board.send_command(s)
+            if ticket.wait(1.0):
+                print("Command sent after frame " + str(ticket.frame))
         elif board.streaming and s != "/stop":
             print("Error: the board is currently streaming data, please type '/stop' before issuing new commands.")
         else:
@@ -274,6 +279,14 @@ https://github.com/OpenBCI/OpenBCI_Python")
                 if not rec:
                     print("Command not recognized...")
 
+            elif s and board.getBoardType() == "cyton":
+                # The Cyton gets all the characters in one go, and the replies are printed as soon as they come,
+                # followed by whatever the other commands printed (see handshake.py)
+                for c, reply in board.handshake.send(s):
+                    if reply is None:
+                        print("No reply to " + c)
+                    else:
+                        print('%\t' + reply.replace('\n', '\n%\t'))
             elif s:
                 for c in s:
                     if sys.hexversion > 0x03000000:
@@ -283,7 +296,8 @@ https://github.com/OpenBCI/OpenBCI_Python")
                     time.sleep(0.100)
 
             line = ''
-            time.sleep(0.1)  # Wait to see if the board has anything to report
+            if flush or board.getBoardType() != "cyton":
+                time.sleep(0.1)  # Wait to see if the board has anything to report
 
             # The Cyton nicely return incoming packets -- here supposedly messages -- whereas the Ganglion
             # prints incoming ASCII message by itself
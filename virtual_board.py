@@ -0,0 +1,390 @@
+#!/usr/bin/env python3.6
+"""
+A virtual Cyton (and Daisy) board on a pseudo terminal, for testing without hardware. Linux and OS X only.
+
+The virtual board opens a pty and behaves like the board firmware on the other end: it answers the soft reset
+'v' with the usual banner ending in '$$$', starts and stops streaming on 'b' and 's', attaches and removes the
+daisy on 'C' and 'c', and handles the channel, channel setting ('x...X'), lead-off ('z...Z') and test signal
+commands, answering the last three as firmware 2 and later do. While streaming it sends well formed
+33 byte packets at the chosen rate. The data is a synthetic sine + noise signal, or a recording that is replayed.
+Corrupted and dropped packets can be injected at a fixed rate or on request.
+
+Since it is an ordinary serial device, the unmodified OpenBCIBoard can be connected to it by setting
+cfg.portUsed to the name of the pty.
+
+EXAMPLE USE:
+
+    board = VirtualBoard(sample_rate=1000, daisy=True)
+    board.start()
+    cfg.portUsed = board.port
+    ...
+    board.drop(5)       # drop the next five packets
+    board.stop()
+
+From the command line:
+
+    python virtual_board.py --rate 1000 --daisy
+
+"""
+# ===================
+# Imports
+# ===================
+#
+import argparse
+import os
+import select
+import threading
+import time
+import tty
+
+import numpy as np
+
+import packet_decoder as pdec
+
+# ========================
+# Constant values
+#
+ADS1299_Vref = 4.5  # reference voltage for ADC in ADS1299.  set by its hardware
+ADS1299_gain = 24.0  # assumed gain setting for ADS1299.  set by its Arduino code
+scale_fac_uVolts_per_count = ADS1299_Vref / float((pow(2, 23) - 1)) / ADS1299_gain * 1000000.
+scale_fac_accel_G_per_count = 0.002 / (pow(2, 4))  # assume set to +/4G, so 2 mG
+
+FIRMWARE = 'v3.1.1'
+
+# Channel commands, channels 1-8 on the board and 9-16 on the daisy.
+#
+CHANNEL_OFF = '12345678qwertyui'
+CHANNEL_ON = '!@#$%^&*QWERTYUI'
+
+# Test signals, see test_signal() in open_bci_v4.py
+#
+TEST_SIGNALS = {'0': 'ground', 'p': 'vcc', '-': 'slow', '=': 'fast', '[': 'slow2x', ']': 'fast2x'}
+
+# Channel setting (x, channel, power down, gain, input, bias, SRB2, SRB1, X) and lead-off (z, channel, P, N, Z)
+# commands, by their first letter: the last letter and the length. Channels 9-16 are named Q to I.
+#
+SETTINGS = {'x': ('X', 9), 'z': ('Z', 5)}
+SETTING_CHANNELS = '12345678QWERTYUI'
+
+
+class VirtualBoard(object):
+    """
+    Simulates the board firmware on a pseudo terminal.
+
+    Args:
+      sample_rate: packets per second sent while streaming
+      daisy: whether a daisy module is attached
+      replay_file: a .npy file (samples x channels, in counts) or a text file with comma separated counts
+                   to replay instead of the synthetic signal. The recording is looped.
+      noise: standard deviation of the noise added to the synthetic signal, in uV
+      corrupt_rate: fraction of packets sent with a corrupted byte
+      drop_rate: fraction of packets that are not sent (the packet id still counts up)
+      seed: seed for the random generator
+    """
+
+    def __init__(self, sample_rate=250, daisy=False, replay_file=None, noise=5.0,
+                 corrupt_rate=0.0, drop_rate=0.0, seed=None):
+        self.sample_rate = float(sample_rate)
+        self.daisy_present = daisy
+        self.daisy = daisy
+        self.noise = noise
+        self.corrupt_rate = corrupt_rate
+        self.drop_rate = drop_rate
+        self.random = np.random.RandomState(seed)
+
+        self.replay = None
+        if replay_file is not None:
+            self.replay = self.load_recording(replay_file)
+        self.replay_pos = 0
+
+        # Board state
+        #
+        self.streaming = False
+        self.channels_on = np.ones(16, dtype=bool)
+        self.test_signal = None
+        self.setting = ''
+        self.packet_id = 0
+        self.sample_count = 0
+
+        # Host time (time.time()) of the last 'b' command. Packet k of the stream is due at
+        # stream_start + (k + 1) / sample_rate.
+        #
+        self.stream_start = None
+
+        # Requested faults, counted down packet by packet.
+        #
+        self.corrupt_next = 0
+        self.drop_next = 0
+
+        # Counters, to compare with what the receiving side reports.
+        #
+        self.packets_sent = 0
+        self.packets_corrupted = 0
+        self.packets_dropped = 0
+        self.commands = []
+
+        self.master = None
+        self.slave = None
+        self.port = None
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+
+    # =======================
+    # Starting and stopping
+    #
+    def start(self):
+        """ Open the pty and start answering. The device name is available in self.port. """
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        tty.setraw(self.master)
+        self.port = os.ttyname(self.slave)
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="virtual-board")
+        self.thread.daemon = True
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(2.0)
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+
+    # =======================
+    # Fault injection
+    #
+    def corrupt(self, n=1):
+        """ Corrupt the next n packets. """
+        with self.lock:
+            self.corrupt_next += n
+
+    def drop(self, n=1):
+        """ Do not send the next n packets. """
+        with self.lock:
+            self.drop_next += n
+
+    # =======================
+    # The firmware
+    #
+    def _run(self):
+        next_time = start_time = time.time()
+        sent_at_start = 0
+        interval = min(1.0 / self.sample_rate, 0.005)
+
+        while self.running:
+            timeout = max(0.0, next_time - time.time()) if self.streaming else 0.05
+            readable, _, _ = select.select([self.master], [], [], timeout)
+            if readable:
+                try:
+                    commands = os.read(self.master, 1024)
+                except OSError:
+                    return
+                for c in commands.decode('ascii', errors='replace'):
+                    self.handle_command(c)
+                    if c == 'b':
+                        start_time = time.time()
+                        next_time = start_time
+                        sent_at_start = self.sample_count
+                        self.stream_start = start_time
+
+            if self.streaming and time.time() >= next_time:
+                # Send all packets that are due since the start of streaming, at most a second at a time
+                # should we have fallen behind.
+                #
+                due = int((time.time() - start_time) * self.sample_rate) - (self.sample_count - sent_at_start)
+                due = min(due, int(self.sample_rate))
+                if due > 0:
+                    self._write(self.make_packets(due))
+                next_time = time.time() + interval
+
+    def _write(self, data):
+        try:
+            os.write(self.master, data)
+        except OSError:
+            self.running = False
+
+    def _reply(self, text):
+        """ Text replies are only sent when not streaming, like the firmware does. """
+        if not self.streaming:
+            self._write(text.encode('ascii'))
+
+    def handle_command(self, c):
+        self.commands.append(c)
+
+        # The characters of a channel or lead-off setting are collected up to its last letter
+        #
+        if self.setting:
+            self.setting += c
+            if c == SETTINGS[self.setting[0]][0]:
+                self.handle_setting(self.setting)
+                self.setting = ''
+            return
+
+        if c in SETTINGS:
+            self.setting = c
+        elif c == 'v':
+            self.streaming = False
+            self.packet_id = 0
+            self.daisy = self.daisy_present
+            self._reply(self.banner())
+        elif c == 'b':
+            self.streaming = True
+        elif c == 's':
+            self.streaming = False
+        elif c == 'C':
+            if self.daisy_present:
+                self.daisy = True
+                self._reply('daisy attached16$$$')
+            else:
+                self._reply('no daisy to attach!8$$$')
+        elif c == 'c':
+            self.daisy = False
+            self._reply('daisy removed$$$')
+        elif c == 'd':
+            self.channels_on[:] = True
+            self.test_signal = None
+            self._reply('updating channel settings to default$$$')
+        elif c == '?':
+            self._reply('Board ADS Registers\nCONFIG1 0x96\nCONFIG2 0xC0\nCONFIG3 0xEC\n$$$')
+        elif c in CHANNEL_OFF:
+            self.channels_on[CHANNEL_OFF.index(c)] = False
+        elif c in CHANNEL_ON:
+            self.channels_on[CHANNEL_ON.index(c)] = True
+        elif c in TEST_SIGNALS:
+            self.test_signal = TEST_SIGNALS[c]
+            self._reply('Success: Configured internal test signal.$$$')
+
+    def handle_setting(self, setting):
+        end, length = SETTINGS[setting[0]]
+        if len(setting) != length or setting[1] not in SETTING_CHANNELS:
+            self._reply('Failure: too few chars$$$' if len(setting) < length else 'Failure: Err: too many chars$$$')
+            return
+        channel = SETTING_CHANNELS.index(setting[1])
+        if end == 'X':
+            self.channels_on[channel] = setting[2] == '0'
+            self._reply('Success: Channel set for %d$$$' % (channel + 1))
+        else:
+            self._reply('Success: Lead off set for %d$$$' % (channel + 1))
+
+    def banner(self):
+        lines = ['OpenBCI V3 8-16 channel', 'On Board ADS1299 Device ID: 0x3E']
+        if self.daisy:
+            lines.append('On Daisy ADS1299 Device ID: 0x3E')
+        lines.append('LIS3DH Device ID: 0x33')
+        lines.append('Firmware: ' + FIRMWARE)
+        return '\n'.join(lines) + '\n$$$'
+
+    # =======================
+    # The data
+    #
+    def load_recording(self, file_name):
+        if file_name.endswith('.npy'):
+            data = np.load(file_name)
+        else:
+            data = np.loadtxt(file_name, delimiter=',', ndmin=2)
+        data = np.asarray(data, dtype=np.int32)
+        if data.shape[1] < 16:
+            data = np.hstack((data, np.zeros((len(data), 16 - data.shape[1]), dtype=np.int32)))
+        return data[:, :16]
+
+    def make_signal(self, n):
+        """ Returns n samples of 16 channels, in counts. """
+        if self.replay is not None:
+            rows = (self.replay_pos + np.arange(n)) % len(self.replay)
+            self.replay_pos = (self.replay_pos + n) % len(self.replay)
+            counts = self.replay[rows].copy()
+        else:
+            t = (self.sample_count + np.arange(n))[:, None] / self.sample_rate
+            freqs = 5.0 + np.arange(16)
+            uvolts = 50.0 * np.sin(2 * np.pi * freqs * t) + self.random.normal(0, self.noise, (n, 16))
+            counts = (uvolts / scale_fac_uVolts_per_count).astype(np.int32)
+
+        if self.test_signal == 'ground':
+            counts[:] = 0
+        elif self.test_signal == 'vcc':
+            counts[:] = 2 ** 23 - 1
+        elif self.test_signal is not None:
+            period = self.sample_rate if 'slow' in self.test_signal else self.sample_rate / 2
+            amplitude = 1.875e3 if '2x' in self.test_signal else 0.9375e3
+            t = self.sample_count + np.arange(n)
+            square = np.where((t % period) < period / 2, 1.0, -1.0) * amplitude / scale_fac_uVolts_per_count
+            counts[:] = square[:, None].astype(np.int32)
+
+        counts[:, ~self.channels_on] = 0
+        return np.clip(counts, -2 ** 23, 2 ** 23 - 1)
+
+    def make_packets(self, n):
+        """ Returns the bytes of the next n packets, with the requested faults applied. """
+        counts = self.make_signal(n)
+        self.sample_count += n
+
+        frames = np.zeros(n, dtype=pdec.FRAME_DTYPE)
+        frames['start'] = pdec.START_BYTE
+        frames['end'] = pdec.END_BYTE
+        ids = (self.packet_id + np.arange(n)) % 256
+        frames['id'] = ids
+        self.packet_id = (self.packet_id + n) % 256
+
+        # With a daisy, the odd packets carry channels 1-8 and the even packets channels 9-16.
+        #
+        if self.daisy:
+            values = np.where((ids % 2 == 1)[:, None], counts[:, :8], counts[:, 8:])
+        else:
+            values = counts[:, :8]
+        values = values.astype(np.int64) & 0xFFFFFF
+        frames['channels'][:, :, 0] = values >> 16
+        frames['channels'][:, :, 1] = (values >> 8) & 0xFF
+        frames['channels'][:, :, 2] = values & 0xFF
+
+        # Accelerometer lying flat, 1 G on the Z axis.
+        #
+        frames['aux'] = [0, 0, int(1.0 / scale_fac_accel_G_per_count)]
+
+        raw = frames.view(np.uint8).reshape(n, pdec.FRAME_SIZE).copy()
+
+        # Faults
+        #
+        with self.lock:
+            corrupt = self.random.random_sample(n) < self.corrupt_rate
+            drop = self.random.random_sample(n) < self.drop_rate
+            requested = min(self.corrupt_next, n)
+            corrupt[:requested] = True
+            self.corrupt_next -= requested
+            requested = min(self.drop_next, n)
+            drop[:requested] = True
+            self.drop_next -= requested
+
+        for row in np.flatnonzero(corrupt):
+            raw[row, self.random.randint(pdec.FRAME_SIZE)] ^= 0xFF
+
+        self.packets_corrupted += int(np.count_nonzero(corrupt & ~drop))
+        self.packets_dropped += int(np.count_nonzero(drop))
+        self.packets_sent += int(np.count_nonzero(~drop))
+
+        return raw[~drop].tobytes()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Virtual OpenBCI Cyton board on a pseudo terminal")
+    parser.add_argument('-r', '--rate', default=250, type=float, help="Packets per second")
+    parser.add_argument('-d', '--daisy', action='store_true', help="Attach a daisy module")
+    parser.add_argument('--replay', help="Recording to replay (.npy or comma separated counts)")
+    parser.add_argument('--corrupt', default=0.0, type=float, help="Fraction of corrupted packets")
+    parser.add_argument('--drop', default=0.0, type=float, help="Fraction of dropped packets")
+    args = parser.parse_args()
+
+    board = VirtualBoard(args.rate, args.daisy, args.replay, corrupt_rate=args.corrupt, drop_rate=args.drop)
+    print("Virtual board on port: " + board.start())
+    try:
+        while True:
+            time.sleep(10)
+            print("Packets sent: %d, corrupted: %d, dropped: %d" %
+                  (board.packets_sent, board.packets_corrupted, board.packets_dropped))
+    except KeyboardInterrupt:
+        board.stop()